@@ -8,12 +8,21 @@ from image_generator import ImageGenerator
 from tts_generator import TTSGenerator
 from scene_composer import SceneComposer
 from video_generator import VideoGenerator
-from typing import List, Dict
+from video_merger import ensure_still_segment
+from parallel_executor import ParallelExecutor
+from generation_checkpoint import GenerationCheckpoint
+from typing import List, Dict, Optional
+import copy
+from collections import Counter
+import hashlib
 import json
 
 
 class AnimeGenerator:
-    def __init__(self, openai_api_key: str = None, provider: str = "qiniu", custom_prompt: str = None, enable_video: bool = False, use_ai_analysis: bool = True, session_id: str = None):
+    def __init__(self, openai_api_key: str = None, provider: str = "qiniu", custom_prompt: str = None, enable_video: bool = False, use_ai_analysis: bool = True, session_id: str = None,
+                 max_scene_workers: int = 4, image_concurrency: int = 4, tts_concurrency: int = 4, video_concurrency: int = 2,
+                 llm_workers: int = 4, llm_requests_per_second: float = None, use_llm_cache: bool = True,
+                 pre_encode_segments: bool = True):
         load_dotenv()
         
         self.api_key = openai_api_key or os.getenv('OPENAI_API_KEY')
@@ -22,20 +31,25 @@ class AnimeGenerator:
         
         self.session_id = session_id
         self.char_mgr = CharacterManager()
-        self.image_gen = ImageGenerator(self.api_key, provider=provider, custom_prompt=custom_prompt)
-        self.tts_gen = TTSGenerator()
+        self.image_gen = ImageGenerator(self.api_key, provider=provider, custom_prompt=custom_prompt, max_concurrency=image_concurrency)
+        self.tts_gen = TTSGenerator(max_concurrency=tts_concurrency)
         
         self.video_gen = None
         if enable_video:
-            self.video_gen = VideoGenerator(self.api_key)
+            self.video_gen = VideoGenerator(self.api_key, max_concurrency=video_concurrency)
+        
+        self.scene_executor = ParallelExecutor(max_workers=max_scene_workers)
         
         self.novel_analyzer = None
         self.storyboard_gen = None
         if use_ai_analysis:
-            self.novel_analyzer = NovelAnalyzer(self.api_key)
-            self.storyboard_gen = StoryboardGenerator(self.api_key)
+            self.novel_analyzer = NovelAnalyzer(self.api_key, max_workers=llm_workers, max_requests_per_second=llm_requests_per_second,
+                                                use_cache=use_llm_cache)
+            self.storyboard_gen = StoryboardGenerator(self.api_key, max_workers=llm_workers, max_requests_per_second=llm_requests_per_second,
+                                                      use_cache=use_llm_cache)
         
-        self.scene_composer = SceneComposer(self.image_gen, self.tts_gen, self.char_mgr, self.video_gen, session_id=session_id)
+        self.scene_composer = SceneComposer(self.image_gen, self.tts_gen, self.char_mgr, self.video_gen, session_id=session_id,
+                                            segment_encoder=ensure_still_segment if pre_encode_segments else None)
         
         if session_id:
             self.output_dir = os.path.join("anime_output", session_id)
@@ -49,7 +63,11 @@ class AnimeGenerator:
                           character_descriptions: Dict[str, str] = None,
                           generate_video: bool = False,
                           use_storyboard: bool = True,
-                          progress_callback = None) -> Dict:
+                          progress_callback = None,
+                          fuse_llm_passes: bool = False,
+                          previous_session_id: str = None,
+                          resume: bool = False,
+                          scene_callback = None) -> Dict:
         with open(novel_path, 'r', encoding='utf-8') as f:
             novel_text = f.read()
         
@@ -57,11 +75,53 @@ class AnimeGenerator:
         scene_index = 0
         
         if self.use_ai_analysis and self.novel_analyzer:
+            fuse_llm_passes = bool(use_storyboard and self.storyboard_gen and fuse_llm_passes)
+            checkpoint = GenerationCheckpoint(self.output_dir, self._fingerprint({
+                'novel': novel_text,
+                'use_storyboard': use_storyboard,
+                'fuse_llm_passes': fuse_llm_passes
+            }))
+            
             print("=== 第一阶段：使用 DeepSeek AI 分析小说文本 ===")
             if progress_callback:
                 progress_callback(10, '正在使用 AI 分析小说内容...')
             
-            analysis_result = self.novel_analyzer.analyze_novel_in_chunks(novel_text, max_chunks=None)
+            previous_project = self._load_previous_project(previous_session_id)
+            previous_chunks = {chunk['fingerprint']: chunk for chunk in previous_project.get('chunks', [])}
+            previous_scenes = {scene['fingerprint']: scene['folder']
+                               for scene in previous_project.get('scenes', []) if scene.get('fingerprint')}
+            
+            chunks = self._split_novel_into_chunks(novel_text)
+            chunk_records = [{'fingerprint': self._fingerprint(chunk)} for chunk in chunks]
+            
+            analysis_checkpoint = checkpoint.load_stage('analysis') if resume else None
+            if analysis_checkpoint:
+                print("从检查点恢复 AI 分析结果")
+                analysis_result = analysis_checkpoint['analysis_result']
+                combined_result = analysis_checkpoint['combined_result']
+                chunk_records = analysis_checkpoint['chunk_records']
+            else:
+                combined_result = None
+                if fuse_llm_passes:
+                    print("使用合并模式：每个文本块一次请求同时完成分析和分镜")
+                    combined_chunk_results = self._generate_chunks_incrementally(
+                        chunks, chunk_records, previous_chunks, 'combined',
+                        self.storyboard_gen.generate_combined_for_chunks
+                    )
+                    combined_result = self.storyboard_gen.merge_combined_results(copy.deepcopy(combined_chunk_results))
+                    analysis_result = combined_result
+                else:
+                    analysis_chunk_results = self._generate_chunks_incrementally(
+                        chunks, chunk_records, previous_chunks, 'analysis',
+                        self.novel_analyzer.analyze_chunks
+                    )
+                    analysis_result = NovelAnalyzer.merge_chunk_results(copy.deepcopy(analysis_chunk_results))
+                
+                checkpoint.save_stage('analysis', {
+                    'analysis_result': analysis_result,
+                    'combined_result': combined_result,
+                    'chunk_records': chunk_records
+                })
             
             analyzed_scenes = analysis_result.get('scenes', [])
             analyzed_characters = analysis_result.get('characters', [])
@@ -74,6 +134,10 @@ class AnimeGenerator:
             character_portraits = {}
             character_designs = {}
             
+            characters_checkpoint = (checkpoint.load_stage('characters') if resume else None) or {}
+            completed_designs = characters_checkpoint.get('designs', {})
+            completed_portraits = characters_checkpoint.get('portraits', {})
+            
             total_chars = min(len(analyzed_characters), 10)
             for idx, char_info in enumerate(analyzed_characters[:10]):
                 char_name = char_info.get('name', '')
@@ -84,8 +148,12 @@ class AnimeGenerator:
                     char_progress = 20 + int((idx / total_chars) * 15)
                     progress_callback(char_progress, f'正在生成角色 "{char_name}" 的设计档案... ({idx+1}/{total_chars})')
                 
-                print(f"为角色 '{char_name}' 生成设计档案...")
-                design = self.novel_analyzer.generate_character_design(char_info)
+                if char_name in completed_designs:
+                    print(f"从检查点恢复角色 '{char_name}' 的设计档案")
+                    design = completed_designs[char_name]
+                else:
+                    print(f"为角色 '{char_name}' 生成设计档案...")
+                    design = self.novel_analyzer.generate_character_design(char_info)
                 character_designs[char_name] = design
                 
                 self.char_mgr.register_character(
@@ -96,20 +164,27 @@ class AnimeGenerator:
                     }
                 )
                 
-                print(f"生成角色 '{char_name}' 的立绘...")
-                appearance_prompt = design.get('visual_keywords', '') or self.novel_analyzer.generate_character_appearance_prompt(char_info)
-                
-                portrait_path = self.image_gen.generate_character_image(
-                    char_name,
-                    appearance_prompt,
-                    style="anime"
-                )
+                portrait_path = completed_portraits.get(char_name)
+                if not portrait_path or not os.path.exists(portrait_path):
+                    print(f"生成角色 '{char_name}' 的立绘...")
+                    appearance_prompt = design.get('visual_keywords', '') or self.novel_analyzer.generate_character_appearance_prompt(char_info)
+                    
+                    portrait_path = self.image_gen.generate_character_image(
+                        char_name,
+                        appearance_prompt,
+                        style="anime"
+                    )
                 
                 if portrait_path:
                     character_portraits[char_name] = portrait_path
                     print(f"✓ 角色 '{char_name}' 设计完成")
                 else:
                     print(f"✗ 角色 '{char_name}' 立绘生成失败")
+                
+                checkpoint.save_stage('characters', {
+                    'designs': character_designs,
+                    'portraits': character_portraits
+                })
             
             print(f"\n角色设计完成，共生成 {len(character_portraits)} 个角色")
             if progress_callback:
@@ -120,10 +195,28 @@ class AnimeGenerator:
                 if progress_callback:
                     progress_callback(40, '正在生成分镜脚本...')
                 
-                storyboard_result = self.storyboard_gen.generate_storyboard_in_chunks(
-                    novel_text, 
-                    analyzed_characters
-                )
+                storyboard_checkpoint = checkpoint.load_stage('storyboard') if resume else None
+                if combined_result is not None:
+                    storyboard_result = combined_result
+                elif storyboard_checkpoint:
+                    print("从检查点恢复分镜脚本")
+                    storyboard_result = storyboard_checkpoint['storyboard_result']
+                    chunk_records = storyboard_checkpoint['chunk_records']
+                else:
+                    storyboard_chunk_results = self._generate_chunks_incrementally(
+                        chunks, chunk_records, previous_chunks, 'storyboard',
+                        lambda dirty_chunks: self.storyboard_gen.generate_storyboard_for_chunks(
+                            dirty_chunks, analyzed_characters,
+                            chunk_characters=[self._characters_in_chunk(chunk, analyzed_characters) for chunk in dirty_chunks]
+                        ),
+                        context_fingerprints=[self._fingerprint(self._characters_in_chunk(chunk, analyzed_characters))
+                                              for chunk in chunks]
+                    )
+                    storyboard_result = self.storyboard_gen.assemble_storyboard(copy.deepcopy(storyboard_chunk_results))
+                    checkpoint.save_stage('storyboard', {
+                        'storyboard_result': storyboard_result,
+                        'chunk_records': chunk_records
+                    })
                 
                 storyboard_panels = storyboard_result.get('storyboard', [])
                 success_count = storyboard_result.get('success_count', 0)
@@ -138,20 +231,26 @@ class AnimeGenerator:
                 if max_scenes:
                     panels_to_process = storyboard_panels[:max_scenes]
                 
-                for panel_idx, panel_info in enumerate(panels_to_process):
-                    print(f"\n生成分镜 {panel_idx + 1}/{len(panels_to_process)}...")
-                    if progress_callback:
-                        scene_progress = 50 + int((panel_idx / len(panels_to_process)) * 45)
-                        progress_callback(scene_progress, f'正在生成分镜 {panel_idx + 1}/{len(panels_to_process)}...')
-                    
-                    scene_metadata = self.scene_composer.create_scene_from_storyboard(
-                        scene_index=panel_idx,
-                        panel_info=panel_info,
-                        character_designs={name: design.get('visual_keywords', '') for name, design in character_designs.items()},
-                        generate_video=generate_video
-                    )
+                panel_character_designs = {name: design.get('visual_keywords', '') for name, design in character_designs.items()}
+                panel_appearance_counts = self._count_prior_appearances(panels_to_process)
+                
+                def render_panel(panel_idx, panel_info):
+                    def create_scene():
+                        print(f"\n生成分镜 {panel_idx + 1}/{len(panels_to_process)}...")
+                        return self.scene_composer.create_scene_from_storyboard(
+                            scene_index=panel_idx,
+                            panel_info=panel_info,
+                            character_designs=panel_character_designs,
+                            generate_video=generate_video,
+                            appearance_counts=panel_appearance_counts[panel_idx]
+                        )
                     
-                    all_scenes.append(scene_metadata)
+                    fingerprint = self._scene_fingerprint(panel_info, panel_character_designs, generate_video,
+                                                          panel_appearance_counts[panel_idx])
+                    return self._render_scene_with_reuse(panel_idx, fingerprint, create_scene,
+                                                         previous_scenes, checkpoint, resume)
+                
+                all_scenes.extend(self._render_scenes(panels_to_process, render_panel, progress_callback, '分镜', scene_callback))
             else:
                 print("\n=== 第三阶段：根据场景生成画面（传统模式）===")
                 scenes_to_process = analyzed_scenes
@@ -159,19 +258,24 @@ class AnimeGenerator:
                 if max_scenes:
                     scenes_to_process = analyzed_scenes[:max_scenes]
                 
-                for scene_idx, scene_info in enumerate(scenes_to_process):
-                    print(f"\n生成场景 {scene_idx + 1}/{len(scenes_to_process)}...")
-                    if progress_callback:
-                        scene_progress = 50 + int((scene_idx / len(scenes_to_process)) * 45)
-                        progress_callback(scene_progress, f'正在生成场景 {scene_idx + 1}/{len(scenes_to_process)}...')
-                    
-                    scene_metadata = self.scene_composer.create_scene_with_ai_analysis(
-                        scene_index=scene_idx,
-                        scene_info=scene_info,
-                        generate_video=generate_video
-                    )
+                scene_appearance_counts = self._count_prior_appearances(scenes_to_process)
+                
+                def render_scene(scene_idx, scene_info):
+                    def create_scene():
+                        print(f"\n生成场景 {scene_idx + 1}/{len(scenes_to_process)}...")
+                        return self.scene_composer.create_scene_with_ai_analysis(
+                            scene_index=scene_idx,
+                            scene_info=scene_info,
+                            generate_video=generate_video,
+                            appearance_counts=scene_appearance_counts[scene_idx]
+                        )
                     
-                    all_scenes.append(scene_metadata)
+                    fingerprint = self._scene_fingerprint(scene_info, {}, generate_video,
+                                                          scene_appearance_counts[scene_idx])
+                    return self._render_scene_with_reuse(scene_idx, fingerprint, create_scene,
+                                                         previous_scenes, checkpoint, resume)
+                
+                all_scenes.extend(self._render_scenes(scenes_to_process, render_scene, progress_callback, '场景', scene_callback))
         else:
             parser = NovelParser(novel_text)
             chapters = parser.parse()
@@ -210,6 +314,10 @@ class AnimeGenerator:
                 
                 all_scenes.extend(scenes)
                 scene_index += len(scenes)
+                
+                if scene_callback:
+                    for scene_metadata in scenes:
+                        scene_callback(scene_metadata)
         
         character_portraits_data = {}
         if self.use_ai_analysis and self.novel_analyzer and 'character_portraits' in locals():
@@ -232,14 +340,18 @@ class AnimeGenerator:
                 {
                     'scene_index': s['scene_index'],
                     'folder': s['folder'],
-                    'characters': s['characters']
+                    'characters': s['characters'],
+                    'fingerprint': s.get('fingerprint')
                 }
                 for s in all_scenes
             ],
             **storyboard_stats
         }
         
-        self._save_project_metadata(metadata)
+        project_state = dict(metadata)
+        if 'chunk_records' in locals():
+            project_state['chunks'] = chunk_records
+        self._save_project_metadata(project_state)
         
         print(f"\n动漫生成完成！")
         print(f"总场景数：{len(all_scenes)}")
@@ -247,6 +359,143 @@ class AnimeGenerator:
         
         return metadata
     
+    def _split_novel_into_chunks(self, novel_text: str) -> List[str]:
+        chunks = []
+        for section in NovelParser(novel_text).split_into_sections():
+            chunks.extend(self.novel_analyzer.split_text_into_chunks(section))
+        return chunks
+    
+    def _fingerprint(self, content) -> str:
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False, sort_keys=True)
+        return hashlib.md5(content.encode('utf-8')).hexdigest()
+    
+    def _count_prior_appearances(self, scenes: List[Dict]) -> List[Dict[str, int]]:
+        seen = Counter()
+        appearance_counts = []
+        for scene_info in scenes:
+            characters = scene_info.get('characters', [])
+            appearance_counts.append({name: seen[name] for name in characters})
+            seen.update(set(characters))
+        return appearance_counts
+    
+    def _scene_fingerprint(self, scene_info: Dict, character_designs: Dict[str, str], generate_video: bool,
+                           appearance_counts: Optional[Dict[str, int]] = None) -> str:
+        scene_content = {k: v for k, v in scene_info.items() if k not in ('panel_number', 'scene_number')}
+        designs = {name: character_designs[name] for name in scene_info.get('characters', []) if name in character_designs}
+        returning_characters = sorted(name for name, count in (appearance_counts or {}).items() if count > 0)
+        return self._fingerprint({
+            'scene': scene_content,
+            'character_designs': designs,
+            'returning_characters': returning_characters,
+            'generate_video': generate_video,
+            'provider': self.image_gen.provider,
+            'custom_prompt': self.image_gen.custom_prompt
+        })
+    
+    def _load_previous_project(self, previous_session_id: Optional[str]) -> Dict:
+        if not previous_session_id:
+            return {}
+        
+        if previous_session_id == self.session_id or os.path.basename(previous_session_id) != previous_session_id:
+            print(f"忽略无效的历史会话ID：{previous_session_id}")
+            return {}
+        
+        metadata_path = os.path.join("anime_output", previous_session_id, "project_metadata.json")
+        if not os.path.exists(metadata_path):
+            print(f"未找到历史会话的项目元数据：{metadata_path}，将完整生成")
+            return {}
+        
+        try:
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取历史项目元数据失败: {e}，将完整生成")
+            return {}
+    
+    @staticmethod
+    def _characters_in_chunk(chunk: str, characters: List[Dict]) -> List[Dict]:
+        return [char for char in characters if char.get('name') and char['name'] in chunk]
+    
+    def _generate_chunks_incrementally(self, chunks: List[str], chunk_records: List[Dict],
+                                       previous_chunks: Dict[str, Dict], result_key: str,
+                                       generate_func, context_fingerprints: Optional[List[str]] = None) -> List[Optional[Dict]]:
+        results = [None] * len(chunks)
+        dirty_indices = []
+        context_key = f"{result_key}_context"
+        context_fingerprints = context_fingerprints or [None] * len(chunks)
+        
+        for i, record in enumerate(chunk_records):
+            previous_chunk = previous_chunks.get(record['fingerprint'], {})
+            previous_result = previous_chunk.get(result_key)
+            if previous_chunk.get(context_key) != context_fingerprints[i]:
+                previous_result = None
+            if previous_result and (previous_result.get('storyboard') or previous_result.get('scenes')):
+                results[i] = copy.deepcopy(previous_result)
+            else:
+                dirty_indices.append(i)
+        
+        if previous_chunks:
+            print(f"增量生成：复用 {len(chunks) - len(dirty_indices)} 个未变化的文本块，重新生成 {len(dirty_indices)} 个")
+        
+        if dirty_indices:
+            generated = generate_func([chunks[i] for i in dirty_indices])
+            for i, chunk_result in zip(dirty_indices, generated):
+                results[i] = chunk_result
+        
+        for record, chunk_result, context_fingerprint in zip(chunk_records, results, context_fingerprints):
+            record[result_key] = copy.deepcopy(chunk_result)
+            if context_fingerprint is not None:
+                record[context_key] = context_fingerprint
+        
+        return results
+    
+    def _render_scene_with_reuse(self, scene_index: int, fingerprint: str, create_scene,
+                                 previous_scenes: Dict[str, str], checkpoint: GenerationCheckpoint,
+                                 resume: bool) -> Dict:
+        scene_metadata = None
+        if resume:
+            scene_metadata = checkpoint.load_scene(scene_index, fingerprint)
+            if scene_metadata:
+                print(f"\n场景 {scene_index + 1} 已完成，从检查点恢复")
+        
+        if scene_metadata is None:
+            scene_metadata = self._reuse_previous_scene(scene_index, fingerprint, previous_scenes)
+        
+        if scene_metadata is None:
+            scene_metadata = create_scene()
+        
+        scene_metadata['fingerprint'] = fingerprint
+        checkpoint.save_scene(scene_index, scene_metadata)
+        return scene_metadata
+    
+    def _reuse_previous_scene(self, scene_index: int, fingerprint: str, previous_scenes: Dict[str, str]) -> Optional[Dict]:
+        previous_folder = previous_scenes.get(fingerprint)
+        if not previous_folder:
+            return None
+        
+        scene_metadata = self.scene_composer.reuse_scene(scene_index, previous_folder)
+        if scene_metadata:
+            print(f"\n复用未变化的场景 {scene_index + 1}（来自 {previous_folder}）")
+        return scene_metadata
+    
+    def _render_scenes(self, items: List[Dict], render_func, progress_callback, label: str, scene_callback=None) -> List[Dict]:
+        total = len(items)
+        if total == 0:
+            return []
+        
+        if progress_callback:
+            progress_callback(50, f'正在生成{label} 1/{total}...')
+        
+        def on_scene_done(idx, scene_metadata):
+            if scene_callback:
+                scene_callback(scene_metadata)
+            if progress_callback:
+                scene_progress = 50 + int(((idx + 1) / total) * 45)
+                progress_callback(scene_progress, f'已完成{label} {idx + 1}/{total}')
+        
+        return self.scene_executor.map_ordered(render_func, items, on_result=on_scene_done)
+    
     def _save_project_metadata(self, metadata: Dict):
         metadata_path = os.path.join(self.output_dir, "project_metadata.json")
         
@@ -268,6 +517,22 @@ def main():
                        help='OpenAI API Key（也可通过 .env 文件配置）')
     parser.add_argument('--session-id', default=None,
                        help='会话ID（用于隔离不同生成任务，默认自动生成）')
+    parser.add_argument('--scene-workers', type=int, default=4,
+                       help='并发生成场景的线程数（默认：4，设为 1 则串行生成）')
+    parser.add_argument('--llm-workers', type=int, default=4,
+                       help='并发调用 AI 分析和分镜生成的线程数（默认：4）')
+    parser.add_argument('--fused-llm', action='store_true',
+                       help='每个文本块只请求一次 AI，同时返回分析结果和分镜（节省约一半的 token）')
+    parser.add_argument('--previous-session-id', default=None,
+                       help='上一次生成的会话ID，只重新生成有改动的章节和场景')
+    parser.add_argument('--resume', action='store_true',
+                       help='从该会话已保存的检查点继续生成（需配合 --session-id 使用）')
+    parser.add_argument('--no-llm-cache', action='store_true',
+                       help='不使用 AI 响应缓存，强制重新请求')
+    parser.add_argument('--llm-rps', type=float, default=None,
+                       help='AI 分析和分镜接口每秒最大请求数（默认：不限速）')
+    parser.add_argument('--no-pre-encode', action='store_true',
+                       help='不在场景生成后预编码静态场景视频片段（最终合并时再编码）')
     
     args = parser.parse_args()
     
@@ -275,8 +540,12 @@ def main():
     print(f"会话ID：{session_id}")
     
     try:
-        generator = AnimeGenerator(openai_api_key=args.api_key, session_id=session_id)
-        generator.generate_from_novel(args.novel_path, max_scenes=args.max_scenes)
+        generator = AnimeGenerator(openai_api_key=args.api_key, session_id=session_id, max_scene_workers=args.scene_workers,
+                                   llm_workers=args.llm_workers, llm_requests_per_second=args.llm_rps,
+                                   use_llm_cache=not args.no_llm_cache, pre_encode_segments=not args.no_pre_encode)
+        generator.generate_from_novel(args.novel_path, max_scenes=args.max_scenes, fuse_llm_passes=args.fused_llm,
+                                      previous_session_id=args.previous_session_id,
+                                      resume=args.resume)
     except Exception as e:
         print(f"错误：{e}")
         return 1
@@ -0,0 +1,50 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+class AssetDigestCache:
+    def __init__(self, max_entries: int = 4096, chunk_size: int = 1024 * 1024):
+        self.max_entries = max_entries
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._digests = OrderedDict()
+    
+    @staticmethod
+    def get_version(path: str) -> Optional[str]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    
+    def get_digest(self, path: str) -> Optional[str]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            digest = self._digests.get(key)
+            if digest is not None:
+                self._digests.move_to_end(key)
+                return digest
+        
+        md5 = hashlib.md5()
+        try:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                    md5.update(chunk)
+        except OSError as e:
+            print(f"计算文件摘要失败 {path}: {e}")
+            return None
+        digest = md5.hexdigest()
+        
+        with self._lock:
+            self._digests[key] = digest
+            while len(self._digests) > self.max_entries:
+                self._digests.popitem(last=False)
+        return digest
@@ -0,0 +1,66 @@
+import subprocess
+from typing import List, Optional, Union
+
+import numpy as np
+from moviepy.config import get_setting
+
+
+SAMPLE_RATE = 24000
+CHANNELS = 1
+SILENCE_THRESHOLD = 64
+
+
+def decode_to_pcm(source: Union[str, bytes], sample_rate: int = SAMPLE_RATE) -> Optional[np.ndarray]:
+    input_args = ['-i', 'pipe:0'] if isinstance(source, bytes) else ['-i', source]
+    try:
+        result = subprocess.run(
+            [get_setting("FFMPEG_BINARY"), '-hide_banner', '-loglevel', 'error'] + input_args +
+            ['-f', 's16le', '-acodec', 'pcm_s16le', '-ac', str(CHANNELS), '-ar', str(sample_rate), 'pipe:1'],
+            input=source if isinstance(source, bytes) else None,
+            capture_output=True
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"音频解码失败: {e}")
+        return None
+    
+    if result.returncode != 0:
+        print(f"音频解码失败: {result.stderr.decode('utf-8', 'replace').strip()[-500:]}")
+        return None
+    return np.frombuffer(result.stdout, dtype=np.int16)
+
+
+def trim_silence(samples: np.ndarray, threshold: int = SILENCE_THRESHOLD) -> np.ndarray:
+    audible = np.flatnonzero(np.abs(samples.astype(np.int32)) > threshold)
+    if not len(audible):
+        return samples[:0]
+    return samples[audible[0]:audible[-1] + 1]
+
+
+def concatenate_pcm(clips: List[np.ndarray], gap_ms: int = 500, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    gap_samples = sample_rate * gap_ms // 1000
+    mixed = np.zeros(sum(len(clip) for clip in clips) + gap_samples * len(clips), dtype=np.int16)
+    
+    offset = 0
+    for clip in clips:
+        mixed[offset:offset + len(clip)] = clip
+        offset += len(clip) + gap_samples
+    return mixed
+
+
+def encode_pcm(samples: np.ndarray, output_path: str, sample_rate: int = SAMPLE_RATE, bitrate: str = '64k') -> bool:
+    try:
+        result = subprocess.run(
+            [get_setting("FFMPEG_BINARY"), '-y', '-hide_banner', '-loglevel', 'error',
+             '-f', 's16le', '-ac', str(CHANNELS), '-ar', str(sample_rate), '-i', 'pipe:0',
+             '-c:a', 'libmp3lame', '-b:a', bitrate, '-f', 'mp3', output_path],
+            input=samples.astype(np.int16, copy=False).tobytes(),
+            capture_output=True
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"音频编码失败: {e}")
+        return False
+    
+    if result.returncode != 0:
+        print(f"音频编码失败: {result.stderr.decode('utf-8', 'replace').strip()[-500:]}")
+        return False
+    return True
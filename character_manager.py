@@ -58,13 +58,15 @@ class CharacterManager:
                 self.characters[name]['appearance_descriptions'] = []
             self.characters[name]['appearance_descriptions'].append(appearance_description)
     
-    def get_character_prompt(self, name: str, include_consistency_hints: bool = True) -> str:
+    def get_character_prompt(self, name: str, include_consistency_hints: bool = True,
+                             appearance_count: int = None) -> str:
         char = self.get_character(name)
         if not char:
             return f"character: {name}"
         
         tag = char.get('character_tag', f"<{name}>")
-        appearance_count = char.get('appearance_count', 0)
+        if appearance_count is None:
+            appearance_count = char.get('appearance_count', 0)
         
         prompt_parts = []
         
@@ -0,0 +1,72 @@
+import os
+import json
+import threading
+from typing import Optional, Dict
+
+
+class GenerationCheckpoint:
+    def __init__(self, output_dir: str, fingerprint: str = None):
+        self.checkpoint_dir = os.path.join(output_dir, "checkpoints")
+        self.fingerprint = fingerprint
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+    
+    def load_stage(self, stage: str) -> Optional[Dict]:
+        record = self._read(self._stage_path(stage))
+        if not record or record.get('fingerprint') != self.fingerprint:
+            return None
+        return record.get('data')
+    
+    def save_stage(self, stage: str, data):
+        self._write(self._stage_path(stage), {
+            'fingerprint': self.fingerprint,
+            'data': data
+        })
+    
+    def load_scene(self, scene_index: int, scene_fingerprint: str) -> Optional[Dict]:
+        metadata = self._read(self._scene_path(scene_index))
+        if not metadata or metadata.get('fingerprint') != scene_fingerprint:
+            return None
+        
+        folder = metadata.get('folder')
+        if not folder or not os.path.exists(os.path.join(folder, "metadata.json")):
+            return None
+        
+        for key in ('image_path', 'audio_path', 'video_path'):
+            if metadata.get(key) and not os.path.exists(metadata[key]):
+                return None
+        
+        return metadata
+    
+    def save_scene(self, scene_index: int, metadata: Dict):
+        self._write(self._scene_path(scene_index), metadata)
+    
+    def load_job(self) -> Optional[Dict]:
+        return self._read(os.path.join(self.checkpoint_dir, "job.json"))
+    
+    def save_job(self, job_params: Dict):
+        self._write(os.path.join(self.checkpoint_dir, "job.json"), job_params)
+    
+    def _stage_path(self, stage: str) -> str:
+        return os.path.join(self.checkpoint_dir, f"{stage}.json")
+    
+    def _scene_path(self, scene_index: int) -> str:
+        return os.path.join(self.checkpoint_dir, f"scene_{scene_index:04d}.json")
+    
+    def _read(self, path: str) -> Optional[Dict]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取检查点失败 {path}: {e}")
+            return None
+    
+    def _write(self, path: str, data):
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, path)
+        except (OSError, TypeError) as e:
+            print(f"保存检查点失败 {path}: {e}")
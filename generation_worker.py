@@ -0,0 +1,210 @@
+import os
+import sys
+import time
+import socket
+from typing import Dict, Callable, Optional
+
+from anime_generator import AnimeGenerator
+from job_queue import JobQueue, JobWorkerPool, JobCancelledError
+from status_store import create_status_store
+from video_assembly import FinalVideoAssembler
+from hls_packager import HLSPackager
+from scene_composer import SceneComposer
+
+
+class GenerationJobRunner:
+    def __init__(self, job_queue: JobQueue, status_store,
+                 on_completed: Callable[[str, Dict, Optional[int]], None] = None,
+                 video_assembler=None, hls_packager=None):
+        self.job_queue = job_queue
+        self.status_store = status_store
+        self.on_completed = on_completed
+        self.video_assembler = video_assembler
+        self.hls_packager = hls_packager
+        self.api_keys = {}
+    
+    def set_api_key(self, task_id: str, api_key: str):
+        self.api_keys[task_id] = api_key
+    
+    def discard_api_key(self, task_id: str):
+        self.api_keys.pop(task_id, None)
+    
+    def _set_status(self, task_id: str, status: Dict):
+        self.status_store.set(task_id, status)
+    
+    def run_job(self, job: Dict):
+        task_id = job['task_id']
+        params = job['params']
+        api_key = self.api_keys.pop(task_id, None)
+        if not api_key and not job.get('needs_api_key'):
+            api_key = os.getenv('OPENAI_API_KEY')
+        if not api_key:
+            self._set_status(task_id, {
+                'status': 'error',
+                'progress': 0,
+                'message': '缺少 API Key，请调用恢复接口重新提供'
+            })
+            raise ValueError('缺少 API Key')
+        
+        self.generate(
+            task_id, params['novel_path'], params.get('max_scenes'), api_key,
+            provider=params.get('provider', 'qiniu'),
+            custom_prompt=params.get('custom_prompt'),
+            enable_video=params.get('enable_video', False),
+            use_ai_analysis=params.get('use_ai_analysis', True),
+            use_storyboard=params.get('use_storyboard', True),
+            user_id=params.get('user_id'),
+            fuse_llm_passes=params.get('fuse_llm_passes', False),
+            previous_task_id=params.get('previous_task_id'),
+            resume=params.get('resume', False) or job.get('attempts', 1) > 1
+        )
+    
+    def generate(self, task_id, novel_path, max_scenes, api_key, provider='qiniu', custom_prompt=None, enable_video=False,
+                 use_ai_analysis=True, use_storyboard=True, user_id=None, fuse_llm_passes=False, previous_task_id=None, resume=False):
+        completed_scenes = []
+        
+        def update_status(progress, message):
+            if self.job_queue.is_cancel_requested(task_id):
+                raise JobCancelledError(task_id)
+            self.status_store.update(task_id, {
+                'status': 'processing',
+                'progress': progress,
+                'message': message
+            })
+        
+        def scene_completed(scene_metadata):
+            completed_scenes.append(scene_metadata['scene_index'])
+            self.status_store.update(task_id, {'completed_scenes': list(completed_scenes)})
+            if self.hls_packager:
+                self.hls_packager.request([SceneComposer.get_scene_folder(task_id, scene_metadata['scene_index'])])
+        
+        try:
+            self._set_status(task_id, {
+                'status': 'processing',
+                'progress': 0,
+                'message': '正在解析小说...',
+                'completed_scenes': []
+            })
+            
+            generator = AnimeGenerator(
+                openai_api_key=api_key,
+                provider=provider,
+                custom_prompt=custom_prompt,
+                enable_video=enable_video,
+                use_ai_analysis=use_ai_analysis,
+                session_id=task_id
+            )
+            
+            update_status(5, '开始分析小说内容...')
+            
+            metadata = generator.generate_from_novel(
+                novel_path,
+                max_scenes=max_scenes,
+                generate_video=enable_video,
+                use_storyboard=use_storyboard,
+                progress_callback=update_status,
+                fuse_llm_passes=fuse_llm_passes,
+                previous_session_id=previous_task_id,
+                resume=resume,
+                scene_callback=scene_completed
+            )
+            
+            if self.on_completed:
+                self.on_completed(task_id, metadata, user_id)
+            
+            self._set_status(task_id, {
+                'status': 'completed',
+                'progress': 100,
+                'message': '生成完成',
+                'completed_scenes': [scene['scene_index'] for scene in metadata.get('scenes', [])],
+                'metadata': metadata
+            })
+        except JobCancelledError:
+            self._set_status(task_id, {
+                'status': 'cancelled',
+                'progress': 0,
+                'message': '任务已取消'
+            })
+            raise
+        except Exception as e:
+            self._set_status(task_id, {
+                'status': 'error',
+                'progress': 0,
+                'message': str(e)
+            })
+            raise
+        
+        if self.video_assembler and metadata.get('scenes'):
+            self.video_assembler.request(task_id, [scene['folder'] for scene in metadata['scenes']])
+
+
+def record_generation_stats(task_id: str, metadata: Dict, user_id: Optional[int]):
+    from statistics_db import update_generation_stats
+    from user_auth import increment_user_video_count
+    
+    generated_scene_count = len(metadata.get('scenes', []))
+    generated_content_size = 0
+    for scene_info in metadata.get('scenes', []):
+        scene_folder = scene_info['folder']
+        if os.path.exists(scene_folder):
+            for root, dirs, files in os.walk(scene_folder):
+                for file in files:
+                    file_path = os.path.join(root, file)
+                    generated_content_size += os.path.getsize(file_path)
+    
+    update_generation_stats(task_id, generated_scene_count, generated_content_size, metadata)
+    
+    if user_id:
+        increment_user_video_count(user_id)
+
+
+def main():
+    import argparse
+    from common import get_base_dir
+    
+    parser = argparse.ArgumentParser(description='从任务队列中读取并执行动漫生成任务')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                       help='本进程同时执行的生成任务数（默认：CPU 核数的一半）')
+    parser.add_argument('--db', default=os.path.join(get_base_dir(), 'generation_jobs.db'),
+                       help='任务队列数据库路径（需与 Web 服务使用同一个文件）')
+    parser.add_argument('--status-store', default=os.getenv('STATUS_STORE', 'sqlite'),
+                       help='任务状态存储，需与 Web 服务一致：sqlite 或 sqlite:<路径>（默认读取环境变量 STATUS_STORE）')
+    parser.add_argument('--no-premerge', action='store_true',
+                       help='生成完成后不在后台预先合并完整视频（改为首次下载时合并）')
+    parser.add_argument('--no-hls', action='store_true',
+                       help='场景完成后不预先生成 HLS 分片（改为首次播放时生成）')
+    parser.add_argument('--name', default=socket.gethostname(),
+                       help='工作进程名称，重启时用于找回该进程中断的任务；同一台机器运行多个进程时需各自指定（默认：主机名）')
+    
+    args = parser.parse_args()
+    
+    if args.status_store.partition(':')[0] != 'sqlite':
+        print("错误：独立工作进程需要使用共享的 sqlite 状态存储，Web 服务才能看到任务进度")
+        return 1
+    
+    status_store = create_status_store(args.status_store, os.path.join(get_base_dir(), 'generation_status.db'))
+    job_queue = JobQueue(args.db)
+    requeued = job_queue.requeue_interrupted(worker_prefix=args.name)
+    if requeued:
+        print(f"重新排队 {requeued} 个中断的任务")
+    
+    video_assembler = None if args.no_premerge else FinalVideoAssembler()
+    hls_packager = None if args.no_hls else HLSPackager()
+    runner = GenerationJobRunner(job_queue, status_store, on_completed=record_generation_stats,
+                                 video_assembler=video_assembler, hls_packager=hls_packager)
+    pool = JobWorkerPool(job_queue, runner.run_job, num_workers=args.workers, worker_prefix=args.name)
+    pool.start()
+    print(f"生成工作进程 {args.name} 已启动，并发数：{args.workers}")
+    
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("正在停止工作进程...")
+        pool.stop()
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+import os
+import re
+import json
+import math
+import tempfile
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+
+from moviepy.config import get_setting
+
+from scene_composer import SceneComposer
+from video_merger import ensure_still_segment
+
+
+HLS_SEGMENT_FILENAME = "stream.ts"
+HLS_INFO_FILENAME = "stream.json"
+
+
+class HLSPackager:
+    def __init__(self, max_workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._failed = {}
+        self._scene_locks = {}
+    
+    @staticmethod
+    def _get_source(scene_folder: str) -> Optional[str]:
+        video_path = os.path.join(scene_folder, 'scene.mp4')
+        if os.path.exists(video_path):
+            return video_path
+        return SceneComposer.get_still_segment(scene_folder)
+    
+    @staticmethod
+    def _source_version(source_path: str) -> Optional[int]:
+        try:
+            return os.stat(source_path).st_mtime_ns
+        except OSError:
+            return None
+    
+    @staticmethod
+    def get_packaged_scene(scene_folder: str) -> Optional[Dict]:
+        source_path = HLSPackager._get_source(scene_folder)
+        segment_path = os.path.join(scene_folder, HLS_SEGMENT_FILENAME)
+        if not source_path or not os.path.exists(segment_path):
+            return None
+        
+        try:
+            with open(os.path.join(scene_folder, HLS_INFO_FILENAME), 'r', encoding='utf-8') as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        if info.get('source') != os.path.basename(source_path) or \
+                info.get('source_version') != HLSPackager._source_version(source_path):
+            return None
+        return {'path': segment_path, 'duration': info['duration']}
+    
+    def request(self, scene_folders: List[str]):
+        for scene_folder in scene_folders:
+            if self.get_packaged_scene(scene_folder):
+                continue
+            source_path = self._get_source(scene_folder)
+            source_version = self._source_version(source_path) if source_path else None
+            with self._lock:
+                if scene_folder in self._pending:
+                    continue
+                if scene_folder in self._failed and self._failed[scene_folder] == source_version:
+                    continue
+                self._pending.add(scene_folder)
+            self._executor.submit(self._package_and_release, scene_folder)
+    
+    def _package_and_release(self, scene_folder: str):
+        try:
+            self.package_scene(scene_folder)
+        finally:
+            with self._lock:
+                self._pending.discard(scene_folder)
+    
+    def _get_scene_lock(self, scene_folder: str) -> threading.Lock:
+        with self._lock:
+            return self._scene_locks.setdefault(scene_folder, threading.Lock())
+    
+    def package_scene(self, scene_folder: str) -> Optional[Dict]:
+        with self._get_scene_lock(scene_folder):
+            return self._package_scene(scene_folder)
+    
+    def _package_scene(self, scene_folder: str) -> Optional[Dict]:
+        packaged = self.get_packaged_scene(scene_folder)
+        if packaged:
+            return packaged
+        
+        source_path = self._get_source(scene_folder) or ensure_still_segment(scene_folder)
+        if not source_path:
+            with self._lock:
+                self._failed[scene_folder] = None
+            return None
+        
+        source_version = self._source_version(source_path)
+        segment_path = os.path.join(scene_folder, HLS_SEGMENT_FILENAME)
+        fd, partial_path = tempfile.mkstemp(prefix="partial_", suffix=".ts", dir=scene_folder)
+        os.close(fd)
+        try:
+            if not self._remux(source_path, partial_path, copy_streams=True) and \
+                    not self._remux(source_path, partial_path, copy_streams=False):
+                with self._lock:
+                    self._failed[scene_folder] = source_version
+                return None
+            
+            duration = self._probe_duration(source_path)
+            if duration is None:
+                with self._lock:
+                    self._failed[scene_folder] = source_version
+                return None
+            
+            try:
+                os.replace(partial_path, segment_path)
+                self._write_info(scene_folder, {
+                    'duration': duration,
+                    'source': os.path.basename(source_path),
+                    'source_version': source_version
+                })
+            except OSError as e:
+                print(f"保存 HLS 分片失败 {scene_folder}: {e}")
+                return self.get_packaged_scene(scene_folder)
+            with self._lock:
+                self._failed.pop(scene_folder, None)
+            return {'path': segment_path, 'duration': duration}
+        finally:
+            if os.path.exists(partial_path):
+                try:
+                    os.remove(partial_path)
+                except OSError:
+                    pass
+    
+    @staticmethod
+    def _write_info(scene_folder: str, info: Dict):
+        fd, partial_path = tempfile.mkstemp(prefix="partial_", suffix=".json", dir=scene_folder)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(info, f)
+            os.replace(partial_path, os.path.join(scene_folder, HLS_INFO_FILENAME))
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+    
+    def _remux(self, source_path: str, output_path: str, copy_streams: bool) -> bool:
+        if copy_streams:
+            codec_args = ['-c', 'copy', '-bsf:v', 'h264_mp4toannexb']
+        else:
+            codec_args = ['-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', '-c:a', 'aac']
+        
+        try:
+            result = subprocess.run(
+                [get_setting("FFMPEG_BINARY"), '-y', '-hide_banner', '-loglevel', 'error',
+                 '-i', source_path, '-map', '0:v:0', '-map', '0:a?'] + codec_args +
+                ['-muxdelay', '0', '-f', 'mpegts', output_path],
+                capture_output=True, text=True, errors='replace'
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"生成 HLS 分片失败 {source_path}: {e}")
+            return False
+        
+        if result.returncode != 0:
+            print(f"生成 HLS 分片失败 {source_path}: {result.stderr.strip()[-500:]}")
+            return False
+        return True
+    
+    def _probe_duration(self, path: str) -> Optional[float]:
+        try:
+            result = subprocess.run(
+                [get_setting("FFMPEG_BINARY"), '-hide_banner', '-i', path],
+                capture_output=True, text=True, errors='replace', timeout=30
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"读取视频时长失败 {path}: {e}")
+            return None
+        
+        match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", result.stderr)
+        if not match:
+            return None
+        hours, minutes, seconds = match.groups()
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    
+    @staticmethod
+    def build_playlist(segments: List[Tuple[str, float]], ended: bool) -> str:
+        target_duration = max([math.ceil(duration) for _, duration in segments] or [1])
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+            f"#EXT-X-TARGETDURATION:{target_duration}",
+            "#EXT-X-MEDIA-SEQUENCE:0"
+        ]
+        for position, (url, duration) in enumerate(segments):
+            if position > 0:
+                lines.append("#EXT-X-DISCONTINUITY")
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(url)
+        if ended:
+            lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
@@ -6,10 +6,11 @@ from io import BytesIO
 from typing import Optional, Dict
 import hashlib
 import base64
+import threading
 
 
 class ImageGenerator:
-    def __init__(self, api_key: str, provider: str = "qiniu", custom_prompt: str = None):
+    def __init__(self, api_key: str, provider: str = "qiniu", custom_prompt: str = None, max_concurrency: int = 4):
         self.provider = provider
         self.custom_prompt = custom_prompt
         self.style_consistency_keywords = "anime style, consistent art style, unified visual style, coherent character design, same clothing, same hairstyle, same face shape, identical environment, consistent background"
@@ -25,6 +26,8 @@ class ImageGenerator:
         self.cache_dir = "image_cache"
         os.makedirs(self.cache_dir, exist_ok=True)
         
+        self._request_semaphore = threading.BoundedSemaphore(max(1, max_concurrency))
+        
     def generate_character_image(self, character_name: str, 
                                 character_prompt: str,
                                 style: str = "anime",
@@ -53,7 +56,8 @@ class ImageGenerator:
                     "response_format": "b64_json"
                 }
                 
-                response = self.client.images.generate(**generate_params)
+                with self._request_semaphore:
+                    response = self.client.images.generate(**generate_params)
                 
                 img_data = base64.b64decode(response.data[0].b64_json)
                 img = Image.open(BytesIO(img_data))
@@ -67,10 +71,12 @@ class ImageGenerator:
                     "n": 1
                 }
                 
-                response = self.client.images.generate(**generate_params)
+                with self._request_semaphore:
+                    response = self.client.images.generate(**generate_params)
                 
                 image_url = response.data[0].url
-                img_response = requests.get(image_url)
+                with self._request_semaphore:
+                    img_response = requests.get(image_url)
                 img = Image.open(BytesIO(img_response.content))
                 img.save(cache_path)
             
@@ -115,7 +121,8 @@ class ImageGenerator:
                     "response_format": "b64_json"
                 }
                 
-                response = self.client.images.generate(**generate_params)
+                with self._request_semaphore:
+                    response = self.client.images.generate(**generate_params)
                 
                 img_data = base64.b64decode(response.data[0].b64_json)
                 img = Image.open(BytesIO(img_data))
@@ -129,10 +136,12 @@ class ImageGenerator:
                     "n": 1
                 }
                 
-                response = self.client.images.generate(**generate_params)
+                with self._request_semaphore:
+                    response = self.client.images.generate(**generate_params)
                 
                 image_url = response.data[0].url
-                img_response = requests.get(image_url)
+                with self._request_semaphore:
+                    img_response = requests.get(image_url)
                 img = Image.open(BytesIO(img_response.content))
                 img.save(cache_path)
             
@@ -0,0 +1,60 @@
+import os
+from typing import Dict, Optional
+from PIL import Image
+
+
+IMAGE_RENDITIONS = {
+    'thumb': 384,
+    'web': 1280
+}
+
+IMAGE_RENDITION_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True})
+}
+
+RENDITION_EXTENSIONS = {
+    'webp': 'webp',
+    'jpeg': 'jpg'
+}
+
+
+def get_rendition_filename(size: str, image_format: str) -> str:
+    return f"scene_{size}.{RENDITION_EXTENSIONS[image_format]}"
+
+
+def get_rendition_path(scene_folder: str, size: str, image_format: str) -> Optional[str]:
+    rendition_path = os.path.join(scene_folder, get_rendition_filename(size, image_format))
+    try:
+        is_current = os.stat(rendition_path).st_mtime_ns >= os.stat(os.path.join(scene_folder, "scene.png")).st_mtime_ns
+    except OSError:
+        return None
+    return rendition_path if is_current else None
+
+
+def create_image_renditions(scene_folder: str) -> Dict[str, Dict[str, str]]:
+    image_path = os.path.join(scene_folder, "scene.png")
+    if not os.path.exists(image_path):
+        return {}
+    
+    renditions = {}
+    try:
+        with Image.open(image_path) as source:
+            source.load()
+            image = source.convert('RGB')
+        
+        for size, max_width in IMAGE_RENDITIONS.items():
+            resized = image
+            if image.width > max_width:
+                resized = image.resize((max_width, round(image.height * max_width / image.width)), Image.LANCZOS)
+            
+            for image_format, (pil_format, save_options) in IMAGE_RENDITION_FORMATS.items():
+                rendition_path = os.path.join(scene_folder, get_rendition_filename(size, image_format))
+                partial_path = os.path.join(scene_folder, f"partial_{get_rendition_filename(size, image_format)}")
+                resized.save(partial_path, pil_format, **save_options)
+                os.replace(partial_path, rendition_path)
+                renditions.setdefault(size, {})[image_format] = rendition_path
+    except (OSError, ValueError) as e:
+        print(f"生成场景缩略图失败 {scene_folder}: {e}")
+    
+    return renditions
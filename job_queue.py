@@ -0,0 +1,313 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Callable
+
+
+class JobCancelledError(Exception):
+    pass
+
+
+class JobQueue:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._new_job_event = threading.Event()
+        self._init_db()
+    
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+    
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS generation_jobs (
+                    task_id TEXT PRIMARY KEY,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker_id TEXT,
+                    owner TEXT,
+                    needs_api_key INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+            ''')
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(generation_jobs)')}
+            if 'attempts' not in columns:
+                conn.execute('ALTER TABLE generation_jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+            if 'owner' not in columns:
+                conn.execute('ALTER TABLE generation_jobs ADD COLUMN owner TEXT')
+                conn.execute('ALTER TABLE generation_jobs ADD COLUMN needs_api_key INTEGER NOT NULL DEFAULT 0')
+            if 'api_key' in columns:
+                conn.execute('UPDATE generation_jobs SET api_key = NULL WHERE api_key IS NOT NULL')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_generation_jobs_queue
+                ON generation_jobs (status, priority DESC, created_at)
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS job_worker_leases (
+                    worker_prefix TEXT PRIMARY KEY,
+                    heartbeat_at REAL NOT NULL
+                )
+            ''')
+    
+    def enqueue(self, task_id: str, params: Dict, priority: int = 0, owner: str = None):
+        with self._connect() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO generation_jobs
+                (task_id, priority, status, params, cancel_requested, attempts, owner, needs_api_key, created_at)
+                VALUES (?, ?, 'queued', ?, 0, 0, ?, ?, ?)
+            ''', (task_id, priority, json.dumps(params, ensure_ascii=False), owner, int(owner is not None), time.time()))
+        self._new_job_event.set()
+    
+    def claim_next(self, worker_id: str, owner: str = None) -> Optional[Dict]:
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('''
+                    SELECT * FROM generation_jobs
+                    WHERE status = 'queued' AND (owner IS NULL OR owner = ?)
+                    ORDER BY priority DESC, created_at ASC
+                    LIMIT 1
+                ''', (owner,)).fetchone()
+                if not row:
+                    conn.execute('COMMIT')
+                    return None
+                
+                conn.execute('''
+                    UPDATE generation_jobs
+                    SET status = 'running', worker_id = ?, started_at = ?, attempts = attempts + 1
+                    WHERE task_id = ?
+                ''', (worker_id, time.time(), row['task_id']))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        
+        job = self._row_to_job(row)
+        job['status'] = 'running'
+        job['worker_id'] = worker_id
+        job['attempts'] += 1
+        return job
+    
+    def wait_for_job(self, timeout: float):
+        self._new_job_event.wait(timeout)
+        self._new_job_event.clear()
+    
+    def complete(self, task_id: str):
+        self._finish(task_id, 'completed')
+    
+    def fail(self, task_id: str, error: str):
+        self._finish(task_id, 'failed', error)
+    
+    def mark_cancelled(self, task_id: str):
+        self._finish(task_id, 'cancelled')
+    
+    def _finish(self, task_id: str, status: str, error: str = None):
+        with self._connect() as conn:
+            conn.execute('''
+                UPDATE generation_jobs
+                SET status = ?, error = ?, finished_at = ?
+                WHERE task_id = ?
+            ''', (status, error, time.time(), task_id))
+    
+    def cancel(self, task_id: str) -> Optional[str]:
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT status FROM generation_jobs WHERE task_id = ?', (task_id,)).fetchone()
+            if not row:
+                conn.execute('COMMIT')
+                return None
+            
+            status = row['status']
+            if status == 'queued':
+                conn.execute('''
+                    UPDATE generation_jobs SET status = 'cancelled', finished_at = ?
+                    WHERE task_id = ?
+                ''', (time.time(), task_id))
+                status = 'cancelled'
+            elif status == 'running':
+                conn.execute('UPDATE generation_jobs SET cancel_requested = 1 WHERE task_id = ?', (task_id,))
+                status = 'cancelling'
+            else:
+                status = 'finished'
+            conn.execute('COMMIT')
+            return status
+    
+    def is_cancel_requested(self, task_id: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute('SELECT cancel_requested FROM generation_jobs WHERE task_id = ?', (task_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+    
+    def get_job(self, task_id: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM generation_jobs WHERE task_id = ?', (task_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+    
+    def get_queue_position(self, task_id: str) -> Optional[int]:
+        with self._connect() as conn:
+            row = conn.execute('''
+                SELECT priority, created_at FROM generation_jobs
+                WHERE task_id = ? AND status = 'queued'
+            ''', (task_id,)).fetchone()
+            if not row:
+                return None
+            
+            ahead = conn.execute('''
+                SELECT COUNT(*) FROM generation_jobs
+                WHERE status = 'queued'
+                AND (priority > ? OR (priority = ? AND created_at < ?))
+            ''', (row['priority'], row['priority'], row['created_at'])).fetchone()[0]
+        return ahead + 1
+    
+    def requeue_interrupted(self, worker_prefix: str = None) -> int:
+        with self._connect() as conn:
+            if worker_prefix:
+                cursor = conn.execute('''
+                    UPDATE generation_jobs SET status = 'queued', worker_id = NULL
+                    WHERE status = 'running' AND substr(worker_id, 1, ?) = ?
+                ''', (len(worker_prefix) + 1, f"{worker_prefix}-"))
+            else:
+                cursor = conn.execute('''
+                    UPDATE generation_jobs SET status = 'queued', worker_id = NULL
+                    WHERE status = 'running'
+                ''')
+            count = cursor.rowcount
+        if count:
+            self._new_job_event.set()
+        return count
+    
+    def heartbeat(self, worker_prefix: str):
+        with self._connect() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO job_worker_leases (worker_prefix, heartbeat_at)
+                VALUES (?, ?)
+            ''', (worker_prefix, time.time()))
+    
+    def release_lease(self, worker_prefix: str):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM job_worker_leases WHERE worker_prefix = ?', (worker_prefix,))
+    
+    def requeue_stale(self, lease_seconds: float) -> int:
+        cutoff = time.time() - lease_seconds
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                cursor = conn.execute('''
+                    UPDATE generation_jobs SET status = 'queued', worker_id = NULL
+                    WHERE status = 'running' AND NOT EXISTS (
+                        SELECT 1 FROM job_worker_leases
+                        WHERE heartbeat_at >= ?
+                        AND substr(generation_jobs.worker_id, 1, length(worker_prefix) + 1) = worker_prefix || '-'
+                    )
+                ''', (cutoff,))
+                count = cursor.rowcount
+                cursor = conn.execute('''
+                    UPDATE generation_jobs SET owner = NULL
+                    WHERE status = 'queued' AND owner IS NOT NULL AND owner NOT IN (
+                        SELECT worker_prefix FROM job_worker_leases WHERE heartbeat_at >= ?
+                    )
+                ''', (cutoff,))
+                count += cursor.rowcount
+                conn.execute('DELETE FROM job_worker_leases WHERE heartbeat_at < ?', (cutoff,))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        if count:
+            self._new_job_event.set()
+        return count
+    
+    def _row_to_job(self, row) -> Dict:
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        job['needs_api_key'] = bool(job['needs_api_key'])
+        return job
+
+
+class JobWorkerPool:
+    def __init__(self, job_queue: JobQueue, handler: Callable[[Dict], None],
+                 num_workers: int = 2, worker_prefix: str = "worker", poll_interval: float = 2.0,
+                 lease_seconds: float = 60):
+        self.job_queue = job_queue
+        self.handler = handler
+        self.num_workers = num_workers
+        self.worker_prefix = worker_prefix
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._stop_event = threading.Event()
+        self._threads = []
+    
+    def start(self):
+        if self.num_workers <= 0:
+            return
+        
+        self.job_queue.heartbeat(self.worker_prefix)
+        lease_thread = threading.Thread(target=self._renew_lease, name=f"{self.worker_prefix}-lease", daemon=True)
+        lease_thread.start()
+        self._threads.append(lease_thread)
+        for i in range(self.num_workers):
+            worker_id = f"{self.worker_prefix}-{i}"
+            thread = threading.Thread(target=self._run_worker, args=(worker_id,), name=worker_id, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def stop(self, timeout: float = None):
+        self._stop_event.set()
+        self.job_queue._new_job_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        if self._threads:
+            self.job_queue.release_lease(self.worker_prefix)
+        self._threads = []
+    
+    def _renew_lease(self):
+        while not self._stop_event.wait(self.lease_seconds / 3):
+            try:
+                self.job_queue.heartbeat(self.worker_prefix)
+                requeued = self.job_queue.requeue_stale(self.lease_seconds)
+                if requeued:
+                    print(f"重新排队 {requeued} 个失联工作进程的任务")
+            except sqlite3.Error as e:
+                print(f"工作进程租约续期失败 ({self.worker_prefix}): {e}")
+    
+    def _run_worker(self, worker_id: str):
+        while not self._stop_event.is_set():
+            try:
+                job = self.job_queue.claim_next(worker_id, owner=self.worker_prefix)
+            except sqlite3.Error as e:
+                print(f"任务队列读取失败 ({worker_id}): {e}")
+                job = None
+            
+            if not job:
+                self.job_queue.wait_for_job(self.poll_interval)
+                continue
+            
+            task_id = job['task_id']
+            try:
+                self.handler(job)
+                self.job_queue.complete(task_id)
+            except JobCancelledError:
+                print(f"任务已取消: {task_id}")
+                self.job_queue.mark_cancelled(task_id)
+            except Exception as e:
+                print(f"任务执行失败 {task_id}: {e}")
+                self.job_queue.fail(task_id, str(e))
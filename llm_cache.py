@@ -0,0 +1,120 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Optional, List, Dict
+
+
+class LLMResponseCache:
+    def __init__(self, cache_dir: str = "llm_cache", max_size_mb: int = 200, enabled: bool = True):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._total_size = None
+        
+        if self.enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+    
+    def make_key(self, model: str, prompt_version: str, temperature: float, messages: List[Dict]) -> str:
+        key_source = json.dumps({
+            'model': model,
+            'prompt_version': prompt_version,
+            'temperature': temperature,
+            'messages': messages
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.md5(key_source.encode('utf-8')).hexdigest()
+    
+    def get(self, cache_key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        
+        cache_path = self._cache_path(cache_key)
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                content = json.load(f).get('content')
+            os.utime(cache_path, None)
+            return content
+        except (OSError, ValueError):
+            return None
+    
+    def get_or_request(self, cache_key: str, client, rate_limiter, **request) -> str:
+        cached_text = self.get(cache_key)
+        if cached_text is not None:
+            return cached_text
+        
+        rate_limiter.acquire()
+        response = client.chat.completions.create(**request)
+        return response.choices[0].message.content
+    
+    def put(self, cache_key: str, content: str):
+        if not self.enabled or content is None:
+            return
+        
+        cache_path = self._cache_path(cache_key)
+        if os.path.exists(cache_path):
+            return
+        
+        temp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+        
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'content': content}, f, ensure_ascii=False)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print(f"写入 LLM 缓存失败: {e}")
+            return
+        
+        with self._lock:
+            if self._total_size is None:
+                self._total_size = self._scan_total_size()
+            else:
+                self._total_size += os.path.getsize(cache_path)
+            
+            if self._total_size > self.max_size_bytes:
+                self._evict()
+    
+    def _cache_path(self, cache_key: str) -> str:
+        return os.path.join(self.cache_dir, f"llm_{cache_key}.json")
+    
+    def _list_entries(self) -> List[os.DirEntry]:
+        try:
+            return [entry for entry in os.scandir(self.cache_dir)
+                    if entry.is_file() and entry.name.startswith('llm_') and entry.name.endswith('.json')]
+        except OSError:
+            return []
+    
+    def _scan_total_size(self) -> int:
+        total = 0
+        for entry in self._list_entries():
+            try:
+                total += entry.stat().st_size
+            except OSError:
+                continue
+        return total
+    
+    def _evict(self):
+        entries = []
+        for entry in self._list_entries():
+            try:
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            except OSError:
+                continue
+        
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_size_bytes * 0.9)
+        
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                total -= size
+            except OSError:
+                continue
+        
+        self._total_size = total
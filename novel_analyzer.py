@@ -1,15 +1,26 @@
 from openai import OpenAI
 from typing import Dict, List
+from parallel_executor import ParallelExecutor, RateLimiter
+from llm_cache import LLMResponseCache
 import json
 
 
+ANALYSIS_PROMPT_VERSION = "analysis-v1"
+CHARACTER_DESIGN_PROMPT_VERSION = "character-design-v1"
+
+
 class NovelAnalyzer:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, max_workers: int = 1, max_requests_per_second: float = None,
+                 use_cache: bool = True):
         self.client = OpenAI(
             api_key=api_key,
             base_url="https://openai.qiniu.com/v1"
         )
         self.model = "deepseek/deepseek-v3.1-terminus"
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(max_requests_per_second)
+        self.temperature = 0.7
+        self.llm_cache = LLMResponseCache(enabled=use_cache)
     
     def analyze_novel_text(self, text: str) -> Dict:
         system_prompt = """你是一个专业的小说分析助手。请分析输入的小说文本，提取以下信息：
@@ -49,19 +60,18 @@ class NovelAnalyzer:
 3. **角色一致性要求**：同一场景中角色的服饰、发型、脸型必须完全一致
 4. **情绪表达**：对话的emotion字段必须详细描述情绪（如：happy/开心, sad/悲伤, angry/愤怒, surprised/惊讶, worried/担忧等）"""
 
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"请分析以下小说文本：\n\n{text}"}
+        ]
+        
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"请分析以下小说文本：\n\n{text}"}
-                ],
-                temperature=0.7,
-                max_tokens=8000
+            cache_key = self.llm_cache.make_key(self.model, ANALYSIS_PROMPT_VERSION, self.temperature, messages)
+            result_text = self.llm_cache.get_or_request(
+                cache_key, self.client, self.rate_limiter,
+                model=self.model, messages=messages, temperature=self.temperature, max_tokens=8000
             )
             
-            result_text = response.choices[0].message.content
-            
             result_text = result_text.strip()
             if result_text.startswith("```json"):
                 result_text = result_text[7:]
@@ -73,6 +83,7 @@ class NovelAnalyzer:
             
             try:
                 result = json.loads(result_text)
+                self.llm_cache.put(cache_key, result_text)
             except json.JSONDecodeError:
                 result = self._parse_fallback(result_text)
             
@@ -109,18 +120,16 @@ class NovelAnalyzer:
         try:
             char_desc = f"角色名: {name}\n外貌: {appearance}\n性格: {personality}"
             
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"请为以下角色生成详细设计档案：\n\n{char_desc}"}
-                ],
-                temperature=0.7,
-                max_tokens=2000
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f"请为以下角色生成详细设计档案：\n\n{char_desc}"}
+            ]
+            cache_key = self.llm_cache.make_key(self.model, CHARACTER_DESIGN_PROMPT_VERSION, self.temperature, messages)
+            result_text = self.llm_cache.get_or_request(
+                cache_key, self.client, self.rate_limiter,
+                model=self.model, messages=messages, temperature=self.temperature, max_tokens=2000
             )
             
-            result_text = response.choices[0].message.content
-            
             result_text = result_text.strip()
             if result_text.startswith("```json"):
                 result_text = result_text[7:]
@@ -131,6 +140,7 @@ class NovelAnalyzer:
             result_text = result_text.strip()
             
             design = json.loads(result_text)
+            self.llm_cache.put(cache_key, result_text)
             return design
             
         except Exception as e:
@@ -260,21 +270,31 @@ class NovelAnalyzer:
         
         return chunks
     
-    def analyze_novel_in_chunks(self, text: str, max_chunks: int = None) -> Dict:
+    def analyze_novel_in_chunks(self, text: str, max_chunks: int = None, max_workers: int = None) -> Dict:
         chunks = self.split_text_into_chunks(text)
         
         if max_chunks:
             chunks = chunks[:max_chunks]
         
+        chunk_results = self.analyze_chunks(chunks, max_workers=max_workers)
+        
+        return self.merge_chunk_results(chunk_results)
+    
+    def analyze_chunks(self, chunks: List[str], max_workers: int = None) -> List[Dict]:
+        def analyze_chunk(i, chunk):
+            print(f"分析文本块 {i+1}/{len(chunks)}...")
+            return self.analyze_novel_text(chunk)
+        
+        executor = ParallelExecutor(max_workers=max_workers or self.max_workers)
+        return executor.map_ordered(analyze_chunk, chunks)
+    
+    @staticmethod
+    def merge_chunk_results(chunk_results: List[Dict]) -> Dict:
         all_scenes = []
         all_characters = {}
         scene_counter = 0
         
-        for i, chunk in enumerate(chunks):
-            print(f"分析文本块 {i+1}/{len(chunks)}...")
-            
-            chunk_result = self.analyze_novel_text(chunk)
-            
+        for chunk_result in chunk_results:
             for scene in chunk_result.get('scenes', []):
                 scene['scene_number'] = scene_counter
                 scene_counter += 1
@@ -3,6 +3,9 @@ import jieba
 from typing import List, Dict
 
 
+CHAPTER_PATTERN = r'第[一二三四五六七八九十百千\d]+[章回节].*'
+
+
 class NovelParser:
     def __init__(self, novel_text: str):
         self.novel_text = novel_text
@@ -13,8 +16,7 @@ class NovelParser:
         return self.chapters
     
     def _split_into_chapters(self) -> List[Dict]:
-        chapter_pattern = r'第[一二三四五六七八九十百千\d]+[章回节].*'
-        parts = re.split(f'({chapter_pattern})', self.novel_text)
+        parts = re.split(f'({CHAPTER_PATTERN})', self.novel_text)
         
         chapters = []
         for i in range(1, len(parts), 2):
@@ -47,3 +49,18 @@ class NovelParser:
     
     def get_total_chapters(self) -> int:
         return len(self.chapters)
+    
+    def split_into_sections(self) -> List[str]:
+        parts = re.split(f'({CHAPTER_PATTERN})', self.novel_text)
+        
+        sections = []
+        if parts[0].strip():
+            sections.append(parts[0].strip())
+        
+        for i in range(1, len(parts), 2):
+            body = parts[i + 1] if i + 1 < len(parts) else ''
+            section = f"{parts[i].strip()}\n{body.strip()}".strip()
+            if section:
+                sections.append(section)
+        
+        return sections
@@ -0,0 +1,65 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, Any, Optional
+
+
+class RateLimiter:
+    def __init__(self, max_calls_per_second: Optional[float] = None):
+        self.min_interval = 1.0 / max_calls_per_second if max_calls_per_second else 0.0
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+    
+    def acquire(self):
+        if not self.min_interval:
+            return
+        
+        with self._lock:
+            now = time.monotonic()
+            wait_time = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.min_interval
+        
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+class ParallelExecutor:
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max(1, max_workers or 1)
+    
+    def map_ordered(self, func: Callable[[int, Any], Any], items: List,
+                    on_result: Callable[[int, Any], None] = None) -> List:
+        results = [None] * len(items)
+        
+        if self.max_workers == 1 or len(items) <= 1:
+            for idx, item in enumerate(items):
+                results[idx] = func(idx, item)
+                if on_result:
+                    on_result(idx, results[idx])
+            return results
+        
+        finished = [False] * len(items)
+        next_to_report = 0
+        
+        futures = {}
+        pool = ThreadPoolExecutor(max_workers=min(self.max_workers, len(items)))
+        try:
+            futures = {pool.submit(func, idx, item): idx for idx, item in enumerate(items)}
+            
+            for future in as_completed(futures):
+                idx = futures[future]
+                results[idx] = future.result()
+                finished[idx] = True
+                
+                while next_to_report < len(items) and finished[next_to_report]:
+                    if on_result:
+                        on_result(next_to_report, results[next_to_report])
+                    next_to_report += 1
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            pool.shutdown(wait=True)
+        
+        return results
@@ -1,28 +1,55 @@
 import os
-from typing import List, Dict, Optional
+import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
 from image_generator import ImageGenerator
 from tts_generator import TTSGenerator
 from character_manager import CharacterManager
+from image_renditions import IMAGE_RENDITIONS, IMAGE_RENDITION_FORMATS, create_image_renditions, get_rendition_path
 import re
+import threading
 
 
+SCENE_INDEX_MARKER = "scenes.updated"
+STILL_SEGMENT_FILENAME = "segment.mp4"
+
 class SceneComposer:
     def __init__(self, image_generator: ImageGenerator, 
                  tts_generator: TTSGenerator,
                  character_manager: CharacterManager,
                  video_generator = None,
-                 session_id: str = None):
+                 session_id: str = None,
+                 segment_encoder = None):
         self.image_gen = image_generator
         self.tts_gen = tts_generator
         self.char_mgr = character_manager
         self.video_gen = video_generator
         self.session_id = session_id
-        if session_id:
-            self.output_dir = os.path.join("output_scenes", session_id)
-        else:
-            self.output_dir = "output_scenes"
+        self.segment_encoder = segment_encoder
+        self._character_lock = threading.Lock()
+        self.output_dir = self.get_output_dir(session_id)
         os.makedirs(self.output_dir, exist_ok=True)
     
+    @staticmethod
+    def get_output_dir(session_id: Optional[str]) -> str:
+        return os.path.join("output_scenes", session_id) if session_id else "output_scenes"
+    
+    @staticmethod
+    def get_scene_folder(session_id: Optional[str], scene_index: int) -> str:
+        return os.path.join(SceneComposer.get_output_dir(session_id), f"scene_{scene_index:04d}")
+    
+    @staticmethod
+    def get_still_segment(scene_folder: str) -> Optional[str]:
+        segment_path = os.path.join(scene_folder, STILL_SEGMENT_FILENAME)
+        try:
+            segment_mtime = os.stat(segment_path).st_mtime_ns
+            source_mtimes = [os.stat(os.path.join(scene_folder, name)).st_mtime_ns
+                             for name in ("scene.png", "narration.mp3")]
+        except OSError:
+            return None
+        return segment_path if segment_mtime >= max(source_mtimes) else None
+    
     def create_scene(self, scene_index: int, scene_text: str, 
                     scene_description: Optional[str] = None,
                     generate_video: bool = False) -> Dict:
@@ -34,53 +61,18 @@ class SceneComposer:
         if not scene_description:
             scene_description = self._generate_scene_description(scene_text, characters_in_scene)
         
-        character_prompts = [self.char_mgr.get_character_prompt(char) 
-                           for char in characters_in_scene 
-                           if self.char_mgr.get_character(char)]
-        
-        character_seeds = {char: self.char_mgr.get_character_seed(char) 
-                          for char in characters_in_scene 
-                          if self.char_mgr.get_character(char)}
+        character_prompts, character_seeds = self._prepare_character_context(characters_in_scene)
         
-        for char in characters_in_scene:
-            if self.char_mgr.get_character(char):
-                self.char_mgr.increment_appearance_count(char)
-        
-        scene_image = self.image_gen.generate_scene_image(
+        output_image, output_audio, output_video = self._compose_scene_media(
+            scene_folder,
+            scene_index,
+            scene_text,
             scene_description,
-            characters=character_prompts,
-            character_seeds=character_seeds
+            character_prompts,
+            character_seeds,
+            generate_video
         )
         
-        if scene_image:
-            output_image = os.path.join(scene_folder, "scene.png")
-            import shutil
-            shutil.copy(scene_image, output_image)
-        else:
-            output_image = None
-        
-        audio_file = self.tts_gen.generate_speech_for_scene(scene_text, scene_index)
-        
-        if audio_file:
-            output_audio = os.path.join(scene_folder, "narration.mp3")
-            if audio_file != output_audio:
-                import shutil
-                shutil.copy(audio_file, output_audio)
-        else:
-            output_audio = None
-        
-        output_video = None
-        if generate_video and self.video_gen and scene_image:
-            video_file = self.video_gen.generate_video(
-                prompt=scene_description,
-                image_path=scene_image
-            )
-            if video_file:
-                output_video = os.path.join(scene_folder, "scene.mp4")
-                if video_file != output_video:
-                    import shutil
-                    shutil.copy(video_file, output_video)
-        
         metadata = {
             'scene_index': scene_index,
             'text': scene_text,
@@ -96,6 +88,126 @@ class SceneComposer:
         
         return metadata
     
+    def _compose_scene_media(self, scene_folder: str, scene_index: int,
+                             scene_text: str, scene_description: str,
+                             character_prompts: List[str],
+                             character_seeds: Dict[str, int],
+                             generate_video: bool) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        with ThreadPoolExecutor(max_workers=1) as audio_pool:
+            audio_future = audio_pool.submit(self.tts_gen.generate_speech_for_scene, scene_text, scene_index,
+                                             output_path=os.path.join(scene_folder, "narration.mp3"))
+            
+            scene_image = self.image_gen.generate_scene_image(
+                scene_description,
+                characters=character_prompts,
+                character_seeds=character_seeds
+            )
+            
+            output_image = None
+            if scene_image:
+                output_image = os.path.join(scene_folder, "scene.png")
+                shutil.copy(scene_image, output_image)
+            
+            output_video = None
+            if generate_video and self.video_gen and scene_image:
+                video_file = self.video_gen.generate_video(
+                    prompt=scene_description,
+                    image_path=scene_image
+                )
+                if video_file:
+                    output_video = os.path.join(scene_folder, "scene.mp4")
+                    if video_file != output_video:
+                        shutil.copy(video_file, output_video)
+            
+            audio_file = audio_future.result()
+        
+        output_audio = None
+        if audio_file:
+            output_audio = os.path.join(scene_folder, "narration.mp3")
+            if audio_file != output_audio:
+                shutil.copy(audio_file, output_audio)
+        
+        if output_image:
+            create_image_renditions(scene_folder)
+        
+        if self.segment_encoder and output_image and output_audio and not output_video:
+            self.segment_encoder(scene_folder)
+        
+        return output_image, output_audio, output_video
+    
+    def _prepare_character_context(self, characters_in_scene: List[str],
+                                   appearance_counts: Optional[Dict[str, int]] = None):
+        if appearance_counts is not None:
+            known_characters = [char for char in characters_in_scene if self.char_mgr.get_character(char)]
+            character_prompts = [self.char_mgr.get_character_prompt(char, appearance_count=appearance_counts.get(char, 0))
+                                 for char in known_characters]
+            character_seeds = {char: self.char_mgr.get_character_seed(char) for char in known_characters}
+            return character_prompts, character_seeds
+        
+        with self._character_lock:
+            character_prompts = [self.char_mgr.get_character_prompt(char) 
+                               for char in characters_in_scene 
+                               if self.char_mgr.get_character(char)]
+            
+            character_seeds = {char: self.char_mgr.get_character_seed(char) 
+                              for char in characters_in_scene 
+                              if self.char_mgr.get_character(char)}
+            
+            for char in characters_in_scene:
+                if self.char_mgr.get_character(char):
+                    self.char_mgr.increment_appearance_count(char)
+        
+        return character_prompts, character_seeds
+    
+    def reuse_scene(self, scene_index: int, previous_folder: str) -> Optional[Dict]:
+        previous_metadata_path = os.path.join(previous_folder, "metadata.json")
+        if not os.path.exists(previous_metadata_path):
+            return None
+        
+        try:
+            with open(previous_metadata_path, 'r', encoding='utf-8') as f:
+                previous_metadata = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取已有场景元数据失败: {e}")
+            return None
+        
+        scene_folder = os.path.join(self.output_dir, f"scene_{scene_index:04d}")
+        os.makedirs(scene_folder, exist_ok=True)
+        
+        metadata = dict(previous_metadata)
+        metadata['scene_index'] = scene_index
+        metadata['folder'] = scene_folder
+        
+        for key in ('image_path', 'audio_path', 'video_path'):
+            previous_path = previous_metadata.get(key)
+            if not previous_path:
+                continue
+            
+            source_path = os.path.join(previous_folder, os.path.basename(previous_path))
+            if not os.path.exists(source_path):
+                return None
+            
+            target_path = os.path.join(scene_folder, os.path.basename(previous_path))
+            if os.path.abspath(source_path) != os.path.abspath(target_path):
+                shutil.copy(source_path, target_path)
+            metadata[key] = target_path
+        
+        derived_files = [self.get_still_segment(previous_folder)]
+        for size in IMAGE_RENDITIONS:
+            for image_format in IMAGE_RENDITION_FORMATS:
+                derived_files.append(get_rendition_path(previous_folder, size, image_format))
+        
+        for derived_file in derived_files:
+            if not derived_file:
+                continue
+            target_path = os.path.join(scene_folder, os.path.basename(derived_file))
+            if os.path.abspath(derived_file) != os.path.abspath(target_path):
+                shutil.copy(derived_file, target_path)
+        
+        self._save_metadata(scene_folder, metadata)
+        
+        return metadata
+    
     def _extract_characters_from_text(self, text: str) -> List[str]:
         all_characters = self.char_mgr.get_all_characters()
         found_characters = []
@@ -116,7 +228,6 @@ class SceneComposer:
         return description
     
     def _save_metadata(self, folder: str, metadata: Dict):
-        import json
         metadata_path = os.path.join(folder, "metadata.json")
         
         serializable_metadata = {
@@ -131,11 +242,22 @@ class SceneComposer:
         
         with open(metadata_path, 'w', encoding='utf-8') as f:
             json.dump(serializable_metadata, f, ensure_ascii=False, indent=2)
+        
+        self._touch_scene_index_marker(os.path.dirname(folder))
+    
+    def _touch_scene_index_marker(self, output_dir: str):
+        marker_path = os.path.join(output_dir, SCENE_INDEX_MARKER)
+        try:
+            os.close(os.open(marker_path, os.O_CREAT | os.O_WRONLY, 0o644))
+            os.utime(marker_path, None)
+        except OSError as e:
+            print(f"更新场景索引标记失败: {e}")
     
     def create_scene_with_ai_analysis(self, scene_index: int, 
                                      scene_info: Dict,
                                      generate_video: bool = False,
-                                     generate_storyboard: bool = True) -> Dict:
+                                     generate_storyboard: bool = True,
+                                     appearance_counts: Optional[Dict[str, int]] = None) -> Dict:
         scene_folder = os.path.join(self.output_dir, f"scene_{scene_index:04d}")
         os.makedirs(scene_folder, exist_ok=True)
         
@@ -143,53 +265,18 @@ class SceneComposer:
         scene_description = scene_info.get('description', '')
         characters_in_scene = scene_info.get('characters', [])
         
-        character_prompts = []
-        for char in characters_in_scene:
-            if self.char_mgr.get_character(char):
-                character_prompts.append(self.char_mgr.get_character_prompt(char))
-        
-        character_seeds = {char: self.char_mgr.get_character_seed(char) 
-                          for char in characters_in_scene 
-                          if self.char_mgr.get_character(char)}
+        character_prompts, character_seeds = self._prepare_character_context(characters_in_scene, appearance_counts)
         
-        for char in characters_in_scene:
-            if self.char_mgr.get_character(char):
-                self.char_mgr.increment_appearance_count(char)
-        
-        scene_image = self.image_gen.generate_scene_image(
+        output_image, output_audio, output_video = self._compose_scene_media(
+            scene_folder,
+            scene_index,
+            scene_text,
             scene_description,
-            characters=character_prompts,
-            character_seeds=character_seeds
+            character_prompts,
+            character_seeds,
+            generate_video
         )
         
-        output_image = None
-        if scene_image:
-            output_image = os.path.join(scene_folder, "scene.png")
-            import shutil
-            shutil.copy(scene_image, output_image)
-        
-        audio_file = self.tts_gen.generate_speech_for_scene(scene_text, scene_index)
-        
-        if audio_file:
-            output_audio = os.path.join(scene_folder, "narration.mp3")
-            if audio_file != output_audio:
-                import shutil
-                shutil.copy(audio_file, output_audio)
-        else:
-            output_audio = None
-        
-        output_video = None
-        if generate_video and self.video_gen and scene_image:
-            video_file = self.video_gen.generate_video(
-                prompt=scene_description,
-                image_path=scene_image
-            )
-            if video_file:
-                output_video = os.path.join(scene_folder, "scene.mp4")
-                if video_file != output_video:
-                    import shutil
-                    shutil.copy(video_file, output_video)
-        
         metadata = {
             'scene_index': scene_index,
             'text': scene_text,
@@ -224,7 +311,8 @@ class SceneComposer:
     def create_scene_from_storyboard(self, scene_index: int, 
                                     panel_info: Dict,
                                     character_designs: Dict[str, str],
-                                    generate_video: bool = False) -> Dict:
+                                    generate_video: bool = False,
+                                    appearance_counts: Optional[Dict[str, int]] = None) -> Dict:
         scene_folder = os.path.join(self.output_dir, f"scene_{scene_index:04d}")
         os.makedirs(scene_folder, exist_ok=True)
         
@@ -273,52 +361,18 @@ class SceneComposer:
         scene_description = ", ".join(prompt_parts)
         scene_description += ", 漫画分镜风格, 动漫风格, 高质量, 细节丰富"
         
-        character_prompts = []
-        for char in characters_in_scene:
-            if self.char_mgr.get_character(char):
-                character_prompts.append(self.char_mgr.get_character_prompt(char))
-        
-        character_seeds = {char: self.char_mgr.get_character_seed(char) 
-                          for char in characters_in_scene 
-                          if self.char_mgr.get_character(char)}
-        
-        for char in characters_in_scene:
-            if self.char_mgr.get_character(char):
-                self.char_mgr.increment_appearance_count(char)
+        character_prompts, character_seeds = self._prepare_character_context(characters_in_scene, appearance_counts)
         
-        scene_image = self.image_gen.generate_scene_image(
+        output_image, output_audio, output_video = self._compose_scene_media(
+            scene_folder,
+            scene_index,
+            scene_text,
             scene_description,
-            characters=character_prompts,
-            character_seeds=character_seeds
+            character_prompts,
+            character_seeds,
+            generate_video
         )
         
-        output_image = None
-        if scene_image:
-            output_image = os.path.join(scene_folder, "scene.png")
-            import shutil
-            shutil.copy(scene_image, output_image)
-        
-        audio_file = self.tts_gen.generate_speech_for_scene(scene_text, scene_index)
-        
-        if audio_file:
-            output_audio = os.path.join(scene_folder, "narration.mp3")
-            if audio_file != output_audio:
-                shutil.copy(audio_file, output_audio)
-        else:
-            output_audio = None
-        
-        output_video = None
-        if generate_video and self.video_gen and scene_image:
-            video_file = self.video_gen.generate_video(
-                prompt=scene_description,
-                image_path=scene_image
-            )
-            if video_file:
-                output_video = os.path.join(scene_folder, "scene.mp4")
-                if video_file != output_video:
-                    import shutil
-                    shutil.copy(video_file, output_video)
-        
         metadata = {
             'scene_index': scene_index,
             'shot_type': shot_type,
@@ -0,0 +1,56 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional, Callable, Tuple
+
+from scene_composer import SceneComposer, SCENE_INDEX_MARKER
+
+
+class SceneIndexCache:
+    def __init__(self, max_tasks: int = 256):
+        self.max_tasks = max_tasks
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+    
+    def _marker_version(self, task_id: str) -> Optional[int]:
+        marker_path = os.path.join(SceneComposer.get_output_dir(task_id), SCENE_INDEX_MARKER)
+        try:
+            return os.stat(marker_path).st_mtime_ns
+        except OSError:
+            return None
+    
+    def _get_entry(self, task_id: str) -> Dict:
+        version = self._marker_version(task_id)
+        with self._lock:
+            entry = self._entries.get(task_id)
+            if entry is None or entry['version'] != version:
+                entry = {'version': version, 'scenes': {}, 'scene_list': None}
+                self._entries[task_id] = entry
+            self._entries.move_to_end(task_id)
+            while len(self._entries) > self.max_tasks:
+                self._entries.popitem(last=False)
+            return entry
+    
+    def get_scene_list(self, task_id: str) -> Optional[List[Tuple[int, str]]]:
+        return self._get_entry(task_id)['scene_list']
+    
+    def set_scene_list(self, task_id: str, scene_list: List[Tuple[int, str]]):
+        entry = self._get_entry(task_id)
+        with self._lock:
+            entry['scene_list'] = list(scene_list)
+    
+    def get_scenes(self, task_id: str, scene_folders: List[str], loader: Callable[[str], Optional[Dict]]) -> List[Dict]:
+        entry = self._get_entry(task_id)
+        cached = entry['scenes']
+        
+        scenes = []
+        for scene_folder in scene_folders:
+            scene_data = cached.get(scene_folder)
+            if scene_data is None:
+                scene_data = loader(scene_folder)
+                if scene_data is None:
+                    continue
+                with self._lock:
+                    cached[scene_folder] = scene_data
+            scenes.append(scene_data)
+        return scenes
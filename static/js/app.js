@@ -1,6 +1,7 @@
 let currentTaskId = null;
 let scenes = [];
 let currentSceneIndex = 0;
+let sceneCursor = null;
 let isPlaying = false;
 let audioPlayer = null;
 let videoPlayer = null;
@@ -272,6 +273,8 @@ async function handleStartGenerate() {
             
             if (response.ok) {
                 currentTaskId = data.task_id;
+                scenes = [];
+                sceneCursor = null;
                 pollStatus();
             } else {
                 if (response.status === 401) {
@@ -316,6 +319,8 @@ async function handleStartGenerate() {
             
             if (response.ok) {
                 currentTaskId = data.task_id;
+                scenes = [];
+                sceneCursor = null;
                 pollStatus();
             } else {
                 if (response.status === 401) {
@@ -333,11 +338,13 @@ async function handleStartGenerate() {
     }
 }
 
-async function pollStatus() {
+async function pollStatus(version) {
     if (!currentTaskId) return;
 
+    const query = version === undefined ? '' : `?version=${version}&timeout=25`;
+
     try {
-        const response = await fetch(`/api/status/${currentTaskId}`, {
+        const response = await fetch(`/api/status/${currentTaskId}${query}`, {
             credentials: 'include'
         });
         const data = await response.json();
@@ -345,18 +352,24 @@ async function pollStatus() {
         if (response.ok) {
             updateProgress(data);
 
-            if (data.status === 'processing') {
-                setTimeout(pollStatus, 2000);
+            if (data.status === 'processing' || data.status === 'queued') {
+                if (data.completed_scenes && data.completed_scenes.length > scenes.length) {
+                    await loadNewScenes();
+                }
+                pollStatus(data.version || 0);
             } else if (data.status === 'completed') {
                 await loadScenes();
             } else if (data.status === 'error') {
                 alert('生成失败: ' + data.message);
                 resetUploadSection();
+            } else if (data.status === 'cancelled') {
+                alert('任务已取消');
+                resetUploadSection();
             }
         }
     } catch (error) {
         console.error('获取状态失败:', error);
-        setTimeout(pollStatus, 2000);
+        setTimeout(() => pollStatus(version), 2000);
     }
 }
 
@@ -365,24 +378,56 @@ function updateProgress(data) {
     const progressText = document.getElementById('progress-text');
 
     progressFill.style.width = data.progress + '%';
-    progressText.textContent = data.message;
+    progressText.textContent = data.status === 'queued' && data.queue_position
+        ? `${data.message}（前面还有 ${data.queue_position - 1} 个任务）`
+        : data.message;
+}
+
+async function loadNewScenes() {
+    try {
+        const query = sceneCursor === null ? '' : `&since=${sceneCursor}`;
+        const response = await fetch(`/api/scenes/${currentTaskId}?image_size=web${query}`, {
+            credentials: 'include'
+        });
+        const data = await response.json();
+
+        if (!response.ok || data.scenes.length === 0) return;
+
+        scenes = scenes.concat(data.scenes);
+        sceneCursor = data.next_since;
+
+        const playerSection = document.getElementById('player-section');
+        if (playerSection.classList.contains('hidden')) {
+            playerSection.classList.remove('hidden');
+            displayScene(0);
+        } else {
+            document.getElementById('scene-counter').textContent = `分镜 ${currentSceneIndex + 1} / ${scenes.length}`;
+        }
+    } catch (error) {
+        console.error('加载新场景失败:', error);
+    }
 }
 
 async function loadScenes() {
     try {
-        const response = await fetch(`/api/scenes/${currentTaskId}`, {
+        const response = await fetch(`/api/scenes/${currentTaskId}?image_size=web`, {
             credentials: 'include'
         });
         const data = await response.json();
 
         if (response.ok) {
+            const alreadyWatching = scenes.length > 0 && !document.getElementById('player-section').classList.contains('hidden');
             scenes = data.scenes;
-            currentSceneIndex = 0;
 
             document.getElementById('progress-section').classList.add('hidden');
             document.getElementById('player-section').classList.remove('hidden');
 
-            displayScene(0);
+            if (alreadyWatching) {
+                document.getElementById('scene-counter').textContent = `分镜 ${currentSceneIndex + 1} / ${scenes.length}`;
+            } else {
+                currentSceneIndex = 0;
+                displayScene(0);
+            }
         } else {
             alert('加载场景失败: ' + data.error);
         }
@@ -680,7 +725,7 @@ function displayHistory(history) {
 
 async function loadPlayback(sessionId) {
     try {
-        const response = await fetch(`/api/scenes/${sessionId}`, {
+        const response = await fetch(`/api/scenes/${sessionId}?image_size=web`, {
             credentials: 'include'
         });
         const data = await response.json();
@@ -765,6 +810,21 @@ async function handleDownload() {
     }, 500);
 
     try {
+        let mergeStatus = 'merging';
+        while (mergeStatus === 'merging' || mergeStatus === 'missing') {
+            const statusResponse = await fetch(`/api/download/${currentTaskId}/status`, {
+                credentials: 'include'
+            });
+            const statusData = await statusResponse.json();
+            if (!statusResponse.ok || statusData.status === 'error') {
+                throw new Error(statusData.error || statusData.message || '视频合并失败');
+            }
+            mergeStatus = statusData.status;
+            if (mergeStatus !== 'ready') {
+                await new Promise(resolve => setTimeout(resolve, 2000));
+            }
+        }
+
         const downloadUrl = `/api/download/${currentTaskId}`;
         
         const response = await fetch(downloadUrl, {
@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict
+
+
+FINISHED_STATUSES = ('completed', 'error', 'cancelled')
+
+
+class InMemoryStatusStore:
+    def __init__(self, ttl_seconds: float = 24 * 3600, eviction_interval: float = 60):
+        self.ttl_seconds = ttl_seconds
+        self.eviction_interval = eviction_interval
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._last_eviction = time.monotonic()
+    
+    def get(self, task_id: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(task_id)
+            return dict(entry['status']) if entry else None
+    
+    def get_version(self, task_id: str) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(task_id)
+            return entry['status']['version'] if entry else None
+    
+    def set(self, task_id: str, status: Dict) -> int:
+        return self._write(task_id, status, merge=False)
+    
+    def update(self, task_id: str, fields: Dict) -> int:
+        return self._write(task_id, fields, merge=True)
+    
+    def _write(self, task_id: str, fields: Dict, merge: bool) -> int:
+        with self._lock:
+            entry = self._entries.get(task_id)
+            previous = entry['status'] if entry else {}
+            status = dict(previous, **fields) if merge else dict(fields)
+            status['version'] = previous.get('version', 0) + 1
+            self._entries[task_id] = {'status': status, 'updated_at': time.time()}
+            self._maybe_evict()
+            return status['version']
+    
+    def evict_expired(self) -> int:
+        with self._lock:
+            return self._evict()
+    
+    def _maybe_evict(self):
+        if time.monotonic() - self._last_eviction >= self.eviction_interval:
+            self._evict()
+    
+    def _evict(self) -> int:
+        self._last_eviction = time.monotonic()
+        cutoff = time.time() - self.ttl_seconds
+        expired = [task_id for task_id, entry in self._entries.items()
+                   if entry['status'].get('status') in FINISHED_STATUSES and entry['updated_at'] < cutoff]
+        for task_id in expired:
+            del self._entries[task_id]
+        return len(expired)
+
+
+class SQLiteStatusStore:
+    def __init__(self, db_path: str, ttl_seconds: float = 24 * 3600, eviction_interval: float = 60):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.eviction_interval = eviction_interval
+        self._last_eviction = time.monotonic()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._init_db()
+    
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+    
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS task_status (
+                    task_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_task_status_updated
+                ON task_status (status, updated_at)
+            ''')
+    
+    def get(self, task_id: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute('SELECT state FROM task_status WHERE task_id = ?', (task_id,)).fetchone()
+        return json.loads(row['state']) if row else None
+    
+    def get_version(self, task_id: str) -> Optional[int]:
+        with self._connect() as conn:
+            row = conn.execute('SELECT version FROM task_status WHERE task_id = ?', (task_id,)).fetchone()
+        return row['version'] if row else None
+    
+    def set(self, task_id: str, status: Dict) -> int:
+        return self._write(task_id, status, merge=False)
+    
+    def update(self, task_id: str, fields: Dict) -> int:
+        return self._write(task_id, fields, merge=True)
+    
+    def _write(self, task_id: str, fields: Dict, merge: bool) -> int:
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT state FROM task_status WHERE task_id = ?', (task_id,)).fetchone()
+                previous = json.loads(row['state']) if row else {}
+                status = dict(previous, **fields) if merge else dict(fields)
+                status['version'] = previous.get('version', 0) + 1
+                conn.execute('''
+                    INSERT OR REPLACE INTO task_status (task_id, status, state, version, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (task_id, status.get('status', ''), json.dumps(status, ensure_ascii=False),
+                      status['version'], time.time()))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        
+        if time.monotonic() - self._last_eviction >= self.eviction_interval:
+            self.evict_expired()
+        return status['version']
+    
+    def evict_expired(self) -> int:
+        self._last_eviction = time.monotonic()
+        placeholders = ', '.join('?' for _ in FINISHED_STATUSES)
+        with self._connect() as conn:
+            cursor = conn.execute(f'''
+                DELETE FROM task_status
+                WHERE status IN ({placeholders}) AND updated_at < ?
+            ''', (*FINISHED_STATUSES, time.time() - self.ttl_seconds))
+            return cursor.rowcount
+
+
+def create_status_store(spec: str = "memory", default_db_path: str = "generation_status.db",
+                        ttl_seconds: float = 24 * 3600):
+    backend, _, location = spec.partition(':')
+    if backend == 'memory':
+        return InMemoryStatusStore(ttl_seconds=ttl_seconds)
+    if backend == 'sqlite':
+        return SQLiteStatusStore(location or default_db_path, ttl_seconds=ttl_seconds)
+    raise ValueError(f"不支持的状态存储类型: {spec}")
@@ -1,15 +1,27 @@
 from openai import OpenAI
-from typing import Dict, List
+from typing import Dict, List, Optional
+from parallel_executor import ParallelExecutor, RateLimiter
+from novel_analyzer import NovelAnalyzer
+from llm_cache import LLMResponseCache
 import json
 
 
+STORYBOARD_PROMPT_VERSION = "storyboard-v1"
+COMBINED_PROMPT_VERSION = "combined-v1"
+
+
 class StoryboardGenerator:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, max_workers: int = 1, max_requests_per_second: float = None,
+                 use_cache: bool = True):
         self.client = OpenAI(
             api_key=api_key,
             base_url="https://openai.qiniu.com/v1"
         )
         self.model = "deepseek/deepseek-v3.1-terminus"
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(max_requests_per_second)
+        self.temperature = 0.7
+        self.llm_cache = LLMResponseCache(enabled=use_cache)
     
     def generate_storyboard_from_novel(self, text: str, characters: List[Dict]) -> Dict:
         character_info = "\n".join([
@@ -61,30 +73,23 @@ class StoryboardGenerator:
 4. 每个分镜聚焦一个关键情节点
 5. 确保角色对话符合人物性格"""
 
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"请为以下小说文本生成分镜脚本：\n\n{text}"}
+        ]
+        
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"请为以下小说文本生成分镜脚本：\n\n{text}"}
-                ],
-                temperature=0.7,
-                max_tokens=8000
+            cache_key = self.llm_cache.make_key(self.model, STORYBOARD_PROMPT_VERSION, self.temperature, messages)
+            result_text = self.llm_cache.get_or_request(
+                cache_key, self.client, self.rate_limiter,
+                model=self.model, messages=messages, temperature=self.temperature, max_tokens=8000
             )
-            
-            result_text = response.choices[0].message.content
-            
-            result_text = result_text.strip()
-            if result_text.startswith("```json"):
-                result_text = result_text[7:]
-            if result_text.startswith("```"):
-                result_text = result_text[3:]
-            if result_text.endswith("```"):
-                result_text = result_text[:-3]
-            result_text = result_text.strip()
+            result_text = self._strip_code_fence(result_text)
             
             try:
                 result = json.loads(result_text)
+                if result.get('storyboard'):
+                    self.llm_cache.put(cache_key, result_text)
             except json.JSONDecodeError:
                 result = self._create_fallback_storyboard(text)
             
@@ -94,39 +99,131 @@ class StoryboardGenerator:
             print(f"分镜生成失败: {e}")
             return self._create_fallback_storyboard(text)
     
-    def generate_storyboard_in_chunks(self, text: str, characters: List[Dict], max_chunk_size: int = 2000, max_retries: int = 3) -> Dict:
+    def generate_combined_from_novel(self, text: str) -> Dict:
+        system_prompt = """你是一个专业的小说分析助手和漫画分镜师。请一次性完成以下两项工作：
+
+一、分析小说文本，提取：
+1. 人物(Characters)：出现的所有人物，包括外貌、性格特征、主要/次要角色
+2. 场景(Scenes)：场景描述、地点、时间、出场角色、叙述文本和对话（含情绪）
+
+二、根据同一段文本生成漫画分镜脚本，每个分镜包含：
+1. 镜头类型：特写/中景/全景/远景/过肩镜头
+2. 画面描述：画面内容、角色位置、动作、表情
+3. 对话内容、旁白、角色列表
+4. 情感基调：happy/sad/tense/calm/surprised/angry等
+5. 场景位置
+
+请以JSON格式返回结果，格式如下：
+{
+  "characters": [
+    {"name": "角色名", "appearance": "外貌描述", "personality": "性格特征", "role": "主要角色/次要角色"}
+  ],
+  "scenes": [
+    {
+      "scene_number": 1,
+      "description": "场景描述",
+      "location": "地点",
+      "time": "时间",
+      "characters": ["出现的角色"],
+      "narration": "场景叙述文本",
+      "dialogues": [{"character": "角色名", "text": "对话内容", "emotion": "情绪状态"}]
+    }
+  ],
+  "storyboard": [
+    {
+      "panel_number": 1,
+      "shot_type": "特写",
+      "visual_description": "画面描述，包含角色外貌特征保持一致性",
+      "dialogue": [{"character": "角色名", "text": "对话内容", "emotion": "情绪"}],
+      "narration": "旁白文本",
+      "characters": ["角色1", "角色2"],
+      "mood": "happy",
+      "location": "场景地点"
+    }
+  ]
+}
+
+重要规则：
+1. 分镜中的角色名必须与characters中的角色名一致，角色外貌必须与人物分析一致
+2. 场景描述应该详细，包含环境、氛围、人物位置等信息
+3. 合理运用不同镜头类型来增强叙事效果，每个分镜聚焦一个关键情节点
+4. 对话的emotion字段必须详细描述情绪"""
+        
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"请分析以下小说文本并生成分镜脚本：\n\n{text}"}
+        ]
+        
+        try:
+            cache_key = self.llm_cache.make_key(self.model, COMBINED_PROMPT_VERSION, self.temperature, messages)
+            result_text = self.llm_cache.get_or_request(
+                cache_key, self.client, self.rate_limiter,
+                model=self.model, messages=messages, temperature=self.temperature, max_tokens=12000
+            )
+            result_text = self._strip_code_fence(result_text)
+            
+            try:
+                result = json.loads(result_text)
+                if result.get('storyboard'):
+                    self.llm_cache.put(cache_key, result_text)
+            except json.JSONDecodeError:
+                result = self._create_fallback_combined(text)
+            
+            return result
+        
+        except Exception as e:
+            print(f"分析与分镜合并生成失败: {e}")
+            return self._create_fallback_combined(text)
+    
+    def generate_combined_in_chunks(self, text: str, max_chunk_size: int = 2000, max_retries: int = 3, max_workers: int = None) -> Dict:
+        chunks = self._split_text_into_chunks(text, max_chunk_size)
+        chunk_results = self.generate_combined_for_chunks(chunks, max_retries=max_retries, max_workers=max_workers)
+        
+        return self.merge_combined_results(chunk_results)
+    
+    def generate_combined_for_chunks(self, chunks: List[str], max_retries: int = 3, max_workers: int = None) -> List[Optional[Dict]]:
+        def generate_chunk(i, chunk):
+            print(f"分析并生成分镜 {i+1}/{len(chunks)}...")
+            return self._generate_chunk_with_retries(i, chunk, [], max_retries,
+                                                     generate_func=lambda chunk_text, _: self.generate_combined_from_novel(chunk_text))
+        
+        executor = ParallelExecutor(max_workers=max_workers or self.max_workers)
+        return executor.map_ordered(generate_chunk, chunks)
+    
+    def merge_combined_results(self, chunk_results: List[Optional[Dict]]) -> Dict:
+        analysis = NovelAnalyzer.merge_chunk_results([chunk_result or {} for chunk_result in chunk_results])
+        storyboard = self.assemble_storyboard(chunk_results)
+        
+        return {
+            "scenes": analysis['scenes'],
+            "characters": analysis['characters'],
+            **storyboard
+        }
+    
+    def generate_storyboard_in_chunks(self, text: str, characters: List[Dict], max_chunk_size: int = 2000, max_retries: int = 3, max_workers: int = None) -> Dict:
         chunks = self._split_text_into_chunks(text, max_chunk_size)
+        chunk_results = self.generate_storyboard_for_chunks(chunks, characters, max_retries=max_retries, max_workers=max_workers)
         
+        return self.assemble_storyboard(chunk_results)
+    
+    def generate_storyboard_for_chunks(self, chunks: List[str], characters: List[Dict], max_retries: int = 3, max_workers: int = None,
+                                       chunk_characters: List[List[Dict]] = None) -> List[Optional[Dict]]:
+        def generate_chunk(i, chunk):
+            print(f"生成分镜 {i+1}/{len(chunks)}...")
+            return self._generate_chunk_with_retries(i, chunk, chunk_characters[i] if chunk_characters is not None else characters, max_retries)
+        
+        executor = ParallelExecutor(max_workers=max_workers or self.max_workers)
+        return executor.map_ordered(generate_chunk, chunks)
+    
+    def assemble_storyboard(self, chunk_results: List[Optional[Dict]]) -> Dict:
         all_panels = []
         panel_counter = 0
         success_count = 0
         failure_count = 0
         
-        for i, chunk in enumerate(chunks):
-            print(f"生成分镜 {i+1}/{len(chunks)}...")
-            
-            chunk_result = None
-            retry_count = 0
-            
-            while retry_count < max_retries:
-                try:
-                    chunk_result = self.generate_storyboard_from_novel(chunk, characters)
-                    
-                    if chunk_result and chunk_result.get('storyboard'):
-                        success_count += 1
-                        break
-                    else:
-                        retry_count += 1
-                        if retry_count < max_retries:
-                            print(f"分镜 {i+1} 生成结果为空，重试 {retry_count}/{max_retries}...")
-                except Exception as e:
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        print(f"分镜 {i+1} 生成失败: {e}，重试 {retry_count}/{max_retries}...")
-                    else:
-                        print(f"分镜 {i+1} 生成失败，已达到最大重试次数: {e}")
-            
+        for i, chunk_result in enumerate(chunk_results):
             if chunk_result and chunk_result.get('storyboard'):
+                success_count += 1
                 for panel in chunk_result.get('storyboard', []):
                     panel['panel_number'] = panel_counter
                     panel_counter += 1
@@ -142,6 +239,31 @@ class StoryboardGenerator:
             "failure_count": failure_count
         }
     
+    def _generate_chunk_with_retries(self, i: int, chunk: str, characters: List[Dict], max_retries: int,
+                                     generate_func=None) -> Optional[Dict]:
+        generate_func = generate_func or self.generate_storyboard_from_novel
+        chunk_result = None
+        retry_count = 0
+        
+        while retry_count < max_retries:
+            try:
+                chunk_result = generate_func(chunk, characters)
+                
+                if chunk_result and chunk_result.get('storyboard'):
+                    break
+                else:
+                    retry_count += 1
+                    if retry_count < max_retries:
+                        print(f"分镜 {i+1} 生成结果为空，重试 {retry_count}/{max_retries}...")
+            except Exception as e:
+                retry_count += 1
+                if retry_count < max_retries:
+                    print(f"分镜 {i+1} 生成失败: {e}，重试 {retry_count}/{max_retries}...")
+                else:
+                    print(f"分镜 {i+1} 生成失败，已达到最大重试次数: {e}")
+        
+        return chunk_result
+    
     def _split_text_into_chunks(self, text: str, max_chunk_size: int) -> List[str]:
         paragraphs = [p.strip() for p in text.split('\n') if p.strip()]
         
@@ -171,6 +293,31 @@ class StoryboardGenerator:
         
         return chunks
     
+    def _strip_code_fence(self, result_text: str) -> str:
+        result_text = result_text.strip()
+        if result_text.startswith("```json"):
+            result_text = result_text[7:]
+        if result_text.startswith("```"):
+            result_text = result_text[3:]
+        if result_text.endswith("```"):
+            result_text = result_text[:-3]
+        return result_text.strip()
+    
+    def _create_fallback_combined(self, text: str) -> Dict:
+        return {
+            "scenes": [{
+                "scene_number": 1,
+                "description": text[:500] if len(text) > 500 else text,
+                "location": "",
+                "time": "",
+                "characters": [],
+                "narration": text,
+                "dialogues": []
+            }],
+            "characters": [],
+            **self._create_fallback_storyboard(text)
+        }
+    
     def _create_fallback_storyboard(self, text: str) -> Dict:
         return {
             "storyboard": [{
@@ -0,0 +1,170 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import shutil
+from unittest.mock import patch, MagicMock
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from anime_generator import AnimeGenerator
+
+
+NOVEL_TEXT = "第一章 开始\n张三走进教室。\n第二章 继续\n李四在操场跑步。\n第三章 结束\n两人一起回家。"
+EDITED_TEXT = "第一章 开始\n张三走进教室。\n第二章 继续\n李四在操场慢跑。\n第三章 结束\n两人一起回家。"
+
+
+def fake_analysis(chunk):
+    return {
+        'scenes': [{'description': chunk, 'narration': chunk, 'characters': []}],
+        'characters': [{'name': '张三', 'appearance': '黑发'}]
+    }
+
+
+def fake_storyboard(chunk, characters):
+    return {'storyboard': [{'narration': chunk, 'visual_description': chunk, 'characters': []}]}
+
+
+class TestAnimeGenerator(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.temp_dir)
+        
+        self.image_file = os.path.join(self.temp_dir, "image.png")
+        self.audio_file = os.path.join(self.temp_dir, "audio.mp3")
+        for path in (self.image_file, self.audio_file):
+            with open(path, 'w') as f:
+                f.write("data")
+    
+    def tearDown(self):
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.temp_dir)
+    
+    def _write_novel(self, name, text):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+    
+    def _create_generator(self, session_id):
+        generator = AnimeGenerator(openai_api_key="test_key", session_id=session_id,
+                                   max_scene_workers=2, use_llm_cache=False)
+        generator.novel_analyzer.analyze_novel_text = MagicMock(side_effect=fake_analysis)
+        generator.novel_analyzer.generate_character_design = MagicMock(return_value={'visual_keywords': '黑发'})
+        generator.storyboard_gen.generate_storyboard_from_novel = MagicMock(side_effect=fake_storyboard)
+        generator.image_gen.generate_character_image = MagicMock(return_value=None)
+        generator.image_gen.generate_scene_image = MagicMock(return_value=self.image_file)
+        generator.tts_gen.generate_speech_for_scene = MagicMock(return_value=self.audio_file)
+        return generator
+    
+    def test_generate_from_novel_storyboard_scenes_ordered(self):
+        generator = self._create_generator("session_a")
+        progress = []
+        
+        metadata = generator.generate_from_novel(
+            self._write_novel("novel.txt", NOVEL_TEXT),
+            progress_callback=lambda value, message: progress.append(value)
+        )
+        
+        self.assertEqual([s['scene_index'] for s in metadata['scenes']], [0, 1, 2])
+        self.assertEqual(progress, sorted(progress))
+        with open(os.path.join("anime_output", "session_a", "project_metadata.json"), encoding='utf-8') as f:
+            project = json.load(f)
+        self.assertEqual(len(project['chunks']), 3)
+        self.assertNotIn('chunks', metadata)
+    
+    def test_incremental_generation_only_redoes_changed_chapter(self):
+        first = self._create_generator("session_a")
+        first.generate_from_novel(self._write_novel("novel.txt", NOVEL_TEXT))
+        
+        second = self._create_generator("session_b")
+        metadata = second.generate_from_novel(
+            self._write_novel("novel_edited.txt", EDITED_TEXT),
+            previous_session_id="session_a"
+        )
+        
+        self.assertEqual(second.novel_analyzer.analyze_novel_text.call_count, 1)
+        self.assertIn('慢跑', second.novel_analyzer.analyze_novel_text.call_args[0][0])
+        self.assertEqual(second.storyboard_gen.generate_storyboard_from_novel.call_count, 1)
+        self.assertEqual(second.image_gen.generate_scene_image.call_count, 1)
+        self.assertEqual(len(metadata['scenes']), 3)
+        for scene in metadata['scenes']:
+            self.assertTrue(scene['folder'].startswith(os.path.join("output_scenes", "session_b")))
+            self.assertTrue(os.path.exists(os.path.join(scene['folder'], "scene.png")))
+    
+    def test_storyboard_only_receives_characters_named_in_chunk(self):
+        generator = self._create_generator("session_a")
+        
+        generator.generate_from_novel(self._write_novel("novel.txt", NOVEL_TEXT))
+        
+        calls = generator.storyboard_gen.generate_storyboard_from_novel.call_args_list
+        characters_by_chunk = {call[0][0].split('\n')[0]: [char['name'] for char in call[0][1]] for call in calls}
+        self.assertEqual(characters_by_chunk, {'第一章 开始': ['张三'], '第二章 继续': [], '第三章 结束': []})
+    
+    def test_new_character_or_design_does_not_regenerate_other_chunks(self):
+        first = self._create_generator("session_a")
+        first.generate_from_novel(self._write_novel("novel.txt", NOVEL_TEXT))
+        
+        second = self._create_generator("session_b")
+        second.novel_analyzer.generate_character_design = MagicMock(return_value={'visual_keywords': '红发'})
+        second.novel_analyzer.analyze_novel_text = MagicMock(side_effect=lambda chunk: dict(
+            fake_analysis(chunk), characters=[{'name': '李四', 'appearance': '短发'}]))
+        second.generate_from_novel(self._write_novel("novel_edited.txt", EDITED_TEXT), previous_session_id="session_a")
+        
+        regenerated = [call[0][0] for call in second.storyboard_gen.generate_storyboard_from_novel.call_args_list]
+        self.assertEqual(len(regenerated), 1)
+        self.assertIn('李四', regenerated[0])
+    
+    def test_resume_skips_completed_stages_and_scenes(self):
+        novel_path = self._write_novel("novel.txt", NOVEL_TEXT)
+        
+        first = self._create_generator("session_a")
+        original_create = first.scene_composer.create_scene_from_storyboard
+        
+        def crash_on_last(scene_index, **kwargs):
+            if scene_index == 2:
+                raise RuntimeError("服务器重启")
+            return original_create(scene_index=scene_index, **kwargs)
+        
+        first.scene_composer.create_scene_from_storyboard = MagicMock(side_effect=crash_on_last)
+        with self.assertRaises(RuntimeError):
+            first.generate_from_novel(novel_path)
+        
+        resumed = self._create_generator("session_a")
+        metadata = resumed.generate_from_novel(novel_path, resume=True)
+        
+        resumed.novel_analyzer.analyze_novel_text.assert_not_called()
+        resumed.novel_analyzer.generate_character_design.assert_not_called()
+        resumed.storyboard_gen.generate_storyboard_from_novel.assert_not_called()
+        self.assertEqual(resumed.image_gen.generate_scene_image.call_count, 1)
+        self.assertEqual([s['scene_index'] for s in metadata['scenes']], [0, 1, 2])
+    
+    def test_returning_character_hints_follow_scene_order(self):
+        generator = self._create_generator("session_a")
+        generator.storyboard_gen.generate_storyboard_from_novel = MagicMock(side_effect=lambda chunk, characters: {
+            'storyboard': [{'narration': chunk, 'visual_description': chunk, 'characters': ['张三']}]
+        })
+        
+        generator.generate_from_novel(self._write_novel("novel.txt", NOVEL_TEXT))
+        
+        hinted = {call.args[0]: 'previous scenes' in call.kwargs['characters'][0]
+                  for call in generator.image_gen.generate_scene_image.call_args_list}
+        self.assertEqual(sorted(hinted.values()), [False, True, True])
+        self.assertFalse([hint for description, hint in hinted.items() if '张三走进教室' in description][0])
+        self.assertEqual(generator.char_mgr.get_character('张三')['appearance_count'], 0)
+        self.assertEqual(generator._count_prior_appearances([
+            {'characters': ['张三']}, {'characters': ['张三', '李四']}, {'characters': ['李四']}
+        ]), [{'张三': 0}, {'张三': 1, '李四': 0}, {'李四': 1}])
+    
+    def test_previous_session_id_rejects_paths(self):
+        generator = self._create_generator("session_a")
+        
+        self.assertEqual(generator._load_previous_project("../etc"), {})
+        self.assertEqual(generator._load_previous_project("session_a"), {})
+        self.assertEqual(generator._load_previous_project("missing"), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
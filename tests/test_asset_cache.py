@@ -0,0 +1,70 @@
+import unittest
+import sys
+import os
+import hashlib
+import tempfile
+import shutil
+from unittest.mock import patch
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asset_cache import AssetDigestCache
+
+
+class TestAssetDigestCache(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "scene.png")
+        self._write(b"image")
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+    
+    def _write(self, content, mtime_offset=0):
+        with open(self.path, 'wb') as f:
+            f.write(content)
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + mtime_offset))
+    
+    def test_digest_is_content_hash(self):
+        cache = AssetDigestCache()
+        
+        self.assertEqual(cache.get_digest(self.path), hashlib.md5(b"image").hexdigest())
+    
+    def test_digest_cached_until_file_changes(self):
+        cache = AssetDigestCache()
+        cache.get_digest(self.path)
+        
+        with patch('builtins.open', side_effect=AssertionError("re-read")):
+            cache.get_digest(self.path)
+        
+        self._write(b"other image", mtime_offset=1000)
+        self.assertEqual(cache.get_digest(self.path), hashlib.md5(b"other image").hexdigest())
+    
+    def test_version_changes_with_file(self):
+        version = AssetDigestCache.get_version(self.path)
+        
+        self._write(b"image2", mtime_offset=1000)
+        
+        self.assertNotEqual(AssetDigestCache.get_version(self.path), version)
+    
+    def test_missing_file(self):
+        missing = os.path.join(self.temp_dir, "missing.png")
+        
+        self.assertIsNone(AssetDigestCache().get_digest(missing))
+        self.assertIsNone(AssetDigestCache.get_version(missing))
+    
+    def test_least_recently_used_digests_evicted(self):
+        cache = AssetDigestCache(max_entries=1)
+        other = os.path.join(self.temp_dir, "narration.mp3")
+        with open(other, 'wb') as f:
+            f.write(b"audio")
+        
+        cache.get_digest(self.path)
+        cache.get_digest(other)
+        
+        self.assertEqual(len(cache._digests), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import sys
+import os
+import numpy as np
+from unittest.mock import patch, MagicMock
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from audio_mixer import decode_to_pcm, concatenate_pcm, encode_pcm, trim_silence
+
+
+class TestAudioMixer(unittest.TestCase):
+    
+    def test_concatenate_inserts_gap_after_each_clip(self):
+        clips = [np.array([1, 2], dtype=np.int16), np.array([3], dtype=np.int16)]
+        
+        mixed = concatenate_pcm(clips, gap_ms=1, sample_rate=2000)
+        
+        self.assertEqual(mixed.tolist(), [1, 2, 0, 0, 3, 0, 0])
+        self.assertEqual(mixed.dtype, np.int16)
+    
+    def test_concatenate_empty(self):
+        self.assertEqual(len(concatenate_pcm([])), 0)
+    
+    def test_trim_silence_removes_quiet_edges_only(self):
+        samples = np.array([0, 5, -20, 300, 0, 0, -400, 10, 0], dtype=np.int16)
+        
+        self.assertEqual(trim_silence(samples).tolist(), [300, 0, 0, -400])
+        self.assertEqual(len(trim_silence(np.zeros(5, dtype=np.int16))), 0)
+        self.assertEqual(trim_silence(np.array([-32768], dtype=np.int16)).tolist(), [-32768])
+    
+    @patch('audio_mixer.subprocess.run')
+    def test_decode_returns_samples(self, mock_run):
+        mock_run.return_value = MagicMock(returncode=0, stdout=np.array([5, -5], dtype=np.int16).tobytes())
+        
+        samples = decode_to_pcm("clip.mp3")
+        
+        self.assertEqual(samples.tolist(), [5, -5])
+        self.assertIn("clip.mp3", mock_run.call_args[0][0])
+    
+    @patch('audio_mixer.subprocess.run')
+    def test_decode_bytes_through_pipe(self, mock_run):
+        mock_run.return_value = MagicMock(returncode=0, stdout=b"")
+        
+        decode_to_pcm(b"mp3 data")
+        
+        self.assertEqual(mock_run.call_args[1]['input'], b"mp3 data")
+    
+    @patch('audio_mixer.subprocess.run')
+    def test_decode_failure(self, mock_run):
+        mock_run.return_value = MagicMock(returncode=1, stderr=b"invalid data")
+        
+        self.assertIsNone(decode_to_pcm("broken.mp3"))
+    
+    @patch('audio_mixer.subprocess.run')
+    def test_encode_writes_once(self, mock_run):
+        mock_run.return_value = MagicMock(returncode=0)
+        samples = np.array([1, 2, 3], dtype=np.int16)
+        
+        self.assertTrue(encode_pcm(samples, "scene.mp3"))
+        
+        mock_run.assert_called_once()
+        self.assertEqual(mock_run.call_args[1]['input'], samples.tobytes())
+        self.assertEqual(mock_run.call_args[0][0][-1], "scene.mp3")
+
+
+if __name__ == '__main__':
+    unittest.main()
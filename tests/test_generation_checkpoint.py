@@ -0,0 +1,61 @@
+import unittest
+import sys
+import os
+import tempfile
+import shutil
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from generation_checkpoint import GenerationCheckpoint
+
+
+class TestGenerationCheckpoint(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        if os.path.exists(self.temp_dir):
+            shutil.rmtree(self.temp_dir)
+    
+    def test_stage_round_trip(self):
+        checkpoint = GenerationCheckpoint(self.temp_dir, "fp1")
+        
+        self.assertIsNone(checkpoint.load_stage('analysis'))
+        checkpoint.save_stage('analysis', {'scenes': [1, 2]})
+        
+        self.assertEqual(checkpoint.load_stage('analysis'), {'scenes': [1, 2]})
+    
+    def test_stage_ignored_when_fingerprint_changes(self):
+        GenerationCheckpoint(self.temp_dir, "fp1").save_stage('analysis', {'scenes': []})
+        
+        self.assertIsNone(GenerationCheckpoint(self.temp_dir, "fp2").load_stage('analysis'))
+    
+    def test_scene_requires_matching_fingerprint_and_files(self):
+        checkpoint = GenerationCheckpoint(self.temp_dir, "fp1")
+        scene_folder = os.path.join(self.temp_dir, "scene_0000")
+        os.makedirs(scene_folder)
+        with open(os.path.join(scene_folder, "metadata.json"), 'w') as f:
+            f.write("{}")
+        image_path = os.path.join(scene_folder, "scene.png")
+        with open(image_path, 'w') as f:
+            f.write("png")
+        
+        checkpoint.save_scene(0, {'fingerprint': 'scene_fp', 'folder': scene_folder, 'image_path': image_path})
+        
+        self.assertIsNotNone(checkpoint.load_scene(0, 'scene_fp'))
+        self.assertIsNone(checkpoint.load_scene(0, 'other_fp'))
+        
+        os.remove(image_path)
+        self.assertIsNone(checkpoint.load_scene(0, 'scene_fp'))
+    
+    def test_job_round_trip(self):
+        checkpoint = GenerationCheckpoint(self.temp_dir)
+        
+        self.assertIsNone(checkpoint.load_job())
+        checkpoint.save_job({'novel_path': 'novel.txt', 'max_scenes': 5})
+        
+        self.assertEqual(checkpoint.load_job()['max_scenes'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import unittest
+import sys
+import os
+import tempfile
+import shutil
+from unittest.mock import patch, MagicMock
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from job_queue import JobQueue, JobCancelledError
+from generation_worker import GenerationJobRunner
+from status_store import InMemoryStatusStore
+
+
+class TestGenerationJobRunner(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.queue = JobQueue(os.path.join(self.temp_dir, "jobs.db"))
+        self.store = InMemoryStatusStore()
+        self.params = {'novel_path': 'novel.txt', 'max_scenes': 2, 'user_id': 7}
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+    
+    @patch('generation_worker.AnimeGenerator')
+    def test_run_job_records_status_and_completion(self, mock_generator_class):
+        metadata = {'scenes': [{'scene_index': 0, 'folder': 'scene_0'}]}
+        
+        def fake_generate(novel_path, progress_callback=None, scene_callback=None, **kwargs):
+            progress_callback(50, '生成场景')
+            scene_callback({'scene_index': 0})
+            return metadata
+        
+        mock_generator_class.return_value.generate_from_novel.side_effect = fake_generate
+        on_completed = MagicMock()
+        runner = GenerationJobRunner(self.queue, self.store, on_completed=on_completed)
+        
+        runner.set_api_key("task", "key")
+        self.queue.enqueue("task", self.params)
+        runner.run_job(self.queue.claim_next("w"))
+        
+        on_completed.assert_called_once_with("task", metadata, 7)
+        state = self.store.get("task")
+        self.assertEqual(state['status'], 'completed')
+        self.assertEqual(state['metadata'], metadata)
+        self.assertEqual(state['completed_scenes'], [0])
+        self.assertEqual(state['version'], 5)
+        self.assertEqual(mock_generator_class.call_args[1]['openai_api_key'], "key")
+        self.assertFalse(mock_generator_class.return_value.generate_from_novel.call_args[1]['resume'])
+    
+    @patch('generation_worker.AnimeGenerator')
+    def test_completed_scenes_packaged_and_video_premerged(self, mock_generator_class):
+        metadata = {'scenes': [{'scene_index': 0, 'folder': 'scene_0'}]}
+        
+        def fake_generate(novel_path, progress_callback=None, scene_callback=None, **kwargs):
+            scene_callback({'scene_index': 0})
+            return metadata
+        
+        mock_generator_class.return_value.generate_from_novel.side_effect = fake_generate
+        video_assembler = MagicMock()
+        hls_packager = MagicMock()
+        runner = GenerationJobRunner(self.queue, self.store, video_assembler=video_assembler, hls_packager=hls_packager)
+        
+        runner.set_api_key("task", "key")
+        self.queue.enqueue("task", self.params)
+        runner.run_job(self.queue.claim_next("w"))
+        
+        hls_packager.request.assert_called_once_with([os.path.join("output_scenes", "task", "scene_0000")])
+        video_assembler.request.assert_called_once_with("task", ['scene_0'])
+    
+    @patch('generation_worker.AnimeGenerator')
+    def test_retried_job_resumes(self, mock_generator_class):
+        mock_generator_class.return_value.generate_from_novel.return_value = {'scenes': []}
+        runner = GenerationJobRunner(self.queue, self.store)
+        
+        runner.set_api_key("task", "key")
+        self.queue.enqueue("task", self.params)
+        self.queue.claim_next("w-0")
+        self.queue.requeue_interrupted(worker_prefix="w")
+        runner.run_job(self.queue.claim_next("w-0"))
+        
+        self.assertTrue(mock_generator_class.return_value.generate_from_novel.call_args[1]['resume'])
+    
+    @patch('generation_worker.AnimeGenerator')
+    def test_cancel_request_stops_job(self, mock_generator_class):
+        queue = self.queue
+        
+        def fake_generate(novel_path, progress_callback=None, **kwargs):
+            queue.cancel("task")
+            progress_callback(50, '生成场景')
+            return {'scenes': []}
+        
+        mock_generator_class.return_value.generate_from_novel.side_effect = fake_generate
+        on_completed = MagicMock()
+        runner = GenerationJobRunner(self.queue, self.store, on_completed=on_completed)
+        
+        runner.set_api_key("task", "key")
+        self.queue.enqueue("task", self.params)
+        with self.assertRaises(JobCancelledError):
+            runner.run_job(self.queue.claim_next("w"))
+        
+        on_completed.assert_not_called()
+        self.assertEqual(self.store.get("task")['status'], 'cancelled')
+    
+    @patch('generation_worker.AnimeGenerator')
+    def test_api_key_is_not_written_to_queue(self, mock_generator_class):
+        mock_generator_class.return_value.generate_from_novel.return_value = {'scenes': []}
+        runner = GenerationJobRunner(self.queue, self.store)
+        
+        runner.set_api_key("task", "secret")
+        self.queue.enqueue("task", self.params)
+        for path in (self.queue.db_path, f"{self.queue.db_path}-wal"):
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    self.assertNotIn(b"secret", f.read())
+        runner.run_job(self.queue.claim_next("w"))
+        
+        self.assertEqual(mock_generator_class.call_args[1]['openai_api_key'], "secret")
+        self.assertEqual(runner.api_keys, {})
+    
+    @patch.dict(os.environ, {'OPENAI_API_KEY': 'server-key'})
+    @patch('generation_worker.AnimeGenerator')
+    def test_keyed_job_is_only_claimed_by_the_process_holding_the_key(self, mock_generator_class):
+        mock_generator_class.return_value.generate_from_novel.return_value = {'scenes': []}
+        web_runner = GenerationJobRunner(self.queue, self.store)
+        external_runner = GenerationJobRunner(JobQueue(self.queue.db_path), self.store)
+        
+        web_runner.set_api_key("task", "user-key")
+        self.queue.enqueue("task", self.params, owner="web-a")
+        
+        self.assertIsNone(external_runner.job_queue.claim_next("worker-0", owner="worker"))
+        web_runner.run_job(self.queue.claim_next("web-a-0", owner="web-a"))
+        
+        self.assertEqual(mock_generator_class.call_args[1]['openai_api_key'], "user-key")
+        self.assertEqual(web_runner.api_keys, {})
+    
+    @patch.dict(os.environ, {'OPENAI_API_KEY': 'server-key'})
+    @patch('generation_worker.AnimeGenerator')
+    def test_keyed_job_of_lost_process_is_not_billed_to_server_key(self, mock_generator_class):
+        web_runner = GenerationJobRunner(self.queue, self.store)
+        external_runner = GenerationJobRunner(JobQueue(self.queue.db_path), self.store)
+        web_runner.set_api_key("task", "user-key")
+        self.queue.heartbeat("web-a")
+        self.queue.enqueue("task", self.params, owner="web-a")
+        with self.queue._connect() as conn:
+            conn.execute("UPDATE job_worker_leases SET heartbeat_at = 0")
+        
+        self.assertEqual(external_runner.job_queue.requeue_stale(lease_seconds=60), 1)
+        job = external_runner.job_queue.claim_next("worker-0", owner="worker")
+        with self.assertRaises(ValueError):
+            external_runner.run_job(job)
+        
+        mock_generator_class.assert_not_called()
+        self.assertEqual(self.store.get("task")['status'], 'error')
+        self.assertIn('恢复接口', self.store.get("task")['message'])
+    
+    @patch.dict(os.environ, {}, clear=True)
+    def test_missing_api_key_fails(self):
+        runner = GenerationJobRunner(self.queue, self.store)
+        
+        self.queue.enqueue("task", self.params)
+        with self.assertRaises(ValueError):
+            runner.run_job(self.queue.claim_next("w"))
+        
+        self.assertEqual(self.store.get("task")['status'], 'error')
+
+
+if __name__ == '__main__':
+    unittest.main()
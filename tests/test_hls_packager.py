@@ -0,0 +1,134 @@
+import unittest
+import sys
+import os
+import tempfile
+import shutil
+import threading
+from unittest.mock import patch, MagicMock
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hls_packager import HLSPackager
+
+
+class TestHLSPackager(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.scene_folder = os.path.join(self.temp_dir, "scene_0000")
+        os.makedirs(self.scene_folder)
+        self.source_path = os.path.join(self.scene_folder, "scene.mp4")
+        with open(self.source_path, 'wb') as f:
+            f.write(b"video")
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+    
+    def _fake_ffmpeg(self, command, **kwargs):
+        if '-f' in command and 'mpegts' in command:
+            with open(command[-1], 'wb') as f:
+                f.write(b"ts")
+            return MagicMock(returncode=0, stderr="")
+        return MagicMock(returncode=1, stderr="  Duration: 00:01:02.50, start: 0.000000, bitrate: 900 kb/s\n")
+    
+    @patch('hls_packager.subprocess.run')
+    def test_package_scene_remuxes_and_records_duration(self, mock_run):
+        mock_run.side_effect = self._fake_ffmpeg
+        
+        packaged = HLSPackager().package_scene(self.scene_folder)
+        
+        self.assertEqual(packaged, {'path': os.path.join(self.scene_folder, "stream.ts"), 'duration': 62.5})
+        self.assertIn('copy', mock_run.call_args_list[0][0][0])
+        self.assertEqual(HLSPackager.get_packaged_scene(self.scene_folder), packaged)
+        self.assertEqual([name for name in os.listdir(self.scene_folder) if name.startswith("partial_")], [])
+    
+    @patch('hls_packager.subprocess.run')
+    def test_concurrent_packagers_do_not_share_partial_files(self, mock_run):
+        outputs = []
+        both_remuxing = threading.Barrier(2, timeout=5)
+        
+        def fake_ffmpeg(command, **kwargs):
+            if '-f' in command and 'mpegts' in command:
+                outputs.append(command[-1])
+                both_remuxing.wait()
+            return self._fake_ffmpeg(command, **kwargs)
+        
+        mock_run.side_effect = fake_ffmpeg
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(HLSPackager().package_scene(self.scene_folder)))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(len(set(outputs)), 2)
+        self.assertEqual([result['duration'] for result in results], [62.5, 62.5])
+        self.assertEqual(sorted(os.listdir(self.scene_folder)), ["scene.mp4", "stream.json", "stream.ts"])
+    
+    @patch('hls_packager.subprocess.run')
+    def test_package_scene_is_single_flight_per_packager(self, mock_run):
+        mock_run.side_effect = self._fake_ffmpeg
+        packager = HLSPackager()
+        threads = [threading.Thread(target=packager.package_scene, args=(self.scene_folder,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        remux_calls = [call for call in mock_run.call_args_list if 'mpegts' in call[0][0]]
+        self.assertEqual(len(remux_calls), 1)
+    
+    @patch('hls_packager.subprocess.run')
+    def test_replaced_source_invalidates_segment(self, mock_run):
+        mock_run.side_effect = self._fake_ffmpeg
+        HLSPackager().package_scene(self.scene_folder)
+        
+        stat = os.stat(self.source_path)
+        os.utime(self.source_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+        
+        self.assertIsNone(HLSPackager.get_packaged_scene(self.scene_folder))
+    
+    @patch('hls_packager.subprocess.run')
+    def test_failed_scene_not_retried_until_source_changes(self, mock_run):
+        mock_run.return_value = MagicMock(returncode=1, stderr="error")
+        packager = HLSPackager()
+        
+        self.assertIsNone(packager.package_scene(self.scene_folder))
+        with patch.object(packager._executor, 'submit') as mock_submit:
+            packager.request([self.scene_folder])
+        mock_submit.assert_not_called()
+    
+    def test_request_deduplicates_pending_scenes(self):
+        packager = HLSPackager()
+        
+        with patch.object(packager._executor, 'submit') as mock_submit:
+            packager.request([self.scene_folder])
+            packager.request([self.scene_folder])
+        
+        mock_submit.assert_called_once_with(packager._package_and_release, self.scene_folder)
+    
+    def test_build_playlist(self):
+        playlist = HLSPackager.build_playlist([("/a/0.ts", 4.2), ("/a/1.ts", 6.0)], ended=True)
+        
+        self.assertEqual(playlist.splitlines(), [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+            "#EXT-X-TARGETDURATION:6",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+            "#EXTINF:4.200,",
+            "/a/0.ts",
+            "#EXT-X-DISCONTINUITY",
+            "#EXTINF:6.000,",
+            "/a/1.ts",
+            "#EXT-X-ENDLIST"
+        ])
+    
+    def test_unfinished_playlist_has_no_endlist(self):
+        playlist = HLSPackager.build_playlist([("/a/0.ts", 4.2)], ended=False)
+        
+        self.assertNotIn("#EXT-X-ENDLIST", playlist)
+
+
+if __name__ == '__main__':
+    unittest.main()
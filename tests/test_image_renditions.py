@@ -0,0 +1,58 @@
+import unittest
+import sys
+import os
+import tempfile
+import shutil
+from PIL import Image
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from image_renditions import create_image_renditions, get_rendition_path
+
+
+class TestImageRenditions(unittest.TestCase):
+    
+    def setUp(self):
+        self.scene_folder = tempfile.mkdtemp()
+        self.image_path = os.path.join(self.scene_folder, "scene.png")
+        Image.new('RGBA', (1792, 1024), (200, 50, 50, 255)).save(self.image_path)
+    
+    def tearDown(self):
+        shutil.rmtree(self.scene_folder)
+    
+    def test_create_renditions_in_each_size_and_format(self):
+        renditions = create_image_renditions(self.scene_folder)
+        
+        self.assertEqual(set(renditions), {'thumb', 'web'})
+        with Image.open(renditions['thumb']['webp']) as thumb:
+            self.assertEqual(thumb.format, 'WEBP')
+            self.assertEqual(thumb.size, (384, 219))
+        with Image.open(renditions['web']['jpeg']) as web:
+            self.assertEqual(web.format, 'JPEG')
+            self.assertEqual(web.size, (1280, 731))
+    
+    def test_small_image_not_upscaled(self):
+        Image.new('RGB', (300, 200)).save(self.image_path)
+        
+        renditions = create_image_renditions(self.scene_folder)
+        
+        with Image.open(renditions['web']['webp']) as web:
+            self.assertEqual(web.size, (300, 200))
+    
+    def test_rendition_outdated_after_image_changes(self):
+        create_image_renditions(self.scene_folder)
+        rendition_path = os.path.join(self.scene_folder, "scene_thumb.webp")
+        self.assertEqual(get_rendition_path(self.scene_folder, 'thumb', 'webp'), rendition_path)
+        
+        os.utime(rendition_path, (0, 0))
+        
+        self.assertIsNone(get_rendition_path(self.scene_folder, 'thumb', 'webp'))
+    
+    def test_missing_image(self):
+        os.remove(self.image_path)
+        
+        self.assertEqual(create_image_renditions(self.scene_folder), {})
+        self.assertIsNone(get_rendition_path(self.scene_folder, 'web', 'jpeg'))
+
+
+if __name__ == '__main__':
+    unittest.main()
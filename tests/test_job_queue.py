@@ -0,0 +1,175 @@
+import unittest
+import sys
+import os
+import time
+import tempfile
+import shutil
+import threading
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from job_queue import JobQueue, JobWorkerPool, JobCancelledError
+
+
+class TestJobQueue(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.queue = JobQueue(os.path.join(self.temp_dir, "jobs.db"))
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+    
+    def test_claim_order_respects_priority_then_fifo(self):
+        self.queue.enqueue("a", {"novel_path": "a.txt"})
+        self.queue.enqueue("b", {"novel_path": "b.txt"})
+        self.queue.enqueue("c", {"novel_path": "c.txt"}, priority=5)
+        
+        claimed = [self.queue.claim_next("w")['task_id'] for _ in range(3)]
+        
+        self.assertEqual(claimed, ["c", "a", "b"])
+        self.assertIsNone(self.queue.claim_next("w"))
+    
+    def test_queue_position(self):
+        self.queue.enqueue("a", {})
+        self.queue.enqueue("b", {})
+        self.queue.enqueue("c", {}, priority=1)
+        
+        self.assertEqual(self.queue.get_queue_position("c"), 1)
+        self.assertEqual(self.queue.get_queue_position("b"), 3)
+        
+        self.queue.claim_next("w")
+        self.assertIsNone(self.queue.get_queue_position("c"))
+        self.assertEqual(self.queue.get_queue_position("b"), 2)
+    
+    def test_cancel_queued_and_running(self):
+        self.queue.enqueue("a", {})
+        self.queue.enqueue("b", {})
+        self.queue.claim_next("w")
+        
+        self.assertEqual(self.queue.cancel("b"), "cancelled")
+        self.assertEqual(self.queue.cancel("a"), "cancelling")
+        self.assertTrue(self.queue.is_cancel_requested("a"))
+        self.assertEqual(self.queue.cancel("b"), "finished")
+        self.assertIsNone(self.queue.cancel("missing"))
+        self.assertIsNone(self.queue.claim_next("w"))
+    
+    def test_requeue_interrupted_jobs(self):
+        self.queue.enqueue("a", {"novel_path": "a.txt"})
+        self.queue.claim_next("worker-0")
+        
+        reopened = JobQueue(self.queue.db_path)
+        self.assertEqual(reopened.requeue_interrupted(), 1)
+        
+        job = reopened.claim_next("worker-1")
+        self.assertEqual(job['task_id'], "a")
+        self.assertEqual(job['attempts'], 2)
+        self.assertEqual(job['params'], {"novel_path": "a.txt"})
+    
+    def test_requeue_stale_only_touches_expired_leases(self):
+        self.queue.enqueue("live", {})
+        self.queue.enqueue("dead", {})
+        self.queue.enqueue("legacy", {})
+        self.queue.heartbeat("web-a")
+        self.queue.heartbeat("web-b")
+        self.queue.claim_next("web-a-0")
+        self.queue.claim_next("web-b-0")
+        self.queue.claim_next("web-0")
+        with self.queue._connect() as conn:
+            conn.execute("UPDATE job_worker_leases SET heartbeat_at = 0 WHERE worker_prefix = 'web-b'")
+        
+        self.assertEqual(self.queue.requeue_stale(lease_seconds=60), 2)
+        
+        self.assertEqual(self.queue.get_job("live")['status'], "running")
+        self.assertEqual(self.queue.get_job("dead")['status'], "queued")
+        self.assertEqual(self.queue.get_job("legacy")['status'], "queued")
+        with self.queue._connect() as conn:
+            prefixes = [row[0] for row in conn.execute('SELECT worker_prefix FROM job_worker_leases')]
+        self.assertEqual(prefixes, ["web-a"])
+    
+    def test_legacy_api_keys_are_scrubbed(self):
+        self.queue.enqueue("a", {})
+        with self.queue._connect() as conn:
+            conn.execute('ALTER TABLE generation_jobs ADD COLUMN api_key TEXT')
+            conn.execute("UPDATE generation_jobs SET api_key = 'secret'")
+        
+        reopened = JobQueue(self.queue.db_path)
+        
+        self.assertIsNone(reopened.get_job("a")['api_key'])
+        fresh = JobQueue(os.path.join(self.temp_dir, "fresh.db"))
+        fresh.enqueue("b", {})
+        self.assertNotIn('api_key', fresh.get_job("b"))
+
+
+class TestJobWorkerPool(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.queue = JobQueue(os.path.join(self.temp_dir, "jobs.db"))
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+    
+    def _wait_for(self, task_ids, statuses=("completed", "failed", "cancelled")):
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            if all(self.queue.get_job(t)['status'] in statuses for t in task_ids):
+                return
+            time.sleep(0.02)
+        self.fail("任务未在规定时间内结束")
+    
+    def test_pool_limits_concurrency_and_records_results(self):
+        lock = threading.Lock()
+        active = []
+        peak = []
+        
+        def handler(job):
+            with lock:
+                active.append(job['task_id'])
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.remove(job['task_id'])
+            if job['task_id'] == "bad":
+                raise RuntimeError("生成失败")
+            if job['task_id'] == "stop":
+                raise JobCancelledError(job['task_id'])
+        
+        task_ids = ["t0", "t1", "t2", "bad", "stop"]
+        for task_id in task_ids:
+            self.queue.enqueue(task_id, {})
+        
+        pool = JobWorkerPool(self.queue, handler, num_workers=2, poll_interval=0.05)
+        pool.start()
+        try:
+            self._wait_for(task_ids)
+        finally:
+            pool.stop(timeout=2)
+        
+        self.assertLessEqual(max(peak), 2)
+        self.assertEqual(self.queue.get_job("t0")['status'], "completed")
+        self.assertEqual(self.queue.get_job("bad")['status'], "failed")
+        self.assertEqual(self.queue.get_job("bad")['error'], "生成失败")
+        self.assertEqual(self.queue.get_job("stop")['status'], "cancelled")
+    
+    def test_pool_picks_up_jobs_of_lost_workers(self):
+        self.queue.enqueue("orphan", {})
+        self.queue.heartbeat("gone")
+        self.queue.claim_next("gone-0")
+        with self.queue._connect() as conn:
+            conn.execute("UPDATE job_worker_leases SET heartbeat_at = 0")
+        handled = []
+        
+        pool = JobWorkerPool(self.queue, lambda job: handled.append(job['task_id']),
+                             num_workers=1, worker_prefix="alive", poll_interval=0.05, lease_seconds=0.3)
+        pool.start()
+        try:
+            self._wait_for(["orphan"], statuses=("completed",))
+        finally:
+            pool.stop(timeout=2)
+        
+        self.assertEqual(handled, ["orphan"])
+        self.assertEqual(self.queue.get_job("orphan")['attempts'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
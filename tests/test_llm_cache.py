@@ -0,0 +1,134 @@
+import unittest
+import sys
+import os
+import time
+import tempfile
+import shutil
+from unittest.mock import patch, MagicMock
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from llm_cache import LLMResponseCache
+from novel_analyzer import NovelAnalyzer
+
+
+class TestLLMResponseCache(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.messages = [{"role": "user", "content": "文本"}]
+    
+    def tearDown(self):
+        if os.path.exists(self.temp_dir):
+            shutil.rmtree(self.temp_dir)
+    
+    def test_put_and_get(self):
+        cache = LLMResponseCache(cache_dir=self.temp_dir)
+        key = cache.make_key("model", "v1", 0.7, self.messages)
+        
+        self.assertIsNone(cache.get(key))
+        cache.put(key, '{"scenes": []}')
+        
+        self.assertEqual(cache.get(key), '{"scenes": []}')
+    
+    def test_get_or_request_only_calls_client_on_miss(self):
+        cache = LLMResponseCache(cache_dir=self.temp_dir)
+        client = MagicMock()
+        client.chat.completions.create.return_value.choices[0].message.content = "回复"
+        rate_limiter = MagicMock()
+        
+        cache.put("cached", "缓存内容")
+        self.assertEqual(cache.get_or_request("cached", client, rate_limiter, model="m", messages=self.messages), "缓存内容")
+        client.chat.completions.create.assert_not_called()
+        
+        self.assertEqual(cache.get_or_request("missing", client, rate_limiter, model="m", messages=self.messages), "回复")
+        rate_limiter.acquire.assert_called_once_with()
+        client.chat.completions.create.assert_called_once_with(model="m", messages=self.messages)
+        self.assertIsNone(cache.get("missing"))
+    
+    def test_key_depends_on_all_inputs(self):
+        cache = LLMResponseCache(cache_dir=self.temp_dir)
+        base = cache.make_key("model", "v1", 0.7, self.messages)
+        
+        self.assertEqual(base, cache.make_key("model", "v1", 0.7, [{"role": "user", "content": "文本"}]))
+        self.assertNotEqual(base, cache.make_key("other", "v1", 0.7, self.messages))
+        self.assertNotEqual(base, cache.make_key("model", "v2", 0.7, self.messages))
+        self.assertNotEqual(base, cache.make_key("model", "v1", 0.2, self.messages))
+        self.assertNotEqual(base, cache.make_key("model", "v1", 0.7, [{"role": "user", "content": "别的"}]))
+    
+    def test_disabled_cache_bypasses(self):
+        cache = LLMResponseCache(cache_dir=self.temp_dir, enabled=False)
+        key = cache.make_key("model", "v1", 0.7, self.messages)
+        
+        cache.put(key, "内容")
+        
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(os.listdir(self.temp_dir), [])
+    
+    def test_eviction_removes_oldest_entries(self):
+        cache = LLMResponseCache(cache_dir=self.temp_dir, max_size_mb=1)
+        cache.max_size_bytes = 2500
+        payload = "x" * 1000
+        
+        keys = []
+        for i in range(3):
+            key = cache.make_key("model", "v1", 0.7, [{"role": "user", "content": str(i)}])
+            cache.put(key, payload)
+            os.utime(cache._cache_path(key), (time.time() - 100 + i, time.time() - 100 + i))
+            keys.append(key)
+        
+        cache.put(cache.make_key("model", "v1", 0.7, [{"role": "user", "content": "3"}]), payload)
+        
+        self.assertIsNone(cache.get(keys[0]))
+        self.assertIsNotNone(cache.get(keys[2]))
+        self.assertLessEqual(cache._scan_total_size(), cache.max_size_bytes)
+
+
+class TestNovelAnalyzerCache(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        if os.path.exists(self.temp_dir):
+            shutil.rmtree(self.temp_dir)
+    
+    @patch('novel_analyzer.OpenAI')
+    def test_repeat_analysis_hits_cache(self, mock_openai):
+        mock_client = MagicMock()
+        mock_openai.return_value = mock_client
+        mock_response = MagicMock()
+        mock_choice = MagicMock()
+        mock_choice.message.content = '{"scenes": [{"description": "场景"}], "characters": []}'
+        mock_response.choices = [mock_choice]
+        mock_client.chat.completions.create.return_value = mock_response
+        
+        analyzer = NovelAnalyzer("test_api_key", use_cache=False)
+        analyzer.llm_cache = LLMResponseCache(cache_dir=self.temp_dir)
+        
+        first = analyzer.analyze_novel_text("同一段文本")
+        second = analyzer.analyze_novel_text("同一段文本")
+        
+        self.assertEqual(first, second)
+        mock_client.chat.completions.create.assert_called_once()
+    
+    @patch('novel_analyzer.OpenAI')
+    def test_unparseable_response_not_cached(self, mock_openai):
+        mock_client = MagicMock()
+        mock_openai.return_value = mock_client
+        mock_response = MagicMock()
+        mock_choice = MagicMock()
+        mock_choice.message.content = "不是JSON"
+        mock_response.choices = [mock_choice]
+        mock_client.chat.completions.create.return_value = mock_response
+        
+        analyzer = NovelAnalyzer("test_api_key", use_cache=False)
+        analyzer.llm_cache = LLMResponseCache(cache_dir=self.temp_dir)
+        
+        analyzer.analyze_novel_text("文本")
+        analyzer.analyze_novel_text("文本")
+        
+        self.assertEqual(mock_client.chat.completions.create.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,16 +1,21 @@
 import unittest
 import sys
 import os
+import time
 from unittest.mock import patch, MagicMock
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from novel_analyzer import NovelAnalyzer
+from llm_cache import LLMResponseCache
 
 
 class TestNovelAnalyzer(unittest.TestCase):
     
     def setUp(self):
         self.api_key = "test_api_key"
+        cache_patcher = patch('novel_analyzer.LLMResponseCache', lambda *args, **kwargs: LLMResponseCache(enabled=False))
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
     
     @patch('novel_analyzer.OpenAI')
     def test_init(self, mock_openai):
@@ -81,6 +86,33 @@ class TestNovelAnalyzer(unittest.TestCase):
         self.assertIn('scenes', result)
         self.assertIn('characters', result)
     
+    @patch('novel_analyzer.OpenAI')
+    def test_analyze_novel_in_chunks_parallel_matches_serial(self, mock_openai):
+        text = "\n".join(f"第{i}段" + "字" * 1500 for i in range(5))
+        
+        def fake_analyze(chunk):
+            if chunk.startswith("第0段"):
+                time.sleep(0.05)
+            label = chunk[:3]
+            return {
+                'scenes': [{'description': f'{label}-a'}, {'description': f'{label}-b'}],
+                'characters': [
+                    {'name': '张三', 'appearance': '' if label == '第0段' else f'{label}外貌'},
+                    {'name': label}
+                ]
+            }
+        
+        analyzer = NovelAnalyzer(self.api_key)
+        with patch.object(analyzer, 'analyze_novel_text', side_effect=fake_analyze):
+            serial = analyzer.analyze_novel_in_chunks(text, max_workers=1)
+        with patch.object(analyzer, 'analyze_novel_text', side_effect=fake_analyze):
+            parallel = analyzer.analyze_novel_in_chunks(text, max_workers=4)
+        
+        self.assertEqual(serial, parallel)
+        self.assertEqual([s['scene_number'] for s in parallel['scenes']], list(range(10)))
+        self.assertEqual(parallel['scenes'][0]['description'], '第0段-a')
+        self.assertEqual(parallel['characters'][0]['appearance'], '第1段外貌')
+    
     @patch('novel_analyzer.OpenAI')
     def test_generate_character_design_success(self, mock_openai):
         mock_client = MagicMock()
@@ -145,6 +145,14 @@ class TestNovelParser(unittest.TestCase):
         self.assertEqual(len(chapters), 1)
         self.assertIn('很长很长的章节标题', chapters[0]['title'])
 
+    
+    def test_split_into_sections_keeps_preamble(self):
+        text = "序言内容\n第一章 开始\n内容1\n第二章 继续\n内容2"
+        parser = NovelParser(text)
+        sections = parser.split_into_sections()
+        
+        self.assertEqual(sections, ['序言内容', '第一章 开始\n内容1', '第二章 继续\n内容2'])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+import sys
+import os
+import time
+import threading
+from unittest.mock import patch
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from parallel_executor import ParallelExecutor, RateLimiter
+
+
+class TestParallelExecutor(unittest.TestCase):
+    
+    def test_init_min_workers(self):
+        executor = ParallelExecutor(max_workers=0)
+        
+        self.assertEqual(executor.max_workers, 1)
+    
+    def test_map_ordered_serial(self):
+        executor = ParallelExecutor(max_workers=1)
+        
+        results = executor.map_ordered(lambda idx, item: item * 2, [1, 2, 3])
+        
+        self.assertEqual(results, [2, 4, 6])
+    
+    def test_map_ordered_parallel_keeps_order(self):
+        executor = ParallelExecutor(max_workers=4)
+        
+        def slow_first(idx, item):
+            if idx == 0:
+                time.sleep(0.05)
+            return item
+        
+        results = executor.map_ordered(slow_first, ['a', 'b', 'c', 'd'])
+        
+        self.assertEqual(results, ['a', 'b', 'c', 'd'])
+    
+    def test_map_ordered_reports_in_order(self):
+        executor = ParallelExecutor(max_workers=4)
+        reported = []
+        
+        def slow_first(idx, item):
+            if idx == 0:
+                time.sleep(0.05)
+            return item
+        
+        executor.map_ordered(slow_first, list(range(6)),
+                             on_result=lambda idx, result: reported.append(idx))
+        
+        self.assertEqual(reported, list(range(6)))
+    
+    def test_map_ordered_bounded_concurrency(self):
+        executor = ParallelExecutor(max_workers=2)
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+        
+        def work(idx, item):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.01)
+            with lock:
+                state['running'] -= 1
+            return item
+        
+        executor.map_ordered(work, list(range(8)))
+        
+        self.assertLessEqual(state['peak'], 2)
+    
+    def test_map_ordered_propagates_exception(self):
+        executor = ParallelExecutor(max_workers=3)
+        
+        def fail_on_two(idx, item):
+            if item == 2:
+                raise ValueError("boom")
+            return item
+        
+        with self.assertRaises(ValueError):
+            executor.map_ordered(fail_on_two, [1, 2, 3])
+    
+    def test_map_ordered_empty(self):
+        executor = ParallelExecutor(max_workers=4)
+        
+        self.assertEqual(executor.map_ordered(lambda idx, item: item, []), [])
+
+
+class TestRateLimiter(unittest.TestCase):
+    
+    @patch('parallel_executor.time.sleep')
+    def test_no_limit_never_sleeps(self, mock_sleep):
+        limiter = RateLimiter()
+        
+        for _ in range(5):
+            limiter.acquire()
+        
+        mock_sleep.assert_not_called()
+    
+    @patch('parallel_executor.time.sleep')
+    def test_limit_spaces_calls(self, mock_sleep):
+        limiter = RateLimiter(max_calls_per_second=10)
+        
+        limiter.acquire()
+        limiter.acquire()
+        
+        mock_sleep.assert_called_once()
+        self.assertAlmostEqual(mock_sleep.call_args[0][0], 0.1, delta=0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,11 @@
 import unittest
 import sys
 import os
+import time
+import threading
+import json
+import tempfile
+import shutil
 from unittest.mock import patch, MagicMock
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
@@ -201,6 +206,185 @@ class TestSceneComposer(unittest.TestCase):
         self.assertEqual(result['shot_type'], '特写')
         self.assertEqual(result['mood'], 'happy')
 
+    
+    @patch('scene_composer.os.makedirs')
+    @patch('scene_composer.shutil.copy')
+    def test_compose_scene_media_overlaps_image_and_tts(self, mock_copy, mock_makedirs):
+        image_started = threading.Event()
+        tts_saw_image_running = []
+        
+        def slow_image(*args, **kwargs):
+            image_started.set()
+            time.sleep(0.05)
+            return "/path/scene.png"
+        
+        def tts(text, index, output_path=None):
+            tts_saw_image_running.append(image_started.wait(1))
+            return "/path/audio.mp3"
+        
+        self.mock_image_gen.generate_scene_image.side_effect = slow_image
+        self.mock_tts_gen.generate_speech_for_scene.side_effect = tts
+        self.mock_video_gen.generate_video.return_value = "/path/video.mp4"
+        
+        composer = SceneComposer(
+            self.mock_image_gen,
+            self.mock_tts_gen,
+            self.mock_char_mgr,
+            self.mock_video_gen
+        )
+        
+        image, audio, video = composer._compose_scene_media(
+            "/test/scene_0000", 0, "文本", "描述", [], {}, True
+        )
+        
+        self.assertEqual(tts_saw_image_running, [True])
+        self.assertEqual(image, os.path.join("/test/scene_0000", "scene.png"))
+        self.assertEqual(audio, os.path.join("/test/scene_0000", "narration.mp3"))
+        self.assertEqual(video, os.path.join("/test/scene_0000", "scene.mp4"))
+        self.mock_video_gen.generate_video.assert_called_once_with(prompt="描述", image_path="/path/scene.png")
+    
+    @patch('scene_composer.os.makedirs')
+    @patch('scene_composer.shutil.copy')
+    def test_compose_scene_media_skips_video_without_image(self, mock_copy, mock_makedirs):
+        self.mock_image_gen.generate_scene_image.return_value = None
+        self.mock_tts_gen.generate_speech_for_scene.return_value = "/path/audio.mp3"
+        
+        composer = SceneComposer(
+            self.mock_image_gen,
+            self.mock_tts_gen,
+            self.mock_char_mgr,
+            self.mock_video_gen
+        )
+        
+        image, audio, video = composer._compose_scene_media(
+            "/test/scene_0001", 1, "文本", "描述", [], {}, True
+        )
+        
+        self.assertIsNone(image)
+        self.assertIsNotNone(audio)
+        self.assertIsNone(video)
+        self.mock_video_gen.generate_video.assert_not_called()
+    
+    
+    @patch('scene_composer.os.makedirs')
+    @patch('scene_composer.shutil.copy')
+    def test_compose_scene_media_prepares_still_scene_derivatives(self, mock_copy, mock_makedirs):
+        self.mock_image_gen.generate_scene_image.return_value = "/path/scene.png"
+        self.mock_tts_gen.generate_speech_for_scene.return_value = "/path/audio.mp3"
+        segment_encoder = MagicMock()
+        
+        composer = SceneComposer(
+            self.mock_image_gen,
+            self.mock_tts_gen,
+            self.mock_char_mgr,
+            segment_encoder=segment_encoder
+        )
+        
+        with patch('scene_composer.create_image_renditions') as mock_renditions:
+            composer._compose_scene_media("/test/scene_0002", 2, "文本", "描述", [], {}, False)
+        
+        segment_encoder.assert_called_once_with("/test/scene_0002")
+        mock_renditions.assert_called_once_with("/test/scene_0002")
+    
+    @patch('scene_composer.os.makedirs')
+    @patch('scene_composer.shutil.copy')
+    def test_compose_scene_media_skips_segment_for_video_scene(self, mock_copy, mock_makedirs):
+        self.mock_image_gen.generate_scene_image.return_value = "/path/scene.png"
+        self.mock_tts_gen.generate_speech_for_scene.return_value = "/path/audio.mp3"
+        self.mock_video_gen.generate_video.return_value = "/path/video.mp4"
+        segment_encoder = MagicMock()
+        
+        composer = SceneComposer(
+            self.mock_image_gen,
+            self.mock_tts_gen,
+            self.mock_char_mgr,
+            self.mock_video_gen,
+            segment_encoder=segment_encoder
+        )
+        
+        composer._compose_scene_media("/test/scene_0002", 2, "文本", "描述", [], {}, True)
+        
+        segment_encoder.assert_not_called()
+    
+    def test_get_still_segment_ignores_outdated_segment(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            for name in ("scene.png", "narration.mp3", "segment.mp4"):
+                with open(os.path.join(temp_dir, name), 'w') as f:
+                    f.write(name)
+            segment_path = os.path.join(temp_dir, "segment.mp4")
+            
+            self.assertEqual(SceneComposer.get_still_segment(temp_dir), segment_path)
+            
+            os.utime(segment_path, (0, 0))
+            self.assertIsNone(SceneComposer.get_still_segment(temp_dir))
+        finally:
+            shutil.rmtree(temp_dir)
+    
+    def test_reuse_scene_copies_previous_outputs(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            previous_folder = os.path.join(temp_dir, "old", "scene_0003")
+            os.makedirs(previous_folder)
+            for name in ("scene.png", "narration.mp3", "segment.mp4", "scene_thumb.webp"):
+                with open(os.path.join(previous_folder, name), 'w') as f:
+                    f.write(name)
+            with open(os.path.join(previous_folder, "metadata.json"), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'scene_index': 3,
+                    'text': '旧文本',
+                    'description': '描述',
+                    'characters': [],
+                    'image_path': os.path.join(previous_folder, "scene.png"),
+                    'audio_path': os.path.join(previous_folder, "narration.mp3"),
+                    'video_path': None
+                }, f, ensure_ascii=False)
+            
+            composer = SceneComposer(
+                self.mock_image_gen,
+                self.mock_tts_gen,
+                self.mock_char_mgr
+            )
+            composer.output_dir = os.path.join(temp_dir, "new")
+            
+            result = composer.reuse_scene(1, previous_folder)
+            
+            new_folder = os.path.join(temp_dir, "new", "scene_0001")
+            self.assertEqual(result['scene_index'], 1)
+            self.assertEqual(result['folder'], new_folder)
+            self.assertEqual(result['image_path'], os.path.join(new_folder, "scene.png"))
+            self.assertIsNone(result['video_path'])
+            self.assertTrue(os.path.exists(os.path.join(new_folder, "narration.mp3")))
+            self.assertEqual(SceneComposer.get_still_segment(new_folder), os.path.join(new_folder, "segment.mp4"))
+            self.assertTrue(os.path.exists(os.path.join(new_folder, "scene_thumb.webp")))
+            with open(os.path.join(new_folder, "metadata.json"), encoding='utf-8') as f:
+                self.assertEqual(json.load(f)['scene_index'], 1)
+            self.mock_image_gen.generate_scene_image.assert_not_called()
+        finally:
+            shutil.rmtree(temp_dir)
+    
+    def test_reuse_scene_missing_folder(self):
+        composer = SceneComposer(
+            self.mock_image_gen,
+            self.mock_tts_gen,
+            self.mock_char_mgr
+        )
+        
+        self.assertIsNone(composer.reuse_scene(0, "/nonexistent/scene_0000"))
+    
+    @patch('os.makedirs')
+    def test_get_scene_folder_matches_composer_output(self, mock_makedirs):
+        composer = SceneComposer(
+            self.mock_image_gen,
+            self.mock_tts_gen,
+            self.mock_char_mgr,
+            session_id="session_a"
+        )
+        
+        self.assertEqual(SceneComposer.get_scene_folder("session_a", 3),
+                         os.path.join(composer.output_dir, "scene_0003"))
+        self.assertEqual(SceneComposer.get_scene_folder(None, 3), os.path.join("output_scenes", "scene_0003"))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import shutil
+from unittest.mock import MagicMock
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scene_composer import SceneComposer
+from scene_index import SceneIndexCache
+
+
+class TestSceneIndexCache(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.temp_dir)
+        self.composer = SceneComposer(MagicMock(), MagicMock(), MagicMock(), session_id="task")
+        self.folders = [self._write_scene(i, f"文字{i}") for i in range(3)]
+    
+    def tearDown(self):
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.temp_dir)
+    
+    def _write_scene(self, scene_index, text):
+        folder = SceneComposer.get_scene_folder("task", scene_index)
+        os.makedirs(folder, exist_ok=True)
+        self.composer._save_metadata(folder, {
+            'scene_index': scene_index,
+            'text': text,
+            'description': '',
+            'characters': []
+        })
+        return folder
+    
+    def _loader(self, folder):
+        with open(os.path.join(folder, "metadata.json"), encoding='utf-8') as f:
+            return json.load(f)
+    
+    def test_repeat_requests_served_from_cache(self):
+        cache = SceneIndexCache()
+        loader = MagicMock(side_effect=self._loader)
+        
+        first = cache.get_scenes("task", self.folders, loader)
+        second = cache.get_scenes("task", self.folders, loader)
+        
+        self.assertEqual(first, second)
+        self.assertEqual(loader.call_count, 3)
+    
+    def test_scene_write_invalidates_index(self):
+        cache = SceneIndexCache()
+        cache.get_scenes("task", self.folders, self._loader)
+        cache.set_scene_list("task", [(0, self.folders[0])])
+        
+        marker_path = os.path.join(SceneComposer.get_output_dir("task"), "scenes.updated")
+        previous_mtime = os.stat(marker_path).st_mtime_ns
+        self._write_scene(1, "改写后的文字")
+        os.utime(marker_path, ns=(previous_mtime + 1000, previous_mtime + 1000))
+        
+        scenes = cache.get_scenes("task", self.folders, self._loader)
+        
+        self.assertEqual(scenes[1]['text'], "改写后的文字")
+        self.assertIsNone(cache.get_scene_list("task"))
+    
+    def test_missing_scene_not_cached(self):
+        cache = SceneIndexCache()
+        missing = SceneComposer.get_scene_folder("task", 9)
+        loader = MagicMock(return_value=None)
+        
+        self.assertEqual(cache.get_scenes("task", [missing], loader), [])
+        self.assertEqual(cache.get_scenes("task", [missing], loader), [])
+        self.assertEqual(loader.call_count, 2)
+    
+    def test_least_recently_used_tasks_evicted(self):
+        cache = SceneIndexCache(max_tasks=2)
+        for task_id in ("a", "b", "c"):
+            cache.set_scene_list(task_id, [(0, "folder")])
+        
+        self.assertIsNone(cache.get_scene_list("a"))
+        self.assertEqual(cache.get_scene_list("c"), [(0, "folder")])
+
+
+if __name__ == '__main__':
+    unittest.main()
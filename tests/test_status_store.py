@@ -0,0 +1,112 @@
+import unittest
+import sys
+import os
+import time
+import tempfile
+import shutil
+import threading
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from status_store import InMemoryStatusStore, SQLiteStatusStore, create_status_store
+
+
+class StatusStoreTests:
+    
+    def create_store(self, ttl_seconds=3600):
+        raise NotImplementedError
+    
+    def test_set_and_get_with_versions(self):
+        store = self.create_store()
+        
+        self.assertIsNone(store.get("task"))
+        self.assertEqual(store.set("task", {'status': 'queued', 'progress': 0}), 1)
+        self.assertEqual(store.set("task", {'status': 'processing', 'progress': 10}), 2)
+        
+        self.assertEqual(store.get("task"), {'status': 'processing', 'progress': 10, 'version': 2})
+        self.assertEqual(store.get_version("task"), 2)
+        self.assertIsNone(store.get_version("missing"))
+    
+    def test_update_merges_fields(self):
+        store = self.create_store()
+        store.set("task", {'status': 'processing', 'progress': 10, 'message': '分析中'})
+        
+        store.update("task", {'completed_scenes': [0]})
+        store.update("task", {'progress': 60})
+        
+        status = store.get("task")
+        self.assertEqual(status['message'], '分析中')
+        self.assertEqual(status['progress'], 60)
+        self.assertEqual(status['completed_scenes'], [0])
+        self.assertEqual(status['version'], 3)
+    
+    def test_concurrent_updates_are_not_lost(self):
+        store = self.create_store()
+        store.set("task", {'status': 'processing'})
+        
+        def worker(i):
+            for j in range(10):
+                store.update("task", {f"field_{i}_{j}": j})
+        
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        status = store.get("task")
+        self.assertEqual(status['version'], 41)
+        self.assertEqual(len([key for key in status if key.startswith('field_')]), 40)
+    
+    def test_evicts_only_expired_finished_entries(self):
+        store = self.create_store(ttl_seconds=0.05)
+        store.set("done", {'status': 'completed'})
+        store.set("running", {'status': 'processing'})
+        time.sleep(0.1)
+        
+        self.assertEqual(store.evict_expired(), 1)
+        self.assertIsNone(store.get("done"))
+        self.assertIsNotNone(store.get("running"))
+
+
+class TestInMemoryStatusStore(StatusStoreTests, unittest.TestCase):
+    
+    def create_store(self, ttl_seconds=3600):
+        return InMemoryStatusStore(ttl_seconds=ttl_seconds)
+
+
+class TestSQLiteStatusStore(StatusStoreTests, unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+    
+    def create_store(self, ttl_seconds=3600):
+        return SQLiteStatusStore(os.path.join(self.temp_dir, "status.db"), ttl_seconds=ttl_seconds)
+    
+    def test_status_shared_between_instances(self):
+        writer = self.create_store()
+        reader = self.create_store()
+        
+        writer.set("task", {'status': 'processing', 'progress': 30})
+        
+        self.assertEqual(reader.get("task")['progress'], 30)
+
+
+class TestCreateStatusStore(unittest.TestCase):
+    
+    def test_backends(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            self.assertIsInstance(create_status_store("memory"), InMemoryStatusStore)
+            store = create_status_store(f"sqlite:{os.path.join(temp_dir, 'status.db')}")
+            self.assertIsInstance(store, SQLiteStatusStore)
+            with self.assertRaises(ValueError):
+                create_status_store("redis")
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,16 +1,21 @@
 import unittest
 import sys
 import os
+import time
 from unittest.mock import patch, MagicMock
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from storyboard_generator import StoryboardGenerator
+from llm_cache import LLMResponseCache
 
 
 class TestStoryboardGenerator(unittest.TestCase):
     
     def setUp(self):
         self.api_key = "test_api_key"
+        cache_patcher = patch('storyboard_generator.LLMResponseCache', lambda *args, **kwargs: LLMResponseCache(enabled=False))
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
     
     @patch('storyboard_generator.OpenAI')
     def test_init(self, mock_openai):
@@ -85,6 +90,81 @@ class TestStoryboardGenerator(unittest.TestCase):
         
         self.assertIn('storyboard', result)
 
+    
+    @patch('storyboard_generator.OpenAI')
+    def test_generate_storyboard_in_chunks_parallel_order_and_counts(self, mock_openai):
+        text = "\n".join(f"第{i}段" + "字" * 1500 for i in range(4))
+        attempts = {}
+        
+        def fake_generate(chunk, characters):
+            label = chunk[:3]
+            attempts[label] = attempts.get(label, 0) + 1
+            if label == '第0段':
+                time.sleep(0.05)
+            if label == '第1段' and attempts[label] == 1:
+                raise Exception("临时错误")
+            if label == '第2段':
+                return {'storyboard': []}
+            return {'storyboard': [{'narration': f'{label}-a'}, {'narration': f'{label}-b'}]}
+        
+        generator = StoryboardGenerator(self.api_key)
+        with patch.object(generator, 'generate_storyboard_from_novel', side_effect=fake_generate):
+            result = generator.generate_storyboard_in_chunks(text, [], max_retries=2, max_workers=4)
+        
+        narrations = [p['narration'] for p in result['storyboard']]
+        self.assertEqual(narrations, ['第0段-a', '第0段-b', '第1段-a', '第1段-b', '第3段-a', '第3段-b'])
+        self.assertEqual([p['panel_number'] for p in result['storyboard']], list(range(6)))
+        self.assertEqual(result['success_count'], 3)
+        self.assertEqual(result['failure_count'], 1)
+        self.assertEqual(attempts['第1段'], 2)
+        self.assertEqual(attempts['第2段'], 2)
+    
+    
+    @patch('storyboard_generator.OpenAI')
+    def test_generate_combined_in_chunks(self, mock_openai):
+        text = "\n".join(f"第{i}段" + "字" * 1500 for i in range(3))
+        
+        def fake_combined(chunk):
+            label = chunk[:3]
+            return {
+                'characters': [{'name': '张三', 'appearance': f'{label}外貌'}],
+                'scenes': [{'description': f'{label}场景'}],
+                'storyboard': [{'narration': f'{label}分镜'}]
+            }
+        
+        generator = StoryboardGenerator(self.api_key)
+        with patch.object(generator, 'generate_combined_from_novel', side_effect=fake_combined) as mock_combined, \
+                patch.object(generator, 'generate_storyboard_from_novel') as mock_storyboard:
+            result = generator.generate_combined_in_chunks(text, max_workers=2)
+        
+        self.assertEqual(mock_combined.call_count, 3)
+        mock_storyboard.assert_not_called()
+        self.assertEqual([s['scene_number'] for s in result['scenes']], [0, 1, 2])
+        self.assertEqual([p['panel_number'] for p in result['storyboard']], [0, 1, 2])
+        self.assertEqual(result['storyboard'][2]['narration'], '第2段分镜')
+        self.assertEqual(len(result['characters']), 1)
+        self.assertEqual(result['characters'][0]['appearance'], '第0段外貌')
+        self.assertEqual(result['success_count'], 3)
+        self.assertEqual(result['failure_count'], 0)
+    
+    @patch('storyboard_generator.OpenAI')
+    def test_generate_combined_from_novel_invalid_json_fallback(self, mock_openai):
+        mock_client = MagicMock()
+        mock_openai.return_value = mock_client
+        
+        mock_response = MagicMock()
+        mock_choice = MagicMock()
+        mock_choice.message.content = "不是JSON"
+        mock_response.choices = [mock_choice]
+        mock_client.chat.completions.create.return_value = mock_response
+        
+        generator = StoryboardGenerator(self.api_key)
+        result = generator.generate_combined_from_novel("测试文本")
+        
+        self.assertEqual(len(result['storyboard']), 1)
+        self.assertEqual(len(result['scenes']), 1)
+        self.assertEqual(result['characters'], [])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -3,10 +3,13 @@ import sys
 import os
 import tempfile
 import shutil
+import threading
+import time
+import numpy as np
 from unittest.mock import patch, MagicMock
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from tts_generator import TTSGenerator
+from tts_generator import TTSGenerator, GTTSBackend, Pyttsx3Backend, create_tts_backend, split_sentences, SENTENCE_GAP_MS
 
 
 class TestTTSGenerator(unittest.TestCase):
@@ -93,7 +96,34 @@ class TestTTSGenerator(unittest.TestCase):
         result = self.generator.generate_speech_for_scene("场景文本", 5)
         
         self.assertIsNotNone(result)
-        self.assertIn('scene_0005.mp3', result)
+        self.assertEqual(os.path.dirname(result), self.temp_dir)
+        self.assertIn('audio_', result)
+    
+    @patch('tts_generator.gTTS')
+    def test_generate_speech_for_scene_exports_to_session_path(self, mock_gtts):
+        mock_gtts.return_value.save.side_effect = lambda path: open(path, 'w').write("audio")
+        session_dirs = [os.path.join(self.temp_dir, session) for session in ("session_a", "session_b")]
+        for session_dir in session_dirs:
+            os.makedirs(session_dir)
+        
+        results = [self.generator.generate_speech_for_scene("场景文本", 0, output_path=os.path.join(session_dir, "narration.mp3"))
+                   for session_dir in session_dirs]
+        
+        self.assertEqual(results, [os.path.join(session_dir, "narration.mp3") for session_dir in session_dirs])
+        self.assertEqual(mock_gtts.call_count, 1)
+        for result in results:
+            with open(result) as f:
+                self.assertEqual(f.read(), "audio")
+        self.assertFalse([name for name in os.listdir(self.temp_dir) if name.startswith('partial_')])
+    
+    @patch('tts_generator.gTTS')
+    def test_scene_audio_is_keyed_by_content_not_index(self, mock_gtts):
+        first = self.generator.generate_speech_for_scene("第一个会话的文本", 0)
+        second = self.generator.generate_speech_for_scene("第二个会话的文本", 0)
+        slow = self.generator.generate_speech("第一个会话的文本", voice_type='narrator', slow=True)
+        
+        self.assertEqual(len({first, second, slow}), 3)
+        self.assertEqual(mock_gtts.call_count, 3)
     
     @patch('tts_generator.gTTS')
     def test_generate_speech_empty_text(self, mock_gtts):
@@ -133,11 +163,11 @@ class TestTTSGenerator(unittest.TestCase):
         mock_tts_instance = MagicMock()
         mock_gtts.return_value = mock_tts_instance
         
-        result = self.generator.generate_speech_for_scene("文本", 0)
-        self.assertIn('scene_0000.mp3', result)
+        first = self.generator.generate_speech_for_scene("文本", 0)
+        second = self.generator.generate_speech_for_scene("文本", 9999)
         
-        result = self.generator.generate_speech_for_scene("文本", 9999)
-        self.assertIn('scene_9999.mp3', result)
+        self.assertEqual(first, second)
+        self.assertEqual(mock_gtts.call_count, 1)
     
     def test_cache_dir_exists_after_init(self):
         self.assertTrue(os.path.exists(self.generator.cache_dir))
@@ -162,6 +192,229 @@ class TestTTSGenerator(unittest.TestCase):
         
         self.assertNotEqual(result1, result2)
 
+    
+    @patch('tts_generator.encode_pcm', return_value=True)
+    @patch('tts_generator.decode_to_pcm')
+    def test_generate_multi_voice_scene_mixes_in_memory(self, mock_decode, mock_encode):
+        mock_decode.side_effect = lambda path: np.ones(3, dtype=np.int16) * (1 if 'narration' in path else 2)
+        self.generator.generate_speech = MagicMock(return_value="narration.mp3")
+        self.generator.generate_dialogue_speech = MagicMock(return_value="dialogue.mp3")
+        
+        result = self.generator.generate_multi_voice_scene("旁白", [{'character': '甲', 'text': '你好'}], 2)
+        
+        self.assertEqual(os.path.dirname(result), self.temp_dir)
+        self.assertTrue(os.path.basename(result).startswith("scene_"))
+        self.assertTrue(os.path.exists(result))
+        self.assertEqual(mock_decode.call_count, 2)
+        mixed, output_path = mock_encode.call_args[0]
+        self.assertEqual(os.path.dirname(output_path), self.temp_dir)
+        self.assertEqual(mixed[:3].tolist(), [1, 1, 1])
+        self.assertEqual(mixed[-3 - 12000:-12000].tolist(), [2, 2, 2])
+    
+    @patch('tts_generator.decode_to_pcm', return_value=None)
+    def test_generate_multi_voice_scene_falls_back_to_first_clip(self, mock_decode):
+        first_clip = os.path.join(self.temp_dir, "narration.mp3")
+        with open(first_clip, 'w') as f:
+            f.write("narration")
+        self.generator.generate_speech = MagicMock(return_value=first_clip)
+        self.generator.generate_dialogue_speech = MagicMock(return_value="dialogue.mp3")
+        
+        result = self.generator.generate_multi_voice_scene("旁白", [{'character': '甲', 'text': '你好'}], 2)
+        
+        with open(result) as f:
+            self.assertEqual(f.read(), "narration")
+    
+    def test_synthesize_lines_runs_concurrently_in_order(self):
+        generator = TTSGenerator(max_concurrency=4)
+        all_started = threading.Barrier(4, timeout=2)
+        
+        def fake_speech(text, output_filename=None, voice_type='default', slow=False):
+            all_started.wait()
+            return f"{text}.mp3"
+        
+        generator.generate_speech = MagicMock(side_effect=fake_speech)
+        lines = generator.build_scene_lines("旁白", [
+            {'character': '甲', 'text': '一'},
+            {'character': '乙', 'text': '二', 'emotion': 'sad'},
+            {'character': '甲', 'text': '三'}
+        ])
+        
+        results = generator.synthesize_lines(lines)
+        
+        self.assertEqual(results, ["旁白.mp3", "一.mp3", "二.mp3", "三.mp3"])
+        self.assertTrue(generator.generate_speech.call_args_list[2][1]['slow'])
+    
+    def test_build_scene_lines_skips_incomplete_dialogue(self):
+        lines = self.generator.build_scene_lines("", [{'character': '甲', 'text': ''}, {'text': '无名'}])
+        
+        self.assertEqual(lines, [])
+    
+    def _use_recording_backend(self):
+        backend = MagicMock()
+        backend.name = 'gtts'
+        backend.synthesize.side_effect = lambda text, path, voice_type='default', slow=False: open(path, 'w').close()
+        self.generator.backend = backend
+        return backend
+    
+    @patch('tts_generator.encode_pcm', return_value=True)
+    @patch('tts_generator.decode_to_pcm')
+    def test_generate_speech_synthesizes_each_sentence_once(self, mock_decode, mock_encode):
+        mock_decode.side_effect = lambda path: np.array([0, 3, 900, -900, 2, 0], dtype=np.int16)
+        backend = self._use_recording_backend()
+        
+        self.generator.generate_speech("第一句话在这里。第二句话在这里。第一句话在这里。")
+        self.generator.generate_speech("第二句话在这里。第三句话在这里。")
+        
+        synthesized = [call[0][0] for call in backend.synthesize.call_args_list]
+        self.assertEqual(sorted(synthesized), sorted(["第一句话在这里。", "第二句话在这里。", "第三句话在这里。"]))
+        self.assertEqual(mock_encode.call_count, 2)
+        mixed = mock_encode.call_args_list[0][0][0]
+        gap = 24000 * SENTENCE_GAP_MS // 1000
+        self.assertEqual(len(mixed), 3 * (2 + gap))
+        self.assertEqual(mixed[:2].tolist(), [900, -900])
+        self.assertEqual(mixed[2 + gap:4 + gap].tolist(), [900, -900])
+        self.assertFalse(mixed[2:2 + gap].any())
+    
+    @patch('tts_generator.decode_to_pcm')
+    def test_single_sentence_is_not_stitched(self, mock_decode):
+        backend = self._use_recording_backend()
+        
+        result = self.generator.generate_speech("只有一句话而已。")
+        
+        self.assertTrue(os.path.exists(result))
+        self.assertEqual(backend.synthesize.call_count, 1)
+        mock_decode.assert_not_called()
+    
+    @patch('tts_generator.decode_to_pcm', return_value=None)
+    def test_generate_speech_falls_back_to_single_request(self, mock_decode):
+        backend = self._use_recording_backend()
+        output_file = os.path.join(self.temp_dir, 'fallback.mp3')
+        
+        result = self.generator.generate_speech("第一句话在这里。第二句话在这里。", output_file)
+        
+        self.assertEqual(result, output_file)
+        self.assertTrue(os.path.exists(output_file))
+        text, partial_path = backend.synthesize.call_args[0]
+        self.assertEqual(text, "第一句话在这里。第二句话在这里。")
+        self.assertTrue(os.path.basename(partial_path).startswith("partial_"))
+        self.assertFalse(os.path.exists(partial_path))
+    
+    def test_split_sentences(self):
+        self.assertEqual(split_sentences("他走了。嗯。她说：“别走！”你要去哪里？"),
+                         ["他走了。嗯。", "她说：“别走！”", "你要去哪里？"])
+        self.assertEqual(split_sentences("她说：“别走！”然后呢？"), ["她说：“别走！”然后呢？"])
+        self.assertEqual(split_sentences("Hi there. OK then."), ["Hi there.", "OK then."])
+        self.assertEqual(split_sentences("Hello world. This is Mr. Smith. ok"),
+                         ["Hello world.", "This is Mr. Smith. ok"])
+        self.assertEqual(split_sentences("J. K. Rowling wrote it. Then she left."),
+                         ["J. K. Rowling wrote it.", "Then she left."])
+        self.assertEqual(split_sentences("She said hi. Yes. No way out."), ["She said hi.", "Yes. No way out."])
+        self.assertEqual(split_sentences(""), [])
+    
+    def test_split_sentences_breaks_long_sentence(self):
+        sentences = split_sentences("很长的句子，" * 50, max_chars=40)
+        
+        self.assertTrue(all(len(sentence) <= 40 for sentence in sentences))
+        self.assertEqual("".join(sentences), "很长的句子，" * 50)
+
+
+class FakeVoice:
+    def __init__(self, voice_id, languages, gender=None):
+        self.id = voice_id
+        self.name = voice_id
+        self.languages = languages
+        self.gender = gender
+
+
+class TestTTSBackends(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.engine = MagicMock()
+        self.engine.getProperty.return_value = [
+            FakeVoice('english', [b'\x05en-gb'], 'male'),
+            FakeVoice('mandarin-f', [b'\x05cmn'], 'female'),
+            FakeVoice('mandarin-m', [b'\x05cmn'], 'male')
+        ]
+        self.engine.save_to_file.side_effect = lambda text, path: open(path, 'w').close()
+        self.fake_pyttsx3 = MagicMock()
+        self.fake_pyttsx3.init.return_value = self.engine
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+    
+    def test_default_backend_is_gtts(self):
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertIsInstance(TTSGenerator().backend, GTTSBackend)
+    
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_tts_backend('unknown')
+    
+    def test_pyttsx3_backend_requires_package(self):
+        with patch.dict(sys.modules, {'pyttsx3': None}):
+            with self.assertRaises(ImportError):
+                create_tts_backend('pyttsx3')
+    
+    @patch('tts_generator.encode_pcm', return_value=True)
+    @patch('tts_generator.decode_to_pcm', return_value=np.zeros(10, dtype=np.int16))
+    def test_pyttsx3_backend_selected_by_environment(self, mock_decode, mock_encode):
+        with patch.dict(sys.modules, {'pyttsx3': self.fake_pyttsx3}), \
+                patch.dict(os.environ, {'TTS_BACKEND': 'pyttsx3'}):
+            generator = TTSGenerator()
+        generator.cache_dir = self.temp_dir
+        
+        result = generator.generate_speech("你好", voice_type='female', slow=True)
+        
+        self.assertIsInstance(generator.backend, Pyttsx3Backend)
+        self.engine.setProperty.assert_any_call('voice', 'mandarin-f')
+        self.engine.setProperty.assert_any_call('rate', 144)
+        samples, partial_path = mock_encode.call_args[0]
+        self.assertIs(samples, mock_decode.return_value)
+        self.assertEqual(os.path.dirname(partial_path), os.path.dirname(result))
+        self.assertTrue(os.path.exists(result))
+        self.assertEqual([name for name in os.listdir(self.temp_dir) if name.startswith("partial_")], [])
+    
+    def test_pyttsx3_voice_selection_prefers_language(self):
+        with patch.dict(sys.modules, {'pyttsx3': self.fake_pyttsx3}):
+            backend = Pyttsx3Backend('zh-cn')
+        
+        self.assertEqual(backend._voice_ids['male'], 'mandarin-m')
+        self.assertEqual(backend._voice_ids['narrator'], 'mandarin-f')
+    
+    @patch('tts_generator.encode_pcm', return_value=True)
+    @patch('tts_generator.decode_to_pcm', return_value=np.zeros(10, dtype=np.int16))
+    def test_pyttsx3_backends_share_engine_lock(self, mock_decode, mock_encode):
+        running = []
+        overlaps = []
+        
+        def run_and_wait():
+            running.append(1)
+            overlaps.append(len(running) > 1)
+            time.sleep(0.02)
+            running.pop()
+        
+        self.engine.runAndWait.side_effect = run_and_wait
+        with patch.dict(sys.modules, {'pyttsx3': self.fake_pyttsx3}):
+            backends = [Pyttsx3Backend('zh-cn') for _ in range(3)]
+        
+        threads = [threading.Thread(target=backend.synthesize, args=("你好", os.path.join(self.temp_dir, f"{i}.mp3")))
+                   for i, backend in enumerate(backends)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(overlaps, [False, False, False])
+    
+    def test_cache_separated_per_backend(self):
+        offline_backend = MagicMock()
+        offline_backend.name = 'pyttsx3'
+        
+        online = TTSGenerator(backend=GTTSBackend())
+        offline = TTSGenerator(backend=offline_backend)
+        
+        self.assertNotEqual(online._cache_key("文本_default"), offline._cache_key("文本_default"))
 
 if __name__ == '__main__':
     unittest.main()
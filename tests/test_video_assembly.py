@@ -0,0 +1,102 @@
+import unittest
+import sys
+import os
+import time
+import tempfile
+import shutil
+import threading
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from video_assembly import FinalVideoAssembler
+
+
+class FakeMerger:
+    calls = []
+    release = None
+    succeed = True
+    
+    def merge_scene_videos(self, scene_folders, output_path):
+        FakeMerger.calls.append(list(scene_folders))
+        if FakeMerger.release:
+            FakeMerger.release.wait(5)
+        if not FakeMerger.succeed:
+            return False
+        with open(output_path, 'w') as f:
+            f.write("video")
+        return True
+
+
+class TestFinalVideoAssembler(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.temp_dir)
+        FakeMerger.calls = []
+        FakeMerger.release = None
+        FakeMerger.succeed = True
+        self.folders = [os.path.join("output_scenes", "task", "scene_0000")]
+        os.makedirs(self.folders[0])
+        self.assembler = FinalVideoAssembler(output_dir="merged", merger_factory=FakeMerger)
+    
+    def tearDown(self):
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.temp_dir)
+    
+    def _touch_marker(self):
+        marker_path = os.path.join("output_scenes", "task", "scenes.updated")
+        with open(marker_path, 'a'):
+            pass
+        stamp = time.time() + len(FakeMerger.calls) + 1
+        os.utime(marker_path, (stamp, stamp))
+    
+    def test_assemble_produces_ready_video(self):
+        self.assertEqual(self.assembler.get_status("task", self.folders)['status'], 'missing')
+        
+        self.assertTrue(self.assembler.assemble("task", self.folders))
+        
+        self.assertEqual(self.assembler.get_status("task", self.folders)['status'], 'ready')
+        self.assertTrue(os.path.exists(self.assembler.get_output_path("task")))
+        self.assertFalse(os.path.exists(os.path.join("merged", "merged_task.lock")))
+    
+    def test_concurrent_requests_share_one_merge(self):
+        FakeMerger.release = threading.Event()
+        
+        statuses = [self.assembler.request("task", self.folders)['status'] for _ in range(5)]
+        FakeMerger.release.set()
+        self.assembler.assemble("task", self.folders)
+        
+        self.assertEqual(statuses, ['merging'] * 5)
+        self.assertEqual(len(FakeMerger.calls), 1)
+    
+    def test_scene_change_invalidates_cached_video(self):
+        self._touch_marker()
+        self.assembler.assemble("task", self.folders)
+        self.assertEqual(self.assembler.request("task", self.folders)['status'], 'ready')
+        
+        self._touch_marker()
+        
+        self.assertEqual(self.assembler.get_status("task", self.folders)['status'], 'missing')
+        self.assertTrue(self.assembler.assemble("task", self.folders))
+        self.assertEqual(len(FakeMerger.calls), 2)
+    
+    def test_failed_merge_reported_until_retry(self):
+        FakeMerger.succeed = False
+        
+        self.assertFalse(self.assembler.assemble("task", self.folders))
+        self.assertEqual(self.assembler.request("task", self.folders)['status'], 'error')
+        self.assertEqual(len(FakeMerger.calls), 1)
+        
+        FakeMerger.succeed = True
+        self.assertTrue(self.assembler.assemble("task", self.folders))
+    
+    def test_lock_held_by_other_process_reports_merging(self):
+        with open(os.path.join("merged", "merged_task.lock"), 'w'):
+            pass
+        
+        self.assertEqual(self.assembler.request("task", self.folders)['status'], 'merging')
+        self.assertEqual(FakeMerger.calls, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+import unittest
+import sys
+import os
+import tempfile
+import shutil
+import threading
+from unittest.mock import patch, MagicMock
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from video_merger import VideoMerger, ensure_still_segment
+
+
+PROBE_720P = """Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'scene.mp4':
+  Duration: 00:00:05.00, start: 0.000000, bitrate: 900 kb/s
+  Stream #0:0[0x1](und): Video: h264 (High) (avc1 / 0x31637661), yuv420p(progressive), 1280x720 [SAR 1:1 DAR 16:9], 812 kb/s, 24 fps, 24 tbr, 12288 tbn (default)
+  Stream #0:1[0x2](und): Audio: aac (LC) (mp4a / 0x6134706D), 44100 Hz, stereo, fltp, 128 kb/s (default)
+"""
+
+PROBE_1080P = PROBE_720P.replace("1280x720", "1920x1080")
+
+
+class TestVideoMerger(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.temp_dir)
+        self.folders = []
+        for i in range(3):
+            folder = os.path.join(self.temp_dir, f"scene_{i:04d}")
+            os.makedirs(folder)
+            with open(os.path.join(folder, "scene.mp4"), 'wb') as f:
+                f.write(b"video")
+            self.folders.append(folder)
+        self.output_path = os.path.join(self.temp_dir, "merged.mp4")
+    
+    def tearDown(self):
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.temp_dir)
+    
+    def _fake_ffmpeg(self, probes):
+        probes = dict(probes, **{os.path.abspath("temp_videos"): PROBE_720P})
+        
+        def run(command, **kwargs):
+            if ('-f' in command and 'concat' in command) or '-vf' in command:
+                with open(command[-1], 'wb') as f:
+                    f.write(b"merged")
+                return MagicMock(returncode=0, stderr="")
+            return MagicMock(returncode=1, stderr=probes[os.path.dirname(command[-1])])
+        return run
+    
+    @patch('video_merger.subprocess.run')
+    def test_matching_clips_are_stream_copied(self, mock_run):
+        mock_run.side_effect = self._fake_ffmpeg({folder: PROBE_720P for folder in self.folders})
+        merger = VideoMerger()
+        
+        with patch.object(merger, '_merge_with_reencode') as mock_reencode:
+            result = merger.merge_scene_videos(self.folders, self.output_path)
+        
+        self.assertTrue(result)
+        mock_reencode.assert_not_called()
+        concat_command = mock_run.call_args_list[-1][0][0]
+        self.assertIn('copy', concat_command)
+        self.assertTrue(os.path.exists(self.output_path))
+        self.assertEqual(os.listdir(merger.temp_dir), [])
+    
+    @patch('video_merger.subprocess.run')
+    def test_bitrate_differences_do_not_block_stream_copy(self, mock_run):
+        probes = {folder: PROBE_720P for folder in self.folders}
+        probes[self.folders[1]] = PROBE_720P.replace("812 kb/s", "640 kb/s")
+        mock_run.side_effect = self._fake_ffmpeg(probes)
+        
+        video_paths = [os.path.join(f, "scene.mp4") for f in self.folders]
+        
+        self.assertEqual(VideoMerger()._conform_clips(video_paths), video_paths)
+    
+    @patch('video_merger.subprocess.run')
+    def test_only_mismatched_clip_is_reencoded(self, mock_run):
+        self._make_still_scene(self.folders[0])
+        with open(os.path.join(self.folders[0], "segment.mp4"), 'wb') as f:
+            f.write(b"segment")
+        probes = {folder: PROBE_720P for folder in self.folders}
+        probes[self.folders[2]] = PROBE_1080P
+        mock_run.side_effect = self._fake_ffmpeg(probes)
+        merger = VideoMerger()
+        
+        with patch.object(merger, '_merge_with_reencode') as mock_reencode:
+            result = merger.merge_scene_videos(self.folders, self.output_path)
+        
+        self.assertTrue(result)
+        mock_reencode.assert_not_called()
+        encoded = [call[0][0] for call in mock_run.call_args_list if '-vf' in call[0][0]]
+        self.assertEqual(len(encoded), 1)
+        self.assertIn(os.path.join(self.folders[2], "scene.mp4"), encoded[0])
+        self.assertIn('copy', mock_run.call_args_list[-1][0][0])
+        self.assertEqual(os.listdir(merger.temp_dir), [])
+    
+    @patch('video_merger.subprocess.run')
+    def test_failed_clip_reencode_falls_back_to_moviepy(self, mock_run):
+        probes = {folder: PROBE_720P for folder in self.folders}
+        probes[self.folders[2]] = PROBE_1080P
+        fake_run = self._fake_ffmpeg(probes)
+        mock_run.side_effect = lambda command, **kwargs: MagicMock(returncode=1, stderr="boom") \
+            if '-vf' in command else fake_run(command, **kwargs)
+        merger = VideoMerger()
+        
+        with patch.object(merger, '_merge_with_reencode', return_value=True) as mock_reencode:
+            result = merger.merge_scene_videos(self.folders, self.output_path)
+        
+        self.assertTrue(result)
+        mock_reencode.assert_called_once_with(self.folders, self.output_path)
+        self.assertEqual(os.listdir(merger.temp_dir), [])
+    
+    def _make_still_scene(self, folder):
+        os.remove(os.path.join(folder, "scene.mp4"))
+        for name in ("scene.png", "narration.mp3"):
+            with open(os.path.join(folder, name), 'w') as f:
+                f.write(name)
+    
+    @patch('video_merger.subprocess.run')
+    def test_still_scene_uses_pre_encoded_segment(self, mock_run):
+        self._make_still_scene(self.folders[0])
+        segment_path = os.path.join(self.folders[0], "segment.mp4")
+        with open(segment_path, 'wb') as f:
+            f.write(b"segment")
+        mock_run.side_effect = self._fake_ffmpeg({folder: PROBE_720P for folder in self.folders})
+        merger = VideoMerger()
+        
+        with patch.object(merger, '_merge_with_reencode') as mock_reencode:
+            self.assertTrue(merger.merge_scene_videos(self.folders, self.output_path))
+        
+        mock_reencode.assert_not_called()
+        probed = [call[0][0][-1] for call in mock_run.call_args_list[:-1]]
+        self.assertEqual(probed[0], segment_path)
+    
+    @patch('video_merger.ensure_still_segment', return_value=None)
+    @patch('video_merger.subprocess.run')
+    def test_still_scene_without_segment_falls_back_to_reencode(self, mock_run, mock_ensure):
+        self._make_still_scene(self.folders[0])
+        merger = VideoMerger()
+        
+        with patch.object(merger, '_merge_with_reencode', return_value=True) as mock_reencode:
+            merger.merge_scene_videos(self.folders, self.output_path)
+        
+        mock_ensure.assert_called_once_with(self.folders[0])
+        mock_reencode.assert_called_once()
+        mock_run.assert_not_called()
+    
+    @patch('video_merger.subprocess.run')
+    def test_stale_segment_is_not_used(self, mock_run):
+        self._make_still_scene(self.folders[0])
+        segment_path = os.path.join(self.folders[0], "segment.mp4")
+        with open(segment_path, 'wb') as f:
+            f.write(b"segment")
+        os.utime(segment_path, (0, 0))
+        
+        self.assertIsNone(VideoMerger()._get_scene_video_path(self.folders[0]))
+    
+    @patch('video_merger.subprocess.run')
+    def test_concurrent_still_segment_encodes_use_separate_partials(self, mock_run):
+        self._make_still_scene(self.folders[0])
+        outputs = []
+        both_encoding = threading.Barrier(2, timeout=5)
+        
+        def fake_ffmpeg(command, **kwargs):
+            outputs.append(command[-1])
+            both_encoding.wait()
+            with open(command[-1], 'wb') as f:
+                f.write(b"segment")
+            return MagicMock(returncode=0, stderr="")
+        
+        mock_run.side_effect = fake_ffmpeg
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(ensure_still_segment(self.folders[0])))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        segment_path = os.path.join(self.folders[0], "segment.mp4")
+        self.assertEqual(len(set(outputs)), 2)
+        self.assertEqual(results, [segment_path, segment_path])
+        self.assertEqual(sorted(os.listdir(self.folders[0])), ["narration.mp3", "scene.png", "segment.mp4"])
+
+
+if __name__ == '__main__':
+    unittest.main()
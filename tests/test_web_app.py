@@ -1,17 +1,72 @@
 import unittest
 import sys
 import os
+import json
+import time
+import tempfile
+import shutil
+import threading
+import gevent
 from unittest.mock import patch, MagicMock
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-import web_app
+with patch('pymysql.connect'):
+    import web_app
+from scene_composer import SceneComposer
+from video_assembly import FinalVideoAssembler
+from asset_cache import AssetDigestCache
+from image_renditions import get_rendition_filename
 
 
-class TestWebApp(unittest.TestCase):
+class WebAppTestCase(unittest.TestCase):
     
     def setUp(self):
-        web_app.app.config['TESTING'] = True
-        self.client = web_app.app.test_client()
+        self.temp_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.temp_dir)
+        for patcher in (patch('web_app.get_base_dir', return_value=self.temp_dir),
+                        patch('web_app.insert_statistics'),
+                        patch('web_app.get_statistics', return_value=None),
+                        patch.dict(os.environ, {'GENERATION_WORKERS': '0', 'STATUS_STORE': 'memory'})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        
+        self.wrapper = web_app.FlaskAppWrapper('web_app')
+        self.wrapper.app_.config['TESTING'] = True
+        self.wrapper.status_poll_interval_ = 0.05
+        self.store = self.wrapper.status_store_
+        self.client = self.wrapper.app_.test_client()
+    
+    def tearDown(self):
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.temp_dir)
+    
+    def _update_later(self, task_id, delay, changes):
+        return gevent.spawn_later(delay, self.store.update, task_id, changes)
+    
+    def _make_scene(self, task_id, scene_index, files=("scene.png", "narration.mp3")):
+        folder = SceneComposer.get_scene_folder(task_id, scene_index)
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, "metadata.json"), 'w', encoding='utf-8') as f:
+            json.dump({'scene_index': scene_index, 'description': f"场景 {scene_index}"}, f)
+        for name in files:
+            with open(os.path.join(folder, name), 'wb') as f:
+                f.write(name.encode('utf-8'))
+        return folder
+    
+    def _complete_task(self, task_id, scene_count):
+        folders = [self._make_scene(task_id, scene_index) for scene_index in range(scene_count)]
+        self.store.set(task_id, {
+            'status': 'completed',
+            'progress': 100,
+            'completed_scenes': list(range(scene_count)),
+            'metadata': {'scenes': [{'scene_index': scene_index, 'folder': folder}
+                                    for scene_index, folder in enumerate(folders)]}
+        })
+        return folders
+
+
+class TestWebApp(WebAppTestCase):
     
     def test_index_route(self):
         response = self.client.get('/')
@@ -105,9 +160,9 @@ class TestWebApp(unittest.TestCase):
         self.assertIsNone(data['user'])
     
     def test_allowed_file(self):
-        self.assertTrue(web_app.allowed_file('test.txt'))
-        self.assertFalse(web_app.allowed_file('test.pdf'))
-        self.assertFalse(web_app.allowed_file('test'))
+        self.assertTrue(self.wrapper._allowed_file('test.txt'))
+        self.assertFalse(self.wrapper._allowed_file('test.pdf'))
+        self.assertFalse(self.wrapper._allowed_file('test'))
     
     def test_upload_novel_not_logged_in(self):
         response = self.client.post('/api/upload')
@@ -137,5 +192,400 @@ class TestWebApp(unittest.TestCase):
         self.assertEqual(response.status_code, 401)
 
 
+
+class TestStatusRoutes(WebAppTestCase):
+    
+    def _read_events(self, response):
+        body = b''.join(response.response).decode('utf-8')
+        events = []
+        for block in body.split('\n\n'):
+            fields = {}
+            for line in block.split('\n'):
+                if line and not line.startswith(':'):
+                    name, _, value = line.partition(': ')
+                    fields[name] = value
+            if fields:
+                events.append(fields)
+        return events
+    
+    def test_long_poll_returns_when_version_changes(self):
+        self.store.set("task", {'status': 'processing', 'progress': 0})
+        self._update_later("task", 0.2, {'progress': 40})
+        
+        started = time.monotonic()
+        response = self.client.get('/api/status/task?version=1&timeout=5')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['progress'], 40)
+        self.assertEqual(response.get_json()['version'], 2)
+        self.assertLess(time.monotonic() - started, 2)
+    
+    def test_long_poll_returns_current_status_on_timeout(self):
+        self.store.set("task", {'status': 'processing', 'progress': 10})
+        
+        started = time.monotonic()
+        response = self.client.get('/api/status/task?version=1&timeout=0.3')
+        
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)
+        self.assertEqual(response.get_json()['version'], 1)
+        self.assertEqual(response.get_json()['progress'], 10)
+    
+    def test_long_poll_returns_immediately_for_newer_or_finished_status(self):
+        self.store.set("task", {'status': 'processing', 'progress': 10})
+        self.store.update("task", {'status': 'completed', 'progress': 100})
+        
+        started = time.monotonic()
+        response = self.client.get('/api/status/task?version=1&timeout=5')
+        
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(response.get_json()['status'], 'completed')
+        self.assertEqual(self.client.get('/api/status/missing?version=1').status_code, 404)
+    
+    def test_sse_sends_scene_events_before_status_and_ends_when_finished(self):
+        self.store.set("task", {'status': 'processing', 'progress': 0, 'completed_scenes': []})
+        self._update_later("task", 0.1, {'progress': 50, 'completed_scenes': [0]})
+        self._update_later("task", 0.3, {'status': 'completed', 'progress': 100, 'completed_scenes': [0, 1],
+                                         'metadata': {'scenes': []}})
+        
+        response = self.client.get('/api/events/task')
+        events = self._read_events(response)
+        
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertIn('retry', events[0])
+        self.assertEqual([(event.get('event'), event.get('id')) for event in events[1:]], [
+            ('status', '1'),
+            ('scene', None),
+            ('status', '2'),
+            ('scene', None),
+            ('status', '3')
+        ])
+        self.assertEqual([json.loads(event['data'])['scene_index'] for event in events if event.get('event') == 'scene'], [0, 1])
+        final = json.loads(events[-1]['data'])
+        self.assertEqual(final['status'], 'completed')
+        self.assertNotIn('metadata', final)
+    
+    def test_sse_resumes_after_last_event_id(self):
+        self.store.set("task", {'status': 'processing', 'progress': 0})
+        self.store.update("task", {'progress': 20})
+        self._update_later("task", 0.1, {'status': 'error', 'message': '失败'})
+        
+        events = self._read_events(self.client.get('/api/events/task', headers={'Last-Event-ID': '2'}))
+        
+        self.assertEqual([event['id'] for event in events if event.get('event') == 'status'], ['3'])
+    
+    def test_sse_returns_204_for_finished_task_already_seen(self):
+        self.store.set("task", {'status': 'processing', 'progress': 0})
+        self.store.update("task", {'status': 'completed', 'progress': 100})
+        
+        self.assertEqual(self.client.get('/api/events/task', headers={'Last-Event-ID': '2'}).status_code, 204)
+        self.assertEqual(self.client.get('/api/events/task?version=2').status_code, 204)
+        self.assertEqual(self.client.get('/api/events/task', headers={'Last-Event-ID': '1'}).status_code, 200)
+        self.assertEqual(self.client.get('/api/events/missing').status_code, 404)
+
+
+
+class TestSceneRoutes(WebAppTestCase):
+    
+    def _scene_indices(self, response):
+        return [scene['scene_index'] for scene in response.get_json()['scenes']]
+    
+    def test_offset_and_limit_page_through_scenes(self):
+        self._complete_task("task", 5)
+        
+        response = self.client.get('/api/scenes/task?offset=1&limit=2')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._scene_indices(response), [1, 2])
+        self.assertEqual(response.get_json()['total_scenes'], 5)
+        self.assertTrue(response.get_json()['completed'])
+        self.assertEqual(self._scene_indices(self.client.get('/api/scenes/task?offset=4')), [4])
+        self.assertEqual(self._scene_indices(self.client.get('/api/scenes/task?offset=9')), [])
+    
+    def test_since_cursor_returns_only_newer_scenes(self):
+        self._complete_task("task", 5)
+        
+        response = self.client.get('/api/scenes/task?since=2')
+        
+        self.assertEqual(self._scene_indices(response), [3, 4])
+        self.assertEqual(response.get_json()['total_scenes'], 2)
+        self.assertEqual(response.get_json()['next_since'], 4)
+        
+        response = self.client.get('/api/scenes/task?since=4')
+        self.assertEqual(self._scene_indices(response), [])
+        self.assertEqual(response.get_json()['next_since'], 4)
+    
+    def test_in_progress_task_returns_only_completed_scenes(self):
+        for scene_index in range(3):
+            self._make_scene("task", scene_index)
+        self.store.set("task", {'status': 'processing', 'progress': 50, 'completed_scenes': [0, 2]})
+        
+        response = self.client.get('/api/scenes/task')
+        
+        self.assertEqual(self._scene_indices(response), [0, 2])
+        self.assertFalse(response.get_json()['completed'])
+        self.assertEqual(response.get_json()['status'], 'processing')
+        self.assertEqual(response.get_json()['hls_url'], '/api/hls/task/playlist.m3u8')
+        
+        self.store.update("task", {'completed_scenes': [0, 1, 2]})
+        response = self.client.get(f"/api/scenes/task?since={response.get_json()['next_since']}")
+        self.assertEqual(self._scene_indices(response), [])
+        self.assertEqual(self._scene_indices(self.client.get('/api/scenes/task?since=0')), [1, 2])
+    
+    def test_image_size_selects_rendition(self):
+        folder = self._complete_task("task", 2)[0]
+        for image_format in ("webp", "jpeg"):
+            with open(os.path.join(folder, get_rendition_filename("thumb", image_format)), 'wb') as f:
+                f.write(image_format.encode('utf-8'))
+        
+        scenes = self.client.get('/api/scenes/task?image_size=thumb&image_format=jpeg').get_json()['scenes']
+        
+        self.assertTrue(scenes[0]['image_url'].startswith(f"/api/file/{folder}/{get_rendition_filename('thumb', 'jpeg')}?v="))
+        self.assertTrue(scenes[1]['image_url'].startswith(f"/api/file/{SceneComposer.get_scene_folder('task', 1)}/scene.png"))
+        full = self.client.get('/api/scenes/task').get_json()['scenes'][0]
+        self.assertTrue(full['image_url'].startswith(f"/api/file/{folder}/scene.png?v="))
+        self.assertEqual(set(full['image_renditions']['thumb']), {"webp", "jpeg"})
+    
+    def test_invalid_image_options_are_rejected(self):
+        self._complete_task("task", 1)
+        
+        self.assertEqual(self.client.get('/api/scenes/task?image_size=huge').status_code, 400)
+        self.assertEqual(self.client.get('/api/scenes/task?image_format=gif').status_code, 400)
+
+
+
+class TestDownloadRoutes(WebAppTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.merge_calls = []
+        self.merge_allowed = threading.Event()
+        self.merge_succeeds = True
+        test = self
+        
+        class FakeMerger:
+            def merge_scene_videos(self, scene_folders, output_path):
+                test.merge_calls.append(list(scene_folders))
+                test.merge_allowed.wait(5)
+                if not test.merge_succeeds:
+                    return False
+                with open(output_path, 'wb') as f:
+                    f.write(b"merged video")
+                return True
+        
+        self.wrapper.video_assembler_ = FinalVideoAssembler(
+            output_dir=os.path.join(self.temp_dir, "temp_videos"), merger_factory=FakeMerger)
+        self._complete_task("task", 2)
+    
+    def _wait_until_ready(self):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            payload = self.client.get('/api/download/task/status').get_json()
+            if payload['status'] == 'ready':
+                return payload
+            gevent.sleep(0.02)
+        self.fail("视频未在规定时间内合并完成")
+    
+    def test_status_and_nowait_download_report_merge_in_progress(self):
+        response = self.client.get('/api/download/task/status')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {'status': 'merging', 'task_id': 'task'})
+        
+        response = self.client.get('/api/download/task?wait=false')
+        self.assertEqual(response.status_code, 202)
+        self.assertNotIn('download_url', response.get_json())
+        
+        self.merge_allowed.set()
+        self.assertEqual(self._wait_until_ready()['download_url'], '/api/download/task')
+        response = self.client.get('/api/download/task?wait=false')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b"merged video")
+        self.assertIn('anime_task.mp4', response.headers['Content-Disposition'])
+        self.assertEqual(len(self.merge_calls), 1)
+    
+    def test_download_waits_for_merge(self):
+        threading.Timer(0.2, self.merge_allowed.set).start()
+        
+        response = self.client.get('/api/download/task')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b"merged video")
+    
+    def test_download_gives_up_after_max_wait(self):
+        self.wrapper.max_download_wait_ = 0.1
+        
+        response = self.client.get('/api/download/task')
+        
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.get_json()['status'], 'merging')
+        self.merge_allowed.set()
+    
+    def test_concurrent_downloads_share_one_merge(self):
+        threading.Timer(0.2, self.merge_allowed.set).start()
+        
+        downloads = [gevent.spawn(self.client.get, '/api/download/task') for _ in range(3)]
+        gevent.joinall(downloads, timeout=10)
+        
+        self.assertEqual([download.value.status_code for download in downloads], [200, 200, 200])
+        self.assertEqual([download.value.data for download in downloads], [b"merged video"] * 3)
+        self.assertEqual(len(self.merge_calls), 1)
+    
+    def test_failed_merge_and_unfinished_task(self):
+        self.merge_succeeds = False
+        self.merge_allowed.set()
+        
+        self.assertEqual(self.client.get('/api/download/task').status_code, 500)
+        self.assertEqual(self.client.get('/api/download/task/status').get_json()['status'], 'error')
+        
+        self.store.set("running", {'status': 'processing', 'completed_scenes': [0]})
+        self.assertEqual(self.client.get('/api/download/running').status_code, 400)
+        self.assertEqual(self.client.get('/api/download/running/status').status_code, 400)
+
+
+
+class TestHLSRoutes(WebAppTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        patcher = patch.object(self.wrapper.hls_packager_, 'request')
+        self.mock_request = patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def _make_packaged_scene(self, task_id, scene_index, duration=5.0):
+        folder = self._make_scene(task_id, scene_index, files=("scene.png", "narration.mp3", "scene.mp4"))
+        with open(os.path.join(folder, "stream.ts"), 'wb') as f:
+            f.write(f"segment {scene_index}".encode('utf-8'))
+        with open(os.path.join(folder, "stream.json"), 'w', encoding='utf-8') as f:
+            json.dump({'duration': duration, 'source': 'scene.mp4',
+                       'source_version': os.stat(os.path.join(folder, "scene.mp4")).st_mtime_ns}, f)
+        return folder
+    
+    def _playlist(self, task_id):
+        response = self.client.get(f'/api/hls/{task_id}/playlist.m3u8')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        return response.get_data(as_text=True).splitlines()
+    
+    def test_in_progress_playlist_lists_contiguous_packaged_scenes(self):
+        for scene_index in (0, 1, 3):
+            self._make_packaged_scene("task", scene_index, duration=4.5)
+        self.store.set("task", {'status': 'processing', 'completed_scenes': [0, 1, 3]})
+        
+        lines = self._playlist("task")
+        
+        self.assertIn("#EXT-X-PLAYLIST-TYPE:EVENT", lines)
+        self.assertNotIn("#EXT-X-ENDLIST", lines)
+        self.assertEqual([line for line in lines if line.startswith("/api/hls/")],
+                         ["/api/hls/task/0.ts", "/api/hls/task/1.ts"])
+        self.assertEqual(lines.count("#EXT-X-DISCONTINUITY"), 1)
+        self.assertEqual(lines.count("#EXTINF:4.500,"), 2)
+        self.assertIn("#EXT-X-TARGETDURATION:5", lines)
+        self.mock_request.assert_called_once()
+    
+    def test_finished_playlist_ends_only_when_every_scene_is_packaged(self):
+        folders = self._complete_task("task", 3)
+        for scene_index in range(2):
+            self._make_packaged_scene("task", scene_index)
+        
+        self.assertNotIn("#EXT-X-ENDLIST", self._playlist("task"))
+        self.mock_request.assert_called_with(folders)
+        
+        self._make_packaged_scene("task", 2)
+        lines = self._playlist("task")
+        self.assertEqual(lines[-1], "#EXT-X-ENDLIST")
+        self.assertEqual(lines.count("#EXT-X-DISCONTINUITY"), 2)
+    
+    def test_segment_is_served_for_completed_scene(self):
+        self._make_packaged_scene("task", 0)
+        self.store.set("task", {'status': 'processing', 'completed_scenes': [0]})
+        
+        response = self.client.get('/api/hls/task/0.ts')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'video/mp2t')
+        self.assertEqual(response.data, b"segment 0")
+    
+    def test_segment_is_confined_to_the_task_scene_list(self):
+        self._make_packaged_scene("task", 0)
+        self._make_packaged_scene("task", 1)
+        self._make_packaged_scene("other", 0)
+        self.store.set("task", {'status': 'processing', 'completed_scenes': [0]})
+        
+        self.assertEqual(self.client.get('/api/hls/task/1.ts').status_code, 404)
+        self.assertEqual(self.client.get('/api/hls/task/7.ts').status_code, 404)
+        self.assertEqual(self.client.get('/api/hls/other/0.ts').status_code, 404)
+        self.assertEqual(self.client.get('/api/hls/..%2Foutput_scenes%2Ftask/0.ts').status_code, 404)
+        self.assertEqual(self.client.get('/api/hls/task/..%2F..%2Fother%2Fscene_0000%2Fstream.ts').status_code, 404)
+
+
+
+class TestFileRoutes(WebAppTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.folder = self._make_scene("task", 0)
+        self.image_path = os.path.join(self.folder, "scene.png")
+        with open(self.image_path, 'wb') as f:
+            f.write(b"0123456789")
+        self.url = f"/api/file/{self.folder}/scene.png"
+    
+    def test_file_has_content_etag(self):
+        response = self.client.get(self.url)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b"0123456789")
+        self.assertEqual(response.headers['ETag'], f'"{AssetDigestCache().get_digest(self.image_path)}"')
+        self.assertFalse(response.cache_control.immutable)
+        
+        response = self.client.get(self.url, headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+    
+    def test_range_request_returns_partial_content(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=2-5'})
+        
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, b"2345")
+        self.assertEqual(response.headers['Content-Range'], 'bytes 2-5/10')
+    
+    def test_versioned_url_is_cached_as_immutable(self):
+        version = AssetDigestCache.get_version(self.image_path)
+        
+        response = self.client.get(f"{self.url}?v={version}")
+        
+        self.assertTrue(response.cache_control.immutable)
+        self.assertEqual(response.cache_control.max_age, 365 * 24 * 3600)
+        
+        stale = self.client.get(f"{self.url}?v=outdated")
+        self.assertEqual(stale.status_code, 200)
+        self.assertFalse(stale.cache_control.immutable)
+        self.assertIsNone(stale.cache_control.max_age)
+    
+    def test_scene_urls_carry_the_asset_version(self):
+        self._complete_task("task", 1)
+        with open(self.image_path, 'wb') as f:
+            f.write(b"0123456789")
+        
+        scene = self.client.get('/api/scenes/task').get_json()['scenes'][0]
+        
+        self.assertEqual(scene['image_url'], f"{self.url}?v={AssetDigestCache.get_version(self.image_path)}")
+        self.assertTrue(self.client.get(scene['image_url']).cache_control.immutable)
+    
+    def test_paths_outside_output_dir_are_rejected(self):
+        with open(os.path.join(self.temp_dir, "secret.txt"), 'w') as f:
+            f.write("secret")
+        os.symlink(os.path.join(self.temp_dir, "secret.txt"), os.path.join(self.folder, "link.txt"))
+        
+        for url in ("/api/file/output_scenes/../secret.txt",
+                    "/api/file/output_scenes/task/..%2F..%2Fsecret.txt",
+                    f"/api/file/{self.temp_dir}/secret.txt",
+                    f"/api/file/{self.folder}/link.txt",
+                    f"/api/file/{self.folder}/missing.png",
+                    "/api/file/output_scenes/task"):
+            response = self.client.get(url, follow_redirects=True)
+            self.assertEqual(response.status_code, 404, url)
+            self.assertNotIn(b"secret", response.data)
+
+
 if __name__ == '__main__':
     unittest.main()
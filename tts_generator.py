@@ -1,57 +1,261 @@
 import os
+import re
+import shutil
+import tempfile
 from gtts import gTTS
 from typing import Optional, List, Dict
 import hashlib
+import threading
+from audio_mixer import decode_to_pcm, concatenate_pcm, encode_pcm, trim_silence
+from parallel_executor import ParallelExecutor
 
 
-class TTSGenerator:
+VOICE_TYPES = ('male', 'female', 'narrator', 'default')
+SENTENCE_GAP_MS = 200
+
+# pyttsx3.init() returns one engine per driver for the whole process
+PYTTSX3_ENGINE_LOCK = threading.Lock()
+
+
+ABBREVIATIONS = ('Mr', 'Mrs', 'Ms', 'Dr', 'Prof', 'St', 'Jr', 'Sr', 'vs', 'e.g', 'i.e')
+SENTENCE_PATTERN = re.compile(
+    r'.*?(?:[。！？!?；;…\n]+[”’」』）)"\']*|' +
+    ''.join(rf'(?<!\b{re.escape(abbreviation)})' for abbreviation in ABBREVIATIONS) +
+    r'(?<!\b[A-Z])\.(?:\s+|$)|$)',
+    re.S
+)
+
+
+def split_sentences(text: str, min_chars: int = 6, max_chars: int = 200) -> List[str]:
+    sentences = []
+    pending = ''
+    for match in SENTENCE_PATTERN.finditer(text):
+        piece = pending + match.group(0)
+        if len(piece.strip()) < min_chars:
+            pending = piece
+            continue
+        pending = ''
+        separator = piece[len(piece.rstrip()):]
+        piece = piece.strip()
+        while len(piece) > max_chars:
+            cut = max(piece.rfind(mark, 0, max_chars) for mark in '，,、：:') + 1 or max_chars
+            sentences.append(piece[:cut])
+            piece = piece[cut:].strip()
+        if piece:
+            sentences.append(piece + separator)
+    
+    if pending.strip():
+        if sentences and len((sentences[-1] + pending).strip()) <= max_chars:
+            sentences[-1] += pending
+        else:
+            sentences.append(pending)
+    return [sentence.strip() for sentence in sentences]
+
+
+class GTTSBackend:
+    name = 'gtts'
+    
     def __init__(self, language: str = 'zh-cn'):
         self.language = language
-        self.cache_dir = "audio_cache"
-        os.makedirs(self.cache_dir, exist_ok=True)
-        
         self.tld_map = {
             'male': 'com.au',
             'female': 'co.uk',
             'narrator': 'com',
             'default': 'com'
         }
+    
+    def synthesize(self, text: str, output_path: str, voice_type: str = 'default', slow: bool = False):
+        try:
+            tts = gTTS(text=text, lang=self.language, slow=slow, tld=self.tld_map.get(voice_type, 'com'))
+            tts.save(output_path)
+        except Exception as e:
+            print(f"生成语音失败 (voice_type={voice_type}): {e}")
+            tts = gTTS(text=text, lang=self.language, slow=slow)
+            tts.save(output_path)
+
+
+class Pyttsx3Backend:
+    name = 'pyttsx3'
+    language_aliases = {
+        'zh': ('zh', 'cmn', 'yue', 'chinese', 'mandarin'),
+        'en': ('en', 'english')
+    }
+    
+    def __init__(self, language: str = 'zh-cn', rate: int = 180):
+        try:
+            import pyttsx3
+        except ImportError:
+            raise ImportError("离线语音引擎需要安装 pyttsx3：pip install pyttsx3")
+        
+        self.language = language
+        self.rate = rate
+        with PYTTSX3_ENGINE_LOCK:
+            self._engine = pyttsx3.init()
+            self._voice_ids = self._select_voices()
+    
+    def _select_voices(self) -> Dict[str, str]:
+        language_prefix = self.language.split('-')[0].lower()
+        aliases = self.language_aliases.get(language_prefix, (language_prefix,))
+        
+        def matches_language(voice) -> bool:
+            names = [voice.id or '', voice.name or '']
+            for language in getattr(voice, 'languages', None) or []:
+                names.append(language.decode('utf-8', 'ignore') if isinstance(language, bytes) else str(language))
+            return any(alias in name.lower() for name in names for alias in aliases)
+        
+        voices = self._engine.getProperty('voices') or []
+        candidates = [voice for voice in voices if matches_language(voice)] or voices
+        if not candidates:
+            return {}
+        
+        def voice_for_gender(gender: str) -> str:
+            for voice in candidates:
+                if (getattr(voice, 'gender', None) or '').lower() == gender:
+                    return voice.id
+            return candidates[0].id
+        
+        return {
+            'male': voice_for_gender('male'),
+            'female': voice_for_gender('female'),
+            'narrator': candidates[0].id,
+            'default': candidates[0].id
+        }
+    
+    def synthesize(self, text: str, output_path: str, voice_type: str = 'default', slow: bool = False):
+        wav_path = f"{output_path}.wav"
+        try:
+            with PYTTSX3_ENGINE_LOCK:
+                voice_id = self._voice_ids.get(voice_type)
+                if voice_id:
+                    self._engine.setProperty('voice', voice_id)
+                self._engine.setProperty('rate', int(self.rate * 0.8) if slow else self.rate)
+                self._engine.save_to_file(text, wav_path)
+                self._engine.runAndWait()
+            
+            samples = decode_to_pcm(wav_path)
+            if samples is None or not encode_pcm(samples, output_path):
+                raise RuntimeError("离线语音转码失败")
+        finally:
+            if os.path.exists(wav_path):
+                os.remove(wav_path)
+
+
+TTS_BACKENDS = {
+    GTTSBackend.name: GTTSBackend,
+    Pyttsx3Backend.name: Pyttsx3Backend
+}
+
+
+def create_tts_backend(name: str = 'gtts', language: str = 'zh-cn'):
+    if name not in TTS_BACKENDS:
+        raise ValueError(f"未知的语音引擎: {name}（可选：{'、'.join(TTS_BACKENDS)}）")
+    return TTS_BACKENDS[name](language)
+
+
+class TTSGenerator:
+    def __init__(self, language: str = 'zh-cn', max_concurrency: int = 4, backend=None):
+        self.language = language
+        self.cache_dir = "audio_cache"
+        os.makedirs(self.cache_dir, exist_ok=True)
+        
+        self.max_concurrency = max(1, max_concurrency)
+        self._request_semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        
+        self.backend = backend or create_tts_backend(os.getenv('TTS_BACKEND', 'gtts'), language)
         
         self.character_voice_mapping = {}
     
+    def _cache_key(self, source: str) -> str:
+        if self.backend.name != GTTSBackend.name:
+            source = f"{self.backend.name}_{source}"
+        return hashlib.md5(source.encode()).hexdigest()
+    
     def assign_voice_to_character(self, character_name: str, voice_type: str = 'default'):
-        if voice_type not in self.tld_map:
+        if voice_type not in VOICE_TYPES:
             voice_type = 'default'
         self.character_voice_mapping[character_name] = voice_type
     
     def generate_speech(self, text: str, output_filename: Optional[str] = None, 
                        voice_type: str = 'default', slow: bool = False) -> Optional[str]:
         if not output_filename:
-            cache_key = hashlib.md5(f"{text}_{voice_type}".encode()).hexdigest()
+            cache_key = self._cache_key(f"{text}_{voice_type}_{slow}")
             output_filename = os.path.join(self.cache_dir, f"audio_{cache_key}.mp3")
         
         if os.path.exists(output_filename):
             return output_filename
         
+        sentences = split_sentences(text)
+        if len(sentences) > 1 and self._generate_from_sentences(sentences, output_filename, voice_type, slow):
+            return output_filename
+        
+        return self._synthesize(text, output_filename, voice_type, slow)
+    
+    def _synthesize(self, text: str, output_filename: str, voice_type: str, slow: bool) -> Optional[str]:
         try:
-            tld = self.tld_map.get(voice_type, 'com')
-            tts = gTTS(text=text, lang=self.language, slow=slow, tld=tld)
-            tts.save(output_filename)
+            with self._request_semaphore:
+                self._write_atomically(
+                    output_filename,
+                    lambda partial_path: self.backend.synthesize(text, partial_path, voice_type=voice_type, slow=slow) or True
+                )
             return output_filename
         except Exception as e:
-            print(f"生成语音失败 (voice_type={voice_type}): {e}")
-            try:
-                tts = gTTS(text=text, lang=self.language, slow=slow)
-                tts.save(output_filename)
-                return output_filename
-            except Exception as fallback_e:
-                print(f"降级生成语音也失败: {fallback_e}")
-                return None
+            print(f"生成语音失败 ({self.backend.name}): {e}")
+            return None
+    
+    @staticmethod
+    def _write_atomically(output_filename: str, write) -> bool:
+        fd, partial_path = tempfile.mkstemp(prefix="partial_", suffix=os.path.splitext(output_filename)[1],
+                                            dir=os.path.dirname(output_filename) or '.')
+        os.close(fd)
+        try:
+            if not write(partial_path):
+                return False
+            os.replace(partial_path, output_filename)
+            return True
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+    
+    def _export(self, audio_file: str, output_path: Optional[str]) -> str:
+        if not output_path or os.path.abspath(audio_file) == os.path.abspath(output_path):
+            return audio_file
+        self._write_atomically(output_path, lambda partial_path: shutil.copyfile(audio_file, partial_path))
+        return output_path
+    
+    def _generate_sentence(self, sentence: str, voice_type: str, slow: bool) -> Optional[str]:
+        cache_key = self._cache_key(f"{sentence}_{voice_type}_{slow}")
+        output_filename = os.path.join(self.cache_dir, f"sentence_{cache_key}.mp3")
+        if os.path.exists(output_filename):
+            return output_filename
+        return self._synthesize(sentence, output_filename, voice_type, slow)
+    
+    def _generate_from_sentences(self, sentences: List[str], output_filename: str, voice_type: str, slow: bool) -> bool:
+        unique_sentences = list(dict.fromkeys(sentences))
+        executor = ParallelExecutor(max_workers=self.max_concurrency)
+        sentence_files = executor.map_ordered(
+            lambda idx, sentence: self._generate_sentence(sentence, voice_type, slow),
+            unique_sentences
+        )
+        if not all(sentence_files):
+            return False
+        
+        clips = {}
+        for sentence, sentence_file in zip(unique_sentences, sentence_files):
+            samples = decode_to_pcm(sentence_file)
+            if samples is None:
+                return False
+            clips[sentence] = trim_silence(samples)
+        
+        mixed = concatenate_pcm([clips[sentence] for sentence in sentences], gap_ms=SENTENCE_GAP_MS)
+        return self._write_atomically(output_filename, lambda partial_path: encode_pcm(mixed, partial_path))
     
     def generate_speech_for_scene(self, scene_text: str, scene_index: int, 
-                                  voice_type: str = 'narrator') -> Optional[str]:
-        output_path = os.path.join(self.cache_dir, f"scene_{scene_index:04d}.mp3")
-        return self.generate_speech(scene_text, output_path, voice_type=voice_type)
+                                  voice_type: str = 'narrator', output_path: Optional[str] = None) -> Optional[str]:
+        audio_file = self.generate_speech(scene_text, voice_type=voice_type)
+        if not audio_file:
+            print(f"场景 {scene_index} 语音生成失败")
+            return None
+        return self._export(audio_file, output_path)
     
     def generate_dialogue_speech(self, character_name: str, dialogue_text: str, 
                                  emotion: str = 'neutral') -> Optional[str]:
@@ -59,68 +263,52 @@ class TTSGenerator:
         
         slow = (emotion in ['sad', 'calm'])
         
-        cache_key = hashlib.md5(f"{character_name}_{dialogue_text}_{emotion}".encode()).hexdigest()
+        cache_key = self._cache_key(f"{dialogue_text}_{voice_type}_{slow}")
         output_filename = os.path.join(self.cache_dir, f"dialogue_{cache_key}.mp3")
         
         return self.generate_speech(dialogue_text, output_filename, voice_type=voice_type, slow=slow)
     
-    def generate_multi_voice_scene(self, narration: str, dialogues: List[Dict], scene_index: int) -> Optional[str]:
-        audio_segments = []
-        
+    def build_scene_lines(self, narration: str, dialogues: List[Dict]) -> List[Dict]:
+        lines = []
         if narration:
-            narration_audio = self.generate_speech(
-                narration, 
-                voice_type='narrator'
-            )
-            if narration_audio:
-                audio_segments.append(narration_audio)
+            lines.append({'text': narration, 'voice_type': 'narrator'})
         
         for dialogue in dialogues:
             character = dialogue.get('character', '')
             text = dialogue.get('text', '')
-            emotion = dialogue.get('emotion', 'neutral')
-            
             if character and text:
-                dialogue_audio = self.generate_dialogue_speech(character, text, emotion)
-                if dialogue_audio:
-                    audio_segments.append(dialogue_audio)
+                lines.append({'character': character, 'text': text, 'emotion': dialogue.get('emotion', 'neutral')})
+        
+        return lines
+    
+    def synthesize_lines(self, lines: List[Dict], max_workers: int = None) -> List[Optional[str]]:
+        executor = ParallelExecutor(max_workers=max_workers or self.max_concurrency)
+        return executor.map_ordered(lambda idx, line: self._synthesize_line(line), lines)
+    
+    def _synthesize_line(self, line: Dict) -> Optional[str]:
+        if line.get('character'):
+            return self.generate_dialogue_speech(line['character'], line['text'], line.get('emotion', 'neutral'))
+        return self.generate_speech(line['text'], voice_type=line.get('voice_type', 'narrator'))
+    
+    def generate_multi_voice_scene(self, narration: str, dialogues: List[Dict], scene_index: int,
+                                   output_path: Optional[str] = None) -> Optional[str]:
+        audio_segments = [audio_file for audio_file in self.synthesize_lines(self.build_scene_lines(narration, dialogues))
+                          if audio_file]
         
         if not audio_segments:
+            print(f"场景 {scene_index} 语音生成失败")
             return None
         
         if len(audio_segments) == 1:
-            output_path = os.path.join(self.cache_dir, f"scene_{scene_index:04d}.mp3")
-            import shutil
-            shutil.copy(audio_segments[0], output_path)
-            return output_path
+            return self._export(audio_segments[0], output_path)
         
-        try:
-            from pydub import AudioSegment
-            
-            combined = AudioSegment.empty()
-            
-            for audio_file in audio_segments:
-                segment = AudioSegment.from_mp3(audio_file)
-                combined += segment
-                combined += AudioSegment.silent(duration=500)
-            
-            output_path = os.path.join(self.cache_dir, f"scene_{scene_index:04d}.mp3")
-            combined.export(output_path, format="mp3")
-            
-            return output_path
-            
-        except ImportError:
-            print("警告: pydub未安装，使用简单拼接。安装pydub以获得更好的音频合成效果。")
-            
-            output_path = os.path.join(self.cache_dir, f"scene_{scene_index:04d}.mp3")
-            import shutil
-            shutil.copy(audio_segments[0], output_path)
-            return output_path
-        except Exception as e:
-            print(f"合成多音轨失败: {e}")
-            if audio_segments:
-                output_path = os.path.join(self.cache_dir, f"scene_{scene_index:04d}.mp3")
-                import shutil
-                shutil.copy(audio_segments[0], output_path)
-                return output_path
-            return None
+        cache_key = self._cache_key("|".join(os.path.basename(audio_file) for audio_file in audio_segments))
+        mixed_path = os.path.join(self.cache_dir, f"scene_{cache_key}.mp3")
+        if not os.path.exists(mixed_path):
+            clips = [decode_to_pcm(audio_file) for audio_file in audio_segments]
+            if any(clip is None for clip in clips) or \
+                    not self._write_atomically(mixed_path, lambda partial_path: encode_pcm(concatenate_pcm(clips), partial_path)):
+                print("合成多音轨失败，只使用第一段音频")
+                mixed_path = audio_segments[0]
+        
+        return self._export(mixed_path, output_path)
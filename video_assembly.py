@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict
+
+from scene_composer import SceneComposer, SCENE_INDEX_MARKER
+from video_merger import VideoMerger
+
+
+class FinalVideoAssembler:
+    def __init__(self, output_dir: str = "temp_videos", max_workers: int = 1,
+                 merger_factory=VideoMerger, stale_lock_seconds: float = 3600):
+        self.output_dir = output_dir
+        self.merger_factory = merger_factory
+        self.stale_lock_seconds = stale_lock_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._running = {}
+        self._errors = {}
+        os.makedirs(self.output_dir, exist_ok=True)
+    
+    def get_output_path(self, task_id: str) -> str:
+        return os.path.join(self.output_dir, f"merged_{task_id}.mp4")
+    
+    def _sidecar_path(self, task_id: str) -> str:
+        return os.path.join(self.output_dir, f"merged_{task_id}.json")
+    
+    def _lock_path(self, task_id: str) -> str:
+        return os.path.join(self.output_dir, f"merged_{task_id}.lock")
+    
+    def _signature(self, task_id: str, scene_folders: List[str]) -> str:
+        marker_path = os.path.join(SceneComposer.get_output_dir(task_id), SCENE_INDEX_MARKER)
+        try:
+            marker_version = os.stat(marker_path).st_mtime_ns
+        except OSError:
+            marker_version = None
+        source = json.dumps({'folders': scene_folders, 'marker': marker_version}, sort_keys=True)
+        return hashlib.md5(source.encode('utf-8')).hexdigest()
+    
+    def _is_ready(self, task_id: str, signature: str) -> bool:
+        if not os.path.exists(self.get_output_path(task_id)):
+            return False
+        try:
+            with open(self._sidecar_path(task_id), 'r', encoding='utf-8') as f:
+                return json.load(f).get('signature') == signature
+        except (OSError, ValueError):
+            return False
+    
+    def _locked_by_other_process(self, task_id: str) -> bool:
+        try:
+            return time.time() - os.stat(self._lock_path(task_id)).st_mtime < self.stale_lock_seconds
+        except OSError:
+            return False
+    
+    def get_status(self, task_id: str, scene_folders: List[str]) -> Dict:
+        signature = self._signature(task_id, scene_folders)
+        with self._lock:
+            running = task_id in self._running
+            error = self._errors.get(task_id)
+        
+        if self._is_ready(task_id, signature):
+            return {'status': 'ready'}
+        if running or self._locked_by_other_process(task_id):
+            return {'status': 'merging'}
+        if error and error['signature'] == signature:
+            return {'status': 'error', 'message': error['message']}
+        return {'status': 'missing'}
+    
+    def request(self, task_id: str, scene_folders: List[str], retry_failed: bool = False) -> Dict:
+        status = self.get_status(task_id, scene_folders)
+        if status['status'] in ('ready', 'merging'):
+            return status
+        if status['status'] == 'error' and not retry_failed:
+            return status
+        
+        with self._lock:
+            if task_id not in self._running:
+                self._running[task_id] = self._executor.submit(self._assemble_and_release, task_id, list(scene_folders))
+        return {'status': 'merging'}
+    
+    def assemble(self, task_id: str, scene_folders: List[str]) -> bool:
+        self.request(task_id, scene_folders, retry_failed=True)
+        with self._lock:
+            future = self._running.get(task_id)
+        if future:
+            future.result()
+        return self.get_status(task_id, scene_folders)['status'] == 'ready'
+    
+    def _acquire_file_lock(self, task_id: str) -> bool:
+        lock_path = self._lock_path(task_id)
+        for _ in range(2):
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+                return True
+            except FileExistsError:
+                if self._locked_by_other_process(task_id):
+                    return False
+                try:
+                    os.remove(lock_path)
+                except OSError:
+                    return False
+            except OSError as e:
+                print(f"创建视频合并锁失败: {e}")
+                return False
+        return False
+    
+    def _assemble_and_release(self, task_id: str, scene_folders: List[str]):
+        try:
+            self._assemble(task_id, scene_folders)
+        finally:
+            with self._lock:
+                self._running.pop(task_id, None)
+    
+    def _assemble(self, task_id: str, scene_folders: List[str]):
+        lock_path = self._lock_path(task_id)
+        if not self._acquire_file_lock(task_id):
+            return
+        
+        try:
+            signature = self._signature(task_id, scene_folders)
+            output_path = self.get_output_path(task_id)
+            partial_path = os.path.join(self.output_dir, f"merged_{task_id}.partial.mp4")
+            
+            print(f"开始后台合并视频: {task_id}")
+            merger = self.merger_factory()
+            if merger.merge_scene_videos(scene_folders, partial_path):
+                os.replace(partial_path, output_path)
+                with open(self._sidecar_path(task_id), 'w', encoding='utf-8') as f:
+                    json.dump({'signature': signature, 'scene_count': len(scene_folders)}, f)
+                with self._lock:
+                    self._errors.pop(task_id, None)
+            else:
+                with self._lock:
+                    self._errors[task_id] = {'signature': signature, 'message': '视频合并失败'}
+        except Exception as e:
+            print(f"后台合并视频失败 {task_id}: {e}")
+            with self._lock:
+                self._errors[task_id] = {'signature': self._signature(task_id, scene_folders), 'message': str(e)}
+        finally:
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
@@ -4,15 +4,18 @@ import time
 import hashlib
 from typing import Optional, Dict
 import json
+import threading
 
 
 class VideoGenerator:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, max_concurrency: int = 2):
         self.api_key = api_key
         self.base_url = "https://openai.qiniu.com/v1"
         self.cache_dir = "video_cache"
         os.makedirs(self.cache_dir, exist_ok=True)
         
+        self._request_semaphore = threading.BoundedSemaphore(max(1, max_concurrency))
+        
     def generate_video(self, 
                       prompt: str,
                       image_path: Optional[str] = None,
@@ -32,6 +35,12 @@ class VideoGenerator:
             print(f"使用缓存的视频: {cache_path}")
             return cache_path
         
+        with self._request_semaphore:
+            return self._generate_with_retries(full_prompt, image_path, duration, aspect_ratio, cache_path, max_retries)
+    
+    def _generate_with_retries(self, full_prompt: str, image_path: Optional[str],
+                               duration: int, aspect_ratio: str,
+                               cache_path: str, max_retries: int) -> Optional[str]:
         for attempt in range(max_retries):
             try:
                 print(f"尝试生成视频 (第 {attempt + 1}/{max_retries} 次)...")
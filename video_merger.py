@@ -1,7 +1,68 @@
 import os
+import re
+import subprocess
+import tempfile
 from typing import List, Optional
+from moviepy.config import get_setting
 from moviepy.editor import VideoFileClip, ImageClip, AudioFileClip, concatenate_videoclips, CompositeAudioClip
 
+from scene_composer import SceneComposer, STILL_SEGMENT_FILENAME
+
+
+SEGMENT_WIDTH = 1280
+SEGMENT_HEIGHT = 720
+SEGMENT_FPS = 24
+SEGMENT_AUDIO_RATE = 44100
+# Still segments are stream-copied next to rendered scene.mp4 clips, so they
+# are encoded at the clips' 24 fps rather than the 1 fps of the looped image.
+SEGMENT_VIDEO_FILTER = (
+    f"scale={SEGMENT_WIDTH}:{SEGMENT_HEIGHT}:force_original_aspect_ratio=decrease,"
+    f"pad={SEGMENT_WIDTH}:{SEGMENT_HEIGHT}:(ow-iw)/2:(oh-ih)/2,setsar=1,"
+    f"fps={SEGMENT_FPS},format=yuv420p"
+)
+SEGMENT_CODEC_ARGS = [
+    '-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'high',
+    '-c:a', 'aac', '-b:a', '128k', '-ar', str(SEGMENT_AUDIO_RATE), '-ac', '2',
+    '-video_track_timescale', str(SEGMENT_FPS * 512), '-movflags', '+faststart'
+]
+
+
+def ensure_still_segment(scene_folder: str) -> Optional[str]:
+    segment_path = SceneComposer.get_still_segment(scene_folder)
+    if segment_path:
+        return segment_path
+    
+    image_path = os.path.join(scene_folder, 'scene.png')
+    audio_path = os.path.join(scene_folder, 'narration.mp3')
+    if not (os.path.exists(image_path) and os.path.exists(audio_path)):
+        return None
+    
+    segment_path = os.path.join(scene_folder, STILL_SEGMENT_FILENAME)
+    fd, partial_path = tempfile.mkstemp(prefix="partial_", suffix=".mp4", dir=scene_folder)
+    os.close(fd)
+    try:
+        result = subprocess.run(
+            [get_setting("FFMPEG_BINARY"), '-y', '-hide_banner', '-loglevel', 'error',
+             '-loop', '1', '-framerate', '1', '-i', image_path, '-i', audio_path,
+             '-map', '0:v:0', '-map', '1:a:0', '-vf', SEGMENT_VIDEO_FILTER, '-tune', 'stillimage'] +
+            SEGMENT_CODEC_ARGS + ['-shortest', '-f', 'mp4', partial_path],
+            capture_output=True, text=True, errors='replace'
+        )
+        if result.returncode != 0:
+            print(f"静态场景预编码失败 {scene_folder}: {result.stderr.strip()[-500:]}")
+            return None
+        os.replace(partial_path, segment_path)
+        return segment_path
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"静态场景预编码失败 {scene_folder}: {e}")
+        return None
+    finally:
+        if os.path.exists(partial_path):
+            try:
+                os.remove(partial_path)
+            except OSError:
+                pass
+
 
 class VideoMerger:
     def __init__(self):
@@ -9,13 +70,143 @@ class VideoMerger:
         os.makedirs(self.temp_dir, exist_ok=True)
     
     def merge_scene_videos(self, scene_folders: List[str], output_path: str) -> bool:
+        video_paths = []
+        for scene_folder in scene_folders:
+            video_path = self._get_scene_video_path(scene_folder) or ensure_still_segment(scene_folder)
+            if video_path:
+                video_paths.append(video_path)
+            elif all(os.path.exists(os.path.join(scene_folder, name)) for name in ('scene.png', 'narration.mp3')):
+                video_paths = []
+                break
+        
+        if video_paths:
+            conformed_paths = self._conform_clips(video_paths)
+            try:
+                if conformed_paths and self._concat_stream_copy(conformed_paths, output_path):
+                    print(f"视频合并完成（无损拼接）: {output_path}")
+                    return True
+            finally:
+                for conformed_path in conformed_paths or []:
+                    if conformed_path not in video_paths and os.path.exists(conformed_path):
+                        os.remove(conformed_path)
+            print("无损拼接失败，改为重新编码")
+        
+        return self._merge_with_reencode(scene_folders, output_path)
+    
+    def _get_scene_video_path(self, scene_folder: str) -> Optional[str]:
+        video_path = os.path.join(scene_folder, 'scene.mp4')
+        if os.path.exists(video_path):
+            return video_path
+        return SceneComposer.get_still_segment(scene_folder)
+    
+    def _conform_clips(self, video_paths: List[str]) -> Optional[List[str]]:
+        signatures = [self._probe_stream_signature(video_path) if os.path.exists(video_path) else None
+                      for video_path in video_paths]
+        if None not in signatures and len(set(signatures)) == 1:
+            return list(video_paths)
+        
+        reference = next((signature for video_path, signature in zip(video_paths, signatures)
+                          if signature and os.path.basename(video_path) == STILL_SEGMENT_FILENAME), None)
+        conformed_paths = []
+        for video_path, signature in zip(video_paths, signatures):
+            if signature is not None and signature == reference:
+                conformed_paths.append(video_path)
+                continue
+            
+            normalized_path = self._normalize_clip(video_path, has_audio=bool(signature) and
+                                                   any(kind == 'Audio' for kind, _ in signature))
+            normalized_signature = self._probe_stream_signature(normalized_path) if normalized_path else None
+            if reference is None:
+                reference = normalized_signature
+            if normalized_signature is None or normalized_signature != reference:
+                for conformed_path in conformed_paths + [normalized_path]:
+                    if conformed_path and conformed_path not in video_paths and os.path.exists(conformed_path):
+                        os.remove(conformed_path)
+                return None
+            print(f"片段参数不一致，已单独重新编码: {video_path}")
+            conformed_paths.append(normalized_path)
+        return conformed_paths
+    
+    def _normalize_clip(self, video_path: str, has_audio: bool) -> Optional[str]:
+        output_fd, output_path = tempfile.mkstemp(prefix='conformed_', suffix='.mp4', dir=self.temp_dir)
+        os.close(output_fd)
+        if has_audio:
+            input_args = ['-i', video_path, '-map', '0:v:0', '-map', '0:a:0']
+        else:
+            input_args = ['-i', video_path, '-f', 'lavfi', '-i', f"anullsrc=r={SEGMENT_AUDIO_RATE}:cl=stereo",
+                          '-map', '0:v:0', '-map', '1:a:0', '-shortest']
+        try:
+            result = subprocess.run(
+                [get_setting("FFMPEG_BINARY"), '-y', '-hide_banner', '-loglevel', 'error'] + input_args +
+                ['-vf', SEGMENT_VIDEO_FILTER] + SEGMENT_CODEC_ARGS + ['-f', 'mp4', output_path],
+                capture_output=True, text=True, errors='replace'
+            )
+            if result.returncode == 0:
+                return output_path
+            print(f"片段重新编码失败 {video_path}: {result.stderr.strip()[-500:]}")
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"片段重新编码失败 {video_path}: {e}")
+        
+        os.remove(output_path)
+        return None
+    
+    def _probe_stream_signature(self, video_path: str) -> Optional[tuple]:
+        try:
+            result = subprocess.run(
+                [get_setting("FFMPEG_BINARY"), '-hide_banner', '-i', video_path],
+                capture_output=True, text=True, errors='replace', timeout=30
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"读取视频参数失败 {video_path}: {e}")
+            return None
+        
+        streams = []
+        for match in re.finditer(r"Stream #\d+:\d+[^:]*: (Video|Audio): ([^\n]+)", result.stderr):
+            kind, description = match.groups()
+            description = re.sub(r",\s*\d+ kb/s", "", description)
+            description = re.sub(r"\s*\((default|attached pic)\)", "", description)
+            streams.append((kind, description.strip()))
+        
+        if not any(kind == 'Video' for kind, _ in streams):
+            return None
+        return tuple(streams)
+    
+    def _concat_stream_copy(self, video_paths: List[str], output_path: str) -> bool:
+        list_fd, list_path = tempfile.mkstemp(suffix='.txt', dir=self.temp_dir)
+        try:
+            with os.fdopen(list_fd, 'w', encoding='utf-8') as f:
+                for video_path in video_paths:
+                    escaped = os.path.abspath(video_path).replace("'", "'\\''")
+                    f.write(f"file '{escaped}'\n")
+            
+            result = subprocess.run(
+                [get_setting("FFMPEG_BINARY"), '-y', '-hide_banner', '-loglevel', 'error',
+                 '-f', 'concat', '-safe', '0', '-i', list_path,
+                 '-map', '0', '-c', 'copy', '-movflags', '+faststart',
+                 '-f', 'mp4', output_path],
+                capture_output=True, text=True, errors='replace'
+            )
+            if result.returncode != 0:
+                print(f"ffmpeg 拼接失败: {result.stderr.strip()[-500:]}")
+                return False
+            return os.path.exists(output_path) and os.path.getsize(output_path) > 0
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"ffmpeg 拼接失败: {e}")
+            return False
+        finally:
+            try:
+                os.remove(list_path)
+            except OSError:
+                pass
+    
+    def _merge_with_reencode(self, scene_folders: List[str], output_path: str) -> bool:
         try:
             video_clips = []
             
             for scene_folder in scene_folders:
-                video_path = os.path.join(scene_folder, 'scene.mp4')
+                video_path = self._get_scene_video_path(scene_folder)
                 
-                if os.path.exists(video_path):
+                if video_path:
                     clip = VideoFileClip(video_path)
                     video_clips.append(clip)
                 else:
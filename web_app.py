@@ -1,20 +1,30 @@
 import os
 import sys
 import json
-import threading
+import time
 import uuid
+import socket
 from functools import wraps
+import gevent
 from gevent.pywsgi import WSGIServer
 
 from werkzeug.utils import secure_filename
-from anime_generator import AnimeGenerator
-from video_merger import VideoMerger
+from video_assembly import FinalVideoAssembler
+from hls_packager import HLSPackager
+from asset_cache import AssetDigestCache
+from image_renditions import IMAGE_RENDITIONS, IMAGE_RENDITION_FORMATS, get_rendition_path
+from scene_composer import SceneComposer
+from scene_index import SceneIndexCache
+from generation_checkpoint import GenerationCheckpoint
+from job_queue import JobQueue, JobWorkerPool
+from generation_worker import GenerationJobRunner, record_generation_stats
+from status_store import create_status_store
 
 from common import get_base_dir
-from flask import Flask, render_template, request, jsonify, send_from_directory, session, redirect, url_for, send_file
+from flask import Flask, render_template, request, jsonify, send_from_directory, session, redirect, url_for, send_file, Response, stream_with_context
 from flask_cors import CORS
-from statistics_db import insert_statistics, update_generation_stats, get_statistics
-from user_auth import register_user, login_user, get_user_by_id, get_user_video_count, increment_user_video_count
+from statistics_db import insert_statistics, get_statistics
+from user_auth import register_user, login_user, get_user_by_id, get_user_video_count
 
 
 class FlaskAppWrapper:
@@ -31,7 +41,41 @@ class FlaskAppWrapper:
         
         os.makedirs(self.upload_folder_, exist_ok=True)
         
-        self.generation_status_ = {}
+        self.job_status_map_ = {'running': 'processing', 'failed': 'error'}
+        self.active_statuses_ = ('queued', 'processing')
+        self.status_poll_interval_ = 0.5
+        self.queue_position_poll_interval_ = 5
+        self.max_long_poll_timeout_ = 60
+        self.sse_keepalive_interval_ = 15
+        
+        self.status_store_ = create_status_store(
+            os.getenv('STATUS_STORE', 'memory'),
+            default_db_path=os.path.join(get_base_dir(), 'generation_status.db'),
+            ttl_seconds=float(os.getenv('STATUS_TTL_SECONDS', 24 * 3600))
+        )
+        self.scene_index_ = SceneIndexCache()
+        self.video_assembler_ = FinalVideoAssembler()
+        self.max_download_wait_ = 600
+        self.hls_packager_ = HLSPackager()
+        self.asset_digests_ = AssetDigestCache()
+        self.asset_root_ = os.path.realpath(SceneComposer.get_output_dir(None))
+        self.asset_max_age_ = 365 * 24 * 3600
+        self.job_queue_ = JobQueue(os.path.join(get_base_dir(), 'generation_jobs.db'))
+        self.job_runner_ = GenerationJobRunner(
+            self.job_queue_,
+            self.status_store_,
+            on_completed=record_generation_stats,
+            video_assembler=self.video_assembler_ if os.getenv('PREMERGE_FINAL_VIDEO', 'true').lower() == 'true' else None,
+            hls_packager=self.hls_packager_ if os.getenv('PREPACKAGE_HLS', 'true').lower() == 'true' else None
+        )
+        self.worker_pool_ = JobWorkerPool(
+            self.job_queue_,
+            self.job_runner_.run_job,
+            num_workers=int(os.getenv('GENERATION_WORKERS', '2')),
+            worker_prefix=f"web-{socket.gethostname()}-{os.getpid()}"
+        )
+        self.job_queue_.requeue_stale(self.worker_pool_.lease_seconds)
+        self.worker_pool_.start()
         
         self._register_routes()
     
@@ -47,10 +91,16 @@ class FlaskAppWrapper:
         self.app_.add_url_rule('/api/history', view_func=self.get_history, methods=['GET'])
         self.app_.add_url_rule('/api/check_payment', view_func=self.check_payment, methods=['POST'])
         self.app_.add_url_rule('/api/upload', view_func=self.upload_novel, methods=['POST'])
+        self.app_.add_url_rule('/api/resume/<task_id>', view_func=self.resume_generation, methods=['POST'])
+        self.app_.add_url_rule('/api/cancel/<task_id>', view_func=self.cancel_generation, methods=['POST'])
         self.app_.add_url_rule('/api/status/<task_id>', view_func=self.get_status, methods=['GET'])
+        self.app_.add_url_rule('/api/events/<task_id>', view_func=self.stream_status, methods=['GET'])
         self.app_.add_url_rule('/api/scenes/<task_id>', view_func=self.get_scenes, methods=['GET'])
         self.app_.add_url_rule('/api/file/<path:filepath>', view_func=self.serve_file, methods=['GET'])
         self.app_.add_url_rule('/api/download/<task_id>', view_func=self.download_content, methods=['GET'])
+        self.app_.add_url_rule('/api/download/<task_id>/status', view_func=self.download_status, methods=['GET'])
+        self.app_.add_url_rule('/api/hls/<task_id>/playlist.m3u8', view_func=self.hls_playlist, methods=['GET'])
+        self.app_.add_url_rule('/api/hls/<task_id>/<int:scene_index>.ts', view_func=self.hls_segment, methods=['GET'])
         self.app_.add_url_rule('/get_apk', view_func=self.get_apk, methods=['GET'])
 
     def get_apk(self):
@@ -67,63 +117,38 @@ class FlaskAppWrapper:
             return f(*args, **kwargs)
         return decorated_function
     
-    def _generate_anime_async(self, task_id, novel_path, max_scenes, api_key, provider='qiniu', custom_prompt=None, enable_video=False, use_ai_analysis=True, use_storyboard=True, user_id=None):
-        def update_status(progress, message):
-            self.generation_status_[task_id] = {
-                'status': 'processing',
-                'progress': progress,
-                'message': message
-            }
+    def _get_task_status(self, task_id):
+        status = self.status_store_.get(task_id)
+        if status is not None:
+            return status
         
-        try:
-            update_status(0, '正在解析小说...')
-            
-            generator = AnimeGenerator(
-                openai_api_key=api_key, 
-                provider=provider, 
-                custom_prompt=custom_prompt, 
-                enable_video=enable_video,
-                use_ai_analysis=use_ai_analysis,
-                session_id=task_id
-            )
-            
-            update_status(5, '开始分析小说内容...')
-            
-            metadata = generator.generate_from_novel(
-                novel_path, 
-                max_scenes=max_scenes, 
-                generate_video=enable_video,
-                use_storyboard=use_storyboard,
-                progress_callback=update_status
-            )
-            
-            generated_scene_count = len(metadata.get('scenes', []))
-            generated_content_size = 0
-            for scene_info in metadata.get('scenes', []):
-                scene_folder = scene_info['folder']
-                if os.path.exists(scene_folder):
-                    for root, dirs, files in os.walk(scene_folder):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            generated_content_size += os.path.getsize(file_path)
-            
-            update_generation_stats(task_id, generated_scene_count, generated_content_size, metadata)
-            
-            if user_id:
-                increment_user_video_count(user_id)
-            
-            self.generation_status_[task_id] = {
-                'status': 'completed',
-                'progress': 100,
-                'message': '生成完成',
-                'metadata': metadata
-            }
-        except Exception as e:
-            self.generation_status_[task_id] = {
-                'status': 'error',
-                'progress': 0,
-                'message': str(e)
-            }
+        job = self.job_queue_.get_job(task_id)
+        if not job:
+            return None
+        return {
+            'status': self.job_status_map_.get(job['status'], job['status']),
+            'progress': 0,
+            'message': job.get('error') or ('排队等待生成' if job['status'] == 'queued' else '')
+        }
+    
+    def _check_api_key(self, api_key):
+        if not api_key and not os.getenv('OPENAI_API_KEY'):
+            return jsonify({'error': '需要提供 API Key'}), 400
+        if api_key and self.worker_pool_.num_workers == 0:
+            return jsonify({'error': '当前服务由独立工作进程执行生成，不支持自定义 API Key，请留空以使用服务端配置的 API Key'}), 400
+        return None
+    
+    def _enqueue_generation(self, task_id, job_params, api_key, priority=0):
+        self.status_store_.set(task_id, {
+            'status': 'queued',
+            'progress': 0,
+            'message': '排队等待生成'
+        })
+        if api_key:
+            self.job_runner_.set_api_key(task_id, api_key)
+            self.job_queue_.enqueue(task_id, job_params, priority=priority, owner=self.worker_pool_.worker_prefix)
+        else:
+            self.job_queue_.enqueue(task_id, job_params, priority=priority)
     
     def index(self):
         return render_template('index.html')
@@ -251,130 +276,404 @@ class FlaskAppWrapper:
             enable_video = request.form.get('enable_video', 'false').lower() == 'true'
             use_ai_analysis = request.form.get('use_ai_analysis', 'true').lower() == 'true'
             use_storyboard = request.form.get('use_storyboard', 'true').lower() == 'true'
+            fuse_llm_passes = request.form.get('fuse_llm_passes', 'false').lower() == 'true'
+            previous_task_id = request.form.get('previous_task_id') or None
+            priority = min(max(request.form.get('priority', 0, type=int) or 0, 0), 9)
             
-            if not api_key:
-                api_key = os.getenv('OPENAI_API_KEY')
-            
-            if not api_key:
-                return jsonify({'error': '需要提供 API Key'}), 400
+            api_key_error = self._check_api_key(api_key)
+            if api_key_error:
+                return api_key_error
             
             user_id = session.get('user_id')
-            thread = threading.Thread(
-                target=self._generate_anime_async,
-                args=(task_id, file_path, max_scenes, api_key, provider, custom_prompt, enable_video, use_ai_analysis, use_storyboard, user_id)
-            )
-            thread.start()
+            job_params = {
+                'novel_path': file_path,
+                'max_scenes': max_scenes,
+                'provider': provider,
+                'custom_prompt': custom_prompt,
+                'enable_video': enable_video,
+                'use_ai_analysis': use_ai_analysis,
+                'use_storyboard': use_storyboard,
+                'user_id': user_id,
+                'fuse_llm_passes': fuse_llm_passes,
+                'previous_task_id': previous_task_id
+            }
+            GenerationCheckpoint(os.path.join('anime_output', task_id)).save_job(job_params)
+            
+            self._enqueue_generation(task_id, job_params, api_key, priority)
             
             return jsonify({
                 'task_id': task_id,
-                'message': '开始处理小说'
+                'message': '已加入生成队列',
+                'queue_position': self.job_queue_.get_queue_position(task_id)
             })
         
         return jsonify({'error': '不支持的文件类型'}), 400
     
+    def resume_generation(self, task_id):
+        if 'user_id' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        
+        checkpoint_dir = os.path.join('anime_output', task_id, 'checkpoints')
+        if os.path.basename(task_id) != task_id or not os.path.isdir(checkpoint_dir):
+            return jsonify({'error': '任务不存在'}), 404
+        
+        queued_job = self.job_queue_.get_job(task_id)
+        if queued_job and queued_job['status'] in ('queued', 'running', 'completed'):
+            return jsonify({'error': '任务正在进行中或已完成'}), 400
+        
+        job = GenerationCheckpoint(os.path.join('anime_output', task_id)).load_job()
+        if not job:
+            return jsonify({'error': '任务检查点不存在'}), 404
+        
+        if job.get('user_id') != session.get('user_id'):
+            return jsonify({'error': '无权恢复该任务'}), 403
+        
+        data = request.get_json(silent=True) or {}
+        api_key = data.get('api_key') or request.form.get('api_key')
+        api_key_error = self._check_api_key(api_key)
+        if api_key_error:
+            return api_key_error
+        
+        priority = queued_job['priority'] if queued_job else 0
+        self._enqueue_generation(task_id, dict(job, resume=True), api_key, priority)
+        
+        return jsonify({
+            'task_id': task_id,
+            'message': '已从检查点恢复生成',
+            'queue_position': self.job_queue_.get_queue_position(task_id)
+        })
+    
+    def cancel_generation(self, task_id):
+        if 'user_id' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        
+        job = self.job_queue_.get_job(task_id)
+        if not job:
+            return jsonify({'error': '任务不存在'}), 404
+        
+        if job['params'].get('user_id') != session.get('user_id'):
+            return jsonify({'error': '无权取消该任务'}), 403
+        
+        result = self.job_queue_.cancel(task_id)
+        if result == 'cancelled':
+            self.job_runner_.discard_api_key(task_id)
+            self.status_store_.set(task_id, {
+                'status': 'cancelled',
+                'progress': 0,
+                'message': '任务已取消'
+            })
+        elif result != 'cancelling':
+            return jsonify({'error': '任务已结束，无法取消'}), 400
+        
+        return jsonify({
+            'task_id': task_id,
+            'status': result
+        })
+    
+    def _get_status_snapshot(self, task_id):
+        status = self._get_task_status(task_id)
+        if status is not None and status['status'] == 'queued':
+            status = dict(status, queue_position=self.job_queue_.get_queue_position(task_id))
+        return status
+    
+    def _sleep_until_version_changes(self, task_id, version, deadline):
+        while time.monotonic() < deadline:
+            gevent.sleep(min(self.status_poll_interval_, max(deadline - time.monotonic(), 0)))
+            if self.status_store_.get_version(task_id) != version:
+                return
+    
+    def _wait_for_status_change(self, task_id, known_version, timeout):
+        deadline = time.monotonic() + timeout
+        status = self._get_status_snapshot(task_id)
+        while (status is not None and status.get('version', 0) <= known_version
+               and status['status'] in self.active_statuses_ and time.monotonic() < deadline):
+            self._sleep_until_version_changes(task_id, status.get('version', 0), deadline)
+            status = self._get_status_snapshot(task_id)
+        return status
+    
     def get_status(self, task_id):
-        if task_id not in self.generation_status_:
+        known_version = request.args.get('version', type=int)
+        if known_version is None:
+            status = self._get_status_snapshot(task_id)
+        else:
+            timeout = min(max(request.args.get('timeout', 25, type=float), 0), self.max_long_poll_timeout_)
+            status = self._wait_for_status_change(task_id, known_version, timeout)
+        
+        if status is None:
             return jsonify({'error': '任务不存在'}), 404
         
-        return jsonify(self.generation_status_[task_id])
+        return jsonify(status)
     
-    def get_scenes(self, task_id):
-        metadata = None
+    def stream_status(self, task_id):
+        status = self._get_task_status(task_id)
+        if status is None:
+            return jsonify({'error': '任务不存在'}), 404
+        
+        last_version = request.headers.get('Last-Event-ID', type=int)
+        if last_version is None:
+            last_version = request.args.get('version', 0, type=int)
+        
+        if status['status'] not in self.active_statuses_ and status.get('version', 0) <= last_version:
+            return '', 204
+        
+        def generate_events():
+            version = last_version
+            queue_position = None
+            sent_scenes = set()
+            last_sent = time.monotonic()
+            
+            yield f"retry: {int(self.status_poll_interval_ * 4000)}\n\n"
+            while True:
+                status = self._get_status_snapshot(task_id)
+                if status is None:
+                    return
+                
+                changed = status.get('version', 0) > version or status.get('queue_position') != queue_position
+                if changed:
+                    version = max(version, status.get('version', 0))
+                    queue_position = status.get('queue_position')
+                    for scene_index in status.get('completed_scenes', []):
+                        if scene_index not in sent_scenes:
+                            sent_scenes.add(scene_index)
+                            yield f"event: scene\ndata: {json.dumps({'scene_index': scene_index})}\n\n"
+                    
+                    payload = {key: value for key, value in status.items() if key != 'metadata'}
+                    yield f"id: {version}\nevent: status\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent >= self.sse_keepalive_interval_:
+                    yield ": keepalive\n\n"
+                    last_sent = time.monotonic()
+                
+                if status['status'] not in self.active_statuses_:
+                    return
+                wait = self.sse_keepalive_interval_ - (time.monotonic() - last_sent)
+                if status['status'] == 'queued':
+                    wait = min(wait, self.queue_position_poll_interval_)
+                self._sleep_until_version_changes(task_id, status.get('version', 0),
+                                                  time.monotonic() + max(wait, self.status_poll_interval_))
+        
+        return Response(
+            stream_with_context(generate_events()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    
+    def _load_scene_entry(self, scene_folder):
+        metadata_path = os.path.join(scene_folder, 'metadata.json')
+        if not os.path.exists(metadata_path):
+            return None
+        
+        with open(metadata_path, 'r', encoding='utf-8') as f:
+            scene_data = json.load(f)
         
-        if task_id in self.generation_status_:
-            status = self.generation_status_[task_id]
-            if status['status'] != 'completed':
-                return jsonify({'error': '任务未完成'}), 400
-            metadata = status.get('metadata', {})
+        scene_data['image_url'] = self._get_asset_url(scene_folder, 'scene.png')
+        scene_data['image_renditions'] = {}
+        for size in IMAGE_RENDITIONS:
+            for image_format in IMAGE_RENDITION_FORMATS:
+                rendition_path = get_rendition_path(scene_folder, size, image_format)
+                if rendition_path:
+                    scene_data['image_renditions'].setdefault(size, {})[image_format] = \
+                        self._get_asset_url(scene_folder, os.path.basename(rendition_path))
+        scene_data['audio_url'] = self._get_asset_url(scene_folder, 'narration.mp3')
+        if scene_data.get('video_path'):
+            scene_data['video_url'] = self._get_asset_url(scene_folder, 'scene.mp4')
+        return scene_data
+    
+    def _get_asset_url(self, scene_folder, filename):
+        url = f"/api/file/{scene_folder}/{filename}"
+        version = AssetDigestCache.get_version(os.path.join(scene_folder, filename))
+        return f"{url}?v={version}" if version else url
+    
+    def _get_completed_scene_list(self, task_id, status):
+        if status is not None and 'metadata' in status:
+            metadata_scenes = status['metadata'].get('scenes', [])
         else:
+            scene_list = self.scene_index_.get_scene_list(task_id)
+            if scene_list is not None:
+                return scene_list, None
+            
             db_record = get_statistics(session_id=task_id)
             if not db_record:
-                return jsonify({'error': '任务不存在'}), 404
+                return None, (jsonify({'error': '任务不存在'}), 404)
             
             if not db_record.get('metadata'):
-                return jsonify({'error': '任务未完成或元数据不存在'}), 400
+                return None, (jsonify({'error': '任务未完成或元数据不存在'}), 400)
             
-            metadata = json.loads(db_record['metadata'])
+            metadata_scenes = json.loads(db_record['metadata']).get('scenes', [])
         
-        scenes = []
+        scene_list = [(scene_info.get('scene_index', position), scene_info['folder'])
+                      for position, scene_info in enumerate(metadata_scenes)]
+        if status is None:
+            self.scene_index_.set_scene_list(task_id, scene_list)
+        return scene_list, None
+    
+    def _get_available_scene_list(self, task_id, status):
+        if status is not None and status['status'] != 'completed':
+            scene_list = [(scene_index, SceneComposer.get_scene_folder(task_id, scene_index))
+                          for scene_index in status.get('completed_scenes', [])]
+            return scene_list, None
+        return self._get_completed_scene_list(task_id, status)
+    
+    def _select_image_rendition(self, scene_data, image_size, image_format):
+        renditions = scene_data.get('image_renditions', {}).get(image_size)
+        if not renditions:
+            return scene_data
         
-        for scene_info in metadata.get('scenes', []):
-            scene_folder = scene_info['folder']
-            metadata_path = os.path.join(scene_folder, 'metadata.json')
-            
-            if os.path.exists(metadata_path):
-                with open(metadata_path, 'r', encoding='utf-8') as f:
-                    scene_data = json.load(f)
-                    
-                    scene_data['image_url'] = f"/api/file/{scene_folder}/scene.png"
-                    scene_data['audio_url'] = f"/api/file/{scene_folder}/narration.mp3"
-                    if scene_data.get('video_path'):
-                        scene_data['video_url'] = f"/api/file/{scene_folder}/scene.mp4"
-                    scenes.append(scene_data)
+        scene_data = dict(scene_data)
+        scene_data['image_url'] = renditions.get(image_format) or next(iter(renditions.values()))
+        return scene_data
+    
+    def get_scenes(self, task_id):
+        since = request.args.get('since', type=int)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        limit = request.args.get('limit', type=int)
+        image_size = request.args.get('image_size', 'full')
+        image_format = request.args.get('image_format', 'webp')
+        if image_size != 'full' and image_size not in IMAGE_RENDITIONS:
+            return jsonify({'error': f"image_size 只能是 full 或 {'、'.join(IMAGE_RENDITIONS)}"}), 400
+        if image_format not in IMAGE_RENDITION_FORMATS:
+            return jsonify({'error': f"image_format 只能是 {'、'.join(IMAGE_RENDITION_FORMATS)}"}), 400
+        status = self._get_task_status(task_id)
+        
+        scene_list, error_response = self._get_available_scene_list(task_id, status)
+        if error_response:
+            return error_response
+        
+        if since is not None:
+            scene_list = [(scene_index, folder) for scene_index, folder in scene_list if scene_index > since]
+        
+        total_scenes = len(scene_list)
+        page = scene_list[offset:offset + limit] if limit is not None and limit >= 0 else scene_list[offset:]
+        scenes = self.scene_index_.get_scenes(task_id, [folder for _, folder in page], self._load_scene_entry)
+        if image_size != 'full':
+            scenes = [self._select_image_rendition(scene_data, image_size, image_format) for scene_data in scenes]
+        
+        next_since = scenes[-1]['scene_index'] if scenes else since
         
         return jsonify({
-            'total_scenes': len(scenes),
-            'scenes': scenes
+            'total_scenes': total_scenes,
+            'offset': offset,
+            'limit': limit,
+            'scenes': scenes,
+            'status': status['status'] if status else 'completed',
+            'completed': status is None or status['status'] == 'completed',
+            'next_since': next_since,
+            'hls_url': f"/api/hls/{task_id}/playlist.m3u8"
         })
     
     def serve_file(self, filepath):
-        directory = os.path.dirname(filepath)
-        filename = os.path.basename(filepath)
-        return send_from_directory(directory, filename)
+        full_path = os.path.realpath(filepath)
+        if os.path.commonpath([full_path, self.asset_root_]) != self.asset_root_ or not os.path.isfile(full_path):
+            return jsonify({'error': '文件不存在'}), 404
+        
+        digest = gevent.get_hub().threadpool.spawn(self.asset_digests_.get_digest, full_path).get()
+        if digest is None:
+            return jsonify({'error': '文件不存在'}), 404
+        
+        versioned = request.args.get('v') == AssetDigestCache.get_version(full_path)
+        response = send_file(
+            full_path,
+            conditional=True,
+            etag=digest,
+            max_age=self.asset_max_age_ if versioned else None
+        )
+        if versioned:
+            response.cache_control.immutable = True
+        return response
+    
+    def _get_download_scene_folders(self, task_id):
+        status = self._get_task_status(task_id)
+        if status is not None and status['status'] != 'completed':
+            return None, (jsonify({'error': '任务未完成'}), 400)
+        
+        scene_list, error_response = self._get_completed_scene_list(task_id, status)
+        if error_response:
+            return None, error_response
+        
+        if not scene_list:
+            return None, (jsonify({'error': '没有可下载的内容'}), 404)
+        
+        return [folder for _, folder in scene_list], None
+    
+    def _download_status_response(self, task_id, merge_status):
+        payload = dict(merge_status, task_id=task_id)
+        if merge_status['status'] == 'ready':
+            payload['download_url'] = f"/api/download/{task_id}"
+        return payload
+    
+    def download_status(self, task_id):
+        scene_folders, error_response = self._get_download_scene_folders(task_id)
+        if error_response:
+            return error_response
+        
+        merge_status = self.video_assembler_.request(task_id, scene_folders)
+        return jsonify(self._download_status_response(task_id, merge_status))
     
     def download_content(self, task_id):
-        metadata = None
+        scene_folders, error_response = self._get_download_scene_folders(task_id)
+        if error_response:
+            return error_response
         
-        if task_id in self.generation_status_:
-            status = self.generation_status_[task_id]
-            if status['status'] != 'completed':
-                return jsonify({'error': '任务未完成'}), 400
-            metadata = status.get('metadata', {})
-        else:
-            db_record = get_statistics(session_id=task_id)
-            if not db_record:
-                return jsonify({'error': '任务不存在'}), 404
-            
-            if not db_record.get('metadata'):
-                return jsonify({'error': '任务未完成或元数据不存在'}), 400
-            
-            metadata = json.loads(db_record['metadata'])
+        merge_status = self.video_assembler_.request(task_id, scene_folders, retry_failed=True)
         
-        scenes = metadata.get('scenes', [])
+        if request.args.get('wait', 'true').lower() != 'false':
+            deadline = time.monotonic() + self.max_download_wait_
+            while merge_status['status'] == 'merging' and time.monotonic() < deadline:
+                gevent.sleep(1)
+                merge_status = self.video_assembler_.get_status(task_id, scene_folders)
         
-        if not scenes:
-            return jsonify({'error': '没有可下载的内容'}), 404
+        if merge_status['status'] == 'error':
+            return jsonify({'error': merge_status.get('message', '视频合并失败')}), 500
         
-        try:
-            scene_folders = [scene_info['folder'] for scene_info in scenes]
-            
-            output_video_path = os.path.join('temp_videos', f'merged_{task_id}.mp4')
-            os.makedirs('temp_videos', exist_ok=True)
-            
-            if os.path.exists(output_video_path):
-                return send_file(
-                    output_video_path,
-                    mimetype='video/mp4',
-                    as_attachment=True,
-                    download_name=f'anime_{task_id}.mp4'
-                )
-            
-            merger = VideoMerger()
-            success = merger.merge_scene_videos(scene_folders, output_video_path)
-            
-            if not success:
-                return jsonify({'error': '视频合并失败'}), 500
-            
-            return send_file(
-                output_video_path,
-                mimetype='video/mp4',
-                as_attachment=True,
-                download_name=f'anime_{task_id}.mp4'
-            )
-            
-        except Exception as e:
-            print(f"下载失败: {e}")
-            return jsonify({'error': f'下载失败: {str(e)}'}), 500
+        if merge_status['status'] != 'ready':
+            return jsonify(self._download_status_response(task_id, merge_status)), 202
+        
+        return send_file(
+            self.video_assembler_.get_output_path(task_id),
+            mimetype='video/mp4',
+            as_attachment=True,
+            download_name=f'anime_{task_id}.mp4'
+        )
+    
+    def hls_playlist(self, task_id):
+        status = self._get_task_status(task_id)
+        scene_list, error_response = self._get_available_scene_list(task_id, status)
+        if error_response:
+            return error_response
+        
+        scene_list = sorted(scene_list)
+        self.hls_packager_.request([folder for _, folder in scene_list])
+        
+        segments = []
+        for position, (scene_index, folder) in enumerate(scene_list):
+            if scene_index != position:
+                break
+            packaged = self.hls_packager_.get_packaged_scene(folder)
+            if not packaged:
+                break
+            segments.append((f"/api/hls/{task_id}/{scene_index}.ts", packaged['duration']))
+        
+        task_finished = status is None or status['status'] not in self.active_statuses_
+        ended = task_finished and len(segments) == len(scene_list)
+        
+        return Response(
+            HLSPackager.build_playlist(segments, ended),
+            mimetype='application/vnd.apple.mpegurl',
+            headers={'Cache-Control': 'no-cache'}
+        )
+    
+    def hls_segment(self, task_id, scene_index):
+        status = self._get_task_status(task_id)
+        scene_list, error_response = self._get_available_scene_list(task_id, status)
+        if error_response:
+            return error_response
+        
+        scene_folder = dict(scene_list).get(scene_index)
+        packaged = self.hls_packager_.get_packaged_scene(scene_folder) if scene_folder else None
+        if not packaged:
+            return jsonify({'error': '分片不存在'}), 404
+        
+        return send_file(os.path.abspath(packaged['path']), mimetype='video/mp2t', conditional=True)
     
     def run(self, debug=True, host='0.0.0.0'):
         self.app_.run(debug=debug, host=host, port=self.port_)